@@ -0,0 +1,307 @@
+import sys
+import json
+import time
+import pickle
+import socket
+import struct
+import argparse
+import platform
+import threading
+
+from buffers import RecvBuffer, SendQueue
+from constants import GenerationMode
+from gameboard import GameBoard, IMAGE_TYPES
+
+
+# GameBoard 의 자주 쓰이는 함수들의 성능을 재는 벤치마크
+# python benchmark.py --save baseline.json 으로 기준 결과를 저장하고,
+# 코드를 바꾼 뒤 python benchmark.py --compare baseline.json 으로 느려진 함수가 있는지 확인함
+# python benchmark.py --serialization 은 직렬화 성능을 pickle 과 비교함
+# python benchmark.py --buffers 는 큰 프레임을 주고받을 때 buffers.py 와 bytes 를 이어붙이는 방식을 비교함
+
+
+# 기본으로 재는 게임판 크기와 지뢰 비율
+SIZES = [(9, 9), (30, 16), (100, 100), (300, 300), (1000, 1000)]
+DENSITIES = [0.1, 0.2]
+
+# 비교할 때, 기준보다 이 비율 이상 느려지면 느려진 것으로 봄
+DEFAULT_THRESHOLD = 0.2
+
+# 기준과의 차이가 이보다 작으면(초) 비율이 커도 측정 오차로 보고 느려진 것으로 보지 않음
+MIN_DIFFERENCE = 1e-6
+
+# 이보다 짧게 걸리는 함수는 여러 번 불러서 한 번에 걸린 시간을 계산함 (초)
+MIN_MEASURE_TIME = 0.005
+
+
+# 예전 GameBoard 처럼 칸 정보를 2차원 리스트로 들고 있는 객체를 pickle 한 결과를 리턴
+def legacyPickle(board: GameBoard):
+    w = board.width()
+    state = {
+        'mines': [[bool(board.mines[y * w + x]) for x in range(w)] for y in range(board.height())],
+        'opened': [[bool(board.opened[y * w + x]) for x in range(w)] for y in range(board.height())],
+        'images': [[IMAGE_TYPES[board.images[y * w + x]] for x in range(w)] for y in range(board.height())],
+    }
+    return pickle.dumps(state)
+
+
+# fn 을 repeat 번 실행해서 가장 짧게 걸린 시간(초)을 리턴
+# setup 을 주면 매번 setup() 의 결과를 fn 에 넘겨줌 (setup 에 걸린 시간은 재지 않음)
+def measure(fn, repeat=5, setup=None):
+    best = float('inf')
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            fn(arg)
+        else:
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# 아주 빨리 끝나는 fn 을 여러 번 묶어서 잰 뒤, 한 번에 걸린 시간(초)을 리턴
+def measureFast(fn, repeat=5):
+    number = 1
+    while True:
+        elapsed = measure(lambda: [fn() for _ in range(number)], repeat=1)
+        if elapsed >= MIN_MEASURE_TIME:
+            break
+        number *= 10
+    return measure(lambda: [fn() for _ in range(number)], repeat=repeat) / number
+
+
+# 적당히 진행된 게임판을 만듦 (몇 군데를 열고 깃발을 꽂아둠)
+def makeBoard(w, h, density):
+    board = GameBoard()
+    board.newGame(w, h, int(w * h * density), seed=w * h)
+    for i in range(0, w * h, max(1, w * h // 32)):
+        x, y = i % w, i // w
+        if board.mines[i]:
+            board.cycleCellImage(x, y)
+        else:
+            board.openCell(x, y)
+    return board
+
+
+# 저장해둔 게임판 상태에서 새 GameBoard 를 만드는 setup 함수를 리턴
+def restore(data):
+    def setup():
+        board = GameBoard()
+        board.deserializeGame(data)
+        return board
+    return setup
+
+
+# 게임판 크기와 지뢰 비율마다 자주 쓰이는 함수들을 재서 {'함수/크기/비율': 초} 를 리턴
+def benchHotPaths(sizes=SIZES, densities=DENSITIES, repeat=5, log=None):
+    results = dict()
+    for w, h in sizes:
+        for density in densities:
+            mines = int(w * h * density)
+            key = f'{w}x{h}/{density:.2f}'
+
+            def record(name, seconds):
+                results[f'{name}/{key}'] = seconds
+                if log is not None:
+                    print(f'{name:>18} {key:>16} {seconds * 1e6:>12.1f} us', file=log)
+
+            record('newGame', measure(lambda: GameBoard().newGame(w, h, mines, seed=w * h), repeat))
+
+            # 가운데 칸 주변에 지뢰가 없는 게임판에서 가운데 칸을 열어서 연쇄적으로 열리게 함
+            fresh = GameBoard()
+            fresh.newGame(w, h, mines, GenerationMode.ZERO, seed=w * h)
+            fresh.placeFirstClickMines(w // 2, h // 2)
+            setup = restore(fresh.serializeGame())
+            record('openCell cascade', measure(lambda board: board.openCell(w // 2, h // 2), repeat, setup))
+            # 한 칸만 열리는 경우
+            x, y = findNumberCell(fresh)
+            record('openCell single', measure(lambda board: board.openCell(x, y), repeat, setup))
+
+            # 어느 정도 진행된 게임판
+            played = makeBoard(w, h, density)
+            setup = restore(played.serializeGame())
+            x, y = findNumberCell(played)
+            record('openCellAdjacent', measure(lambda board: board.openCellAdjacent(x, y), repeat, setup))
+            record('countRemainingMine', measureFast(played.countRemainingMine, repeat))
+            record('checkFinished', measureFast(played.checkFinished, repeat))
+            record('finishGame', measure(lambda board: board.finishGame(), repeat, setup))
+
+            data = played.serializeGame()
+            record('serializeGame', measure(played.serializeGame, repeat))
+            record('deserializeGame', measure(lambda: GameBoard().deserializeGame(data), repeat))
+    return results
+
+
+# 주변에 지뢰가 있는, 지뢰가 아닌 칸의 좌표를 리턴함 (가운데와 가까운 칸부터 찾음)
+def findNumberCell(board: GameBoard):
+    w = board.width()
+    start = board.height() // 2 * w + w // 2
+    for i in list(range(start, len(board.mines))) + list(range(start)):
+        if not board.mines[i] and board.counts[i]:
+            return i % w, i // w
+    return 0, 0
+
+
+# 기준 결과와 비교해서 (이름, 기준 시간, 지금 시간, 비율, 느려졌는지 여부) 리스트를 리턴
+def compareResults(baseline, results, threshold=DEFAULT_THRESHOLD):
+    rows = []
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        ratio = seconds / base if base > 0 else 1.0
+        rows.append((name, base, seconds, ratio, ratio > 1 + threshold and seconds - base > MIN_DIFFERENCE))
+    return rows
+
+
+def benchSerialization(sizes, density=0.15):
+    print(f'{"size":>11} {"format":>14} {"bytes":>10} {"encode ms":>10} {"decode ms":>10}')
+    for w, h in sizes:
+        board = makeBoard(w, h, density)
+        other = GameBoard()
+
+        data = board.serializeGame()
+        encode = measure(board.serializeGame)
+        decode = measure(lambda: other.deserializeGame(data))
+        print(f'{w:>5}x{h:<5} {"binary":>14} {len(data):>10} {encode * 1000:>10.2f} {decode * 1000:>10.2f}')
+
+        data = pickle.dumps(board)
+        encode = measure(lambda: pickle.dumps(board))
+        decode = measure(lambda: pickle.loads(data))
+        print(f'{w:>5}x{h:<5} {"pickle":>14} {len(data):>10} {encode * 1000:>10.2f} {decode * 1000:>10.2f}')
+
+        # 2차원 리스트 pickle 은 너무 느려서 작은 게임판에서만 잼
+        if w * h <= 250000:
+            data = legacyPickle(board)
+            encode = measure(lambda: legacyPickle(board), repeat=1)
+            decode = measure(lambda: pickle.loads(data), repeat=1)
+            print(f'{w:>5}x{h:<5} {"pickle (list)":>14} {len(data):>10} {encode * 1000:>10.2f} {decode * 1000:>10.2f}')
+
+
+# 버퍼 벤치마크에서 사용하는 프레임 헤더 (내용의 길이)
+BENCH_FRAME_HEADER = struct.Struct('!L')
+
+
+# 예전 방식: 보낼 데이터를 bytes 로 이어붙이고, 보낸 만큼 잘라냄
+def legacySend(sock, frames):
+    writeBuf = b''
+    for frame in frames:
+        writeBuf += frame
+    while len(writeBuf) > 0:
+        sent = sock.send(writeBuf)
+        writeBuf = writeBuf[sent:]
+
+
+# 예전 방식: 받은 데이터를 bytes 로 이어붙이고, 읽은 프레임만큼 잘라냄
+def legacyRecv(sock, count):
+    recvBuf = b''
+    received = 0
+    while received < count:
+        while len(recvBuf) < 4 or len(recvBuf) < 4 + BENCH_FRAME_HEADER.unpack(recvBuf[:4])[0]:
+            recvBuf += sock.recv(4096)
+        size = BENCH_FRAME_HEADER.unpack(recvBuf[:4])[0]
+        frame = recvBuf[4:4 + size]
+        recvBuf = recvBuf[4 + size:]
+        received += len(frame) > 0
+
+
+def queueSend(sock, frames):
+    queue = SendQueue()
+    for frame in frames:
+        queue.push(frame)
+    while len(queue) > 0:
+        queue.send(sock)
+
+
+def bufferRecv(sock, count):
+    recvBuf = RecvBuffer()
+    received = 0
+    while received < count:
+        while len(recvBuf) < 4:
+            recvBuf.recvInto(sock)
+        size = 4 + BENCH_FRAME_HEADER.unpack_from(recvBuf.buf, recvBuf.start)[0]
+        while len(recvBuf) < size:
+            recvBuf.recvInto(sock, size - len(recvBuf))
+        frame = recvBuf.view()[4:size]
+        received += len(frame) > 0
+        recvBuf.consume(size)
+
+
+# 1MB 짜리 프레임(게임판 전체 정도의 크기)을 소켓 쌍으로 주고받으면서 처리량(MB/s)을 잼
+# 한번에 여러 프레임이 쌓인 경우를 흉내내기 위해 batch 개씩 묶어서 보냄
+def benchBuffers(frameSize=1 << 20, count=64, batch=8):
+    payload = bytes(frameSize)
+    frame = BENCH_FRAME_HEADER.pack(frameSize) + payload
+
+    print(f'{"method":>12} {"frames":>8} {"MB/s":>10}')
+    for name, send, recv in [('bytes', legacySend, legacyRecv), ('buffers', queueSend, bufferRecv)]:
+        a, b = socket.socketpair()
+        try:
+            def sender():
+                for _ in range(count // batch):
+                    send(a, [frame] * batch)
+
+            start = time.perf_counter()
+            thread = threading.Thread(target=sender)
+            thread.start()
+            recv(b, count // batch * batch)
+            thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            a.close()
+            b.close()
+        print(f'{name:>12} {count:>8} {count * frameSize / elapsed / 1e6:>10.1f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GameBoard 벤치마크')
+    parser.add_argument('--save', metavar='FILE', help='결과를 기준 결과로 저장할 JSON 파일')
+    parser.add_argument('--compare', metavar='FILE', help='비교할 기준 결과 JSON 파일')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='느려진 것으로 볼 비율 (0.2 이면 20%% 이상 느려진 경우)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-cells', type=int, default=None, help='이보다 칸이 많은 게임판은 재지 않음')
+    parser.add_argument('--serialization', action='store_true', help='직렬화 성능을 pickle 과 비교함')
+    parser.add_argument('--buffers', action='store_true', help='1MB 프레임을 주고받는 처리량을 잼')
+    args = parser.parse_args(argv)
+
+    if args.serialization:
+        benchSerialization([(9, 9), (25, 25), (100, 100), (500, 500), (2000, 2000)])
+        return 0
+
+    if args.buffers:
+        benchBuffers()
+        return 0
+
+    sizes = [(w, h) for w, h in SIZES if args.max_cells is None or w * h <= args.max_cells]
+    results = benchHotPaths(sizes, DENSITIES, args.repeat, log=sys.stdout)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'repeat': args.repeat,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        rows = compareResults(baseline, results, args.threshold)
+        slower = [row for row in rows if row[4]]
+
+        print()
+        print(f'{"benchmark":<40} {"base us":>12} {"now us":>12} {"ratio":>7}')
+        for name, base, seconds, ratio, slow in rows:
+            mark = '  SLOWER' if slow else ''
+            print(f'{name:<40} {base * 1e6:>12.1f} {seconds * 1e6:>12.1f} {ratio:>7.2f}{mark}')
+        print(f'{len(slower)} of {len(rows)} benchmarks are more than {args.threshold * 100:.0f}% slower')
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import threading
+
+from collections import OrderedDict, deque
+
+from constants import GenerationMode
+from gameboard import GameBoard
+from generator import NoGuessGenerator
+
+
+# 설정마다 미리 만들어둘 게임판 수
+DEFAULT_DEPTH = 2
+
+# 미리 만들어둘 설정의 최대 개수. 넘치면 가장 오래 사용하지 않은 설정부터 버림
+DEFAULT_MAX_CONFIGS = 4
+
+# 미리 만들어둔 게임판들의 칸 수 합의 상한 (칸 하나에 몇 바이트 정도 사용함)
+DEFAULT_MAX_CELLS = 8000000
+
+
+# (너비, 높이, 지뢰 수, 생성 방식) 설정에 맞는 새 게임판을 만듦
+# 추측 없이 풀 수 있는 게임판은 generator 에 맡김
+def makeBoard(generator: NoGuessGenerator, width: int, height: int, mines: int, mode: GenerationMode) -> GameBoard:
+    if mode == GenerationMode.NO_GUESS:
+        return generator.generate(width, height, mines)
+
+    board = GameBoard()
+    board.newGame(width, height, mines, mode)
+    return board
+
+
+# 최근에 사용한 설정의 다음 게임판들을 백그라운드 스레드에서 미리 만들어두는 풀
+# 리셋하거나 같은 설정으로 새 게임을 시작할 때 게임판을 기다리지 않고 바로 꺼내 쓸 수 있음
+class BoardPool:
+    def __init__(self, generator: NoGuessGenerator, depth: int = DEFAULT_DEPTH,
+                 maxConfigs: int = DEFAULT_MAX_CONFIGS, maxCells: int = DEFAULT_MAX_CELLS):
+        self.generator = generator
+        self.depth = depth
+        self.maxConfigs = maxConfigs
+        self.maxCells = maxCells
+
+        self.condition = threading.Condition()
+        self.boards = OrderedDict()  # 설정 -> 미리 만든 게임판 deque. 최근에 사용한 설정이 뒤에 옴
+        self.cells = 0  # 미리 만들어둔 게임판들의 칸 수 합
+        self.running = True
+        self.thread = None  # 처음 필요할 때 시작함
+
+        self.hits = 0  # 미리 만들어둔 게임판을 바로 꺼내준 횟수
+        self.misses = 0  # 게임판이 없어서 그 자리에서 만든 횟수
+
+    # 설정에 맞는 게임판을 꺼내줌. 미리 만든 게임판이 없으면 그 자리에서 만듦
+    # 꺼낸 뒤에는 백그라운드에서 그 설정의 게임판을 다시 채워둠
+    def take(self, config) -> GameBoard:
+        with self.condition:
+            if not self.running:
+                board = None
+            else:
+                ready = self.useConfig(config)
+                board = ready.popleft() if ready else None
+                if board is not None:
+                    self.cells -= board.width() * board.height()
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                self.startThread()
+                self.condition.notify()
+
+        if board is None:
+            board = makeBoard(self.generator, *config)
+        return board
+
+    # 백그라운드 스레드를 멈추고 미리 만들어둔 게임판을 모두 버림
+    def shutdown(self):
+        with self.condition:
+            self.running = False
+            self.boards.clear()
+            self.cells = 0
+            self.condition.notify()
+
+    # ===========================================
+    # 여기부터 아래에 있는 함수들은 이 클래스 내부에서 사용하기 위해 만들어진 함수임
+    # ===========================================
+
+    # 설정을 가장 최근에 사용한 것으로 표시하고 그 설정의 deque 를 리턴함
+    # 설정이 너무 많아지면 가장 오래 사용하지 않은 설정의 게임판을 버림
+    def useConfig(self, config):
+        if config in self.boards:
+            self.boards.move_to_end(config)
+        else:
+            self.boards[config] = deque()
+            while len(self.boards) > self.maxConfigs:
+                old, boards = self.boards.popitem(last=False)
+                self.cells -= len(boards) * old[0] * old[1]
+        return self.boards[config]
+
+    def startThread(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='boardpool', daemon=True)
+            self.thread.start()
+
+    # 다음에 미리 만들 설정을 고름. 최근에 사용한 설정부터 채우며, 칸 수 상한을 넘지 않아야 함
+    def nextConfig(self):
+        for config in reversed(self.boards):
+            if len(self.boards[config]) < self.depth and self.cells + config[0] * config[1] <= self.maxCells:
+                return config
+        return None
+
+    def run(self):
+        while True:
+            with self.condition:
+                config = self.nextConfig()
+                while self.running and config is None:
+                    self.condition.wait()
+                    config = self.nextConfig()
+                if not self.running:
+                    return
+
+            board = makeBoard(self.generator, *config)
+
+            with self.condition:
+                # 만드는 동안 설정이 버려졌을 수도 있음
+                if config in self.boards and len(self.boards[config]) < self.depth:
+                    self.boards[config].append(board)
+                    self.cells += config[0] * config[1]
@@ -0,0 +1,129 @@
+import socket
+
+from collections import deque
+
+
+# sendmsg 한 번에 넘길 최대 버퍼 개수 (대부분의 운영체제에서 IOV_MAX 는 1024 이상임)
+MAX_IOV = 64
+
+# Windows 에는 socket.sendmsg 가 없으므로 그 때는 버퍼를 하나씩 보냄
+HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+
+# 소켓에서 받은 데이터를 복사하지 않고 프레임 단위로 읽기 위한 버퍼
+# recv_into 로 bytearray 에 바로 받고, 읽은 부분은 앞쪽 위치만 옮기므로 받을 때마다 전체를 복사하지 않음
+# view(), writable() 이 리턴한 memoryview 는 다음에 버퍼를 바꾸기 전까지만 사용해야 함
+class RecvBuffer:
+    def __init__(self, size: int = 65536):
+        self.buf = bytearray(size)
+        self.start = 0  # 아직 읽지 않은 데이터의 시작
+        self.end = 0  # 받은 데이터의 끝
+
+    def __len__(self):
+        return self.end - self.start
+
+    # 아직 읽지 않은 데이터 전체를 memoryview 로 리턴함
+    def view(self):
+        return memoryview(self.buf)[self.start:self.end]
+
+    # 최소 size 바이트를 받을 수 있는 빈 공간을 memoryview 로 리턴함 (recv_into 에 넘겨줌)
+    # 공간이 모자라면 읽은 부분을 앞으로 당기고, 그래도 모자라면 더 큰 버퍼로 옮김
+    def writable(self, size: int):
+        if len(self.buf) - self.end < size:
+            n = self.end - self.start
+            if len(self.buf) - n >= size:
+                # 크기가 같은 구간 대입이므로 밖에 남아있는 memoryview 가 있어도 됨
+                self.buf[:n] = self.buf[self.start:self.end]
+            else:
+                buf = bytearray(max(len(self.buf) * 2, n + size))
+                buf[:n] = self.buf[self.start:self.end]
+                self.buf = buf
+            self.start = 0
+            self.end = n
+        return memoryview(self.buf)[self.end:]
+
+    # writable() 에 n 바이트를 받았음을 기록함
+    def commit(self, n: int):
+        self.end += n
+
+    # 앞에서부터 n 바이트를 읽었음을 기록함
+    def consume(self, n: int):
+        self.start += n
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+
+    # 소켓에서 받을 수 있는 만큼 받고 받은 바이트 수를 리턴함 (연결이 끊겼으면 0)
+    def recvInto(self, sock: socket.socket, size: int = 65536):
+        n = sock.recv_into(self.writable(size))
+        self.commit(n)
+        return n
+
+
+# 보낼 프레임들의 큐
+# 프레임을 복사하지 않고 memoryview 로 들고 있다가 sendmsg 로 여러 개를 한번에 보냄
+# 여러 클라이언트에게 같은 프레임을 보낼 때도 같은 bytes 객체를 공유함
+# 프레임마다 tag 를 붙여둘 수 있고, 아직 보내기 시작하지 않은 프레임들을 버릴 때 그 tag 들을 돌려받음
+# tag 가 None 인 데이터 (핸드셰이크 등) 는 버리지 않음
+class SendQueue:
+    def __init__(self):
+        self.frames = deque()
+        self.tags = deque()  # frames 의 각 프레임에 붙인 tag
+        self.size = 0  # 큐에 남아있는 바이트 수
+        self.partial = False  # 첫 프레임을 보내기 시작했는지 여부 (일부만 보냈거나 다른 곳에서 보내는 중)
+
+    def __len__(self):
+        return self.size
+
+    def push(self, data, tag=None):
+        if len(data) > 0:
+            self.frames.append(memoryview(data))
+            self.tags.append(tag)
+            self.size += len(data)
+
+    # 아직 한 바이트도 보내지 않은 프레임들을 큐의 뒤에서부터 버리고, 그 프레임들의 tag 를 순서대로 리턴함
+    # 보내기 시작한 첫 프레임은 중간에 끊을 수 없으므로 남겨두고, tag 가 None 인 데이터를 만나면 멈춤
+    def dropUnsent(self):
+        keep = 1 if self.partial else 0
+        tags = []
+        while len(self.frames) > keep and self.tags[-1] is not None:
+            self.size -= len(self.frames.pop())
+            tags.append(self.tags.pop())
+        tags.reverse()
+        return tags
+
+    # 큐에서 사용할 수 있는 만큼 논블로킹 소켓으로 보내고 보낸 바이트 수를 리턴함
+    # 지금 바로 보낼 수 없으면 0 을 리턴함
+    def send(self, sock: socket.socket):
+        if not self.frames:
+            return 0
+        try:
+            if HAS_SENDMSG:
+                sent = sock.sendmsg([self.frames[i] for i in range(min(MAX_IOV, len(self.frames)))])
+            else:
+                sent = sock.send(self.frames[0])
+        except (BlockingIOError, InterruptedError):
+            return 0
+        self.advance(sent)
+        return sent
+
+    # 첫 프레임을 큐 밖에서 (sock_sendall 등으로) 보내기 시작했음을 기록하고 그 프레임을 리턴함
+    # 다 보낸 뒤에는 advance 로 프레임 길이만큼 기록해야 함
+    def startSending(self):
+        self.partial = True
+        return self.frames[0]
+
+    # 앞에서부터 n 바이트를 보냈음을 기록함
+    def advance(self, n: int):
+        self.size -= n
+        while n > 0:
+            frame = self.frames[0]
+            if len(frame) <= n:
+                n -= len(frame)
+                self.frames.popleft()
+                self.tags.popleft()
+                self.partial = False
+            else:
+                self.frames[0] = frame[n:]
+                self.partial = True
+                n = 0
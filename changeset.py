@@ -0,0 +1,61 @@
+# 게임판에서 열림 상태나 이미지가 바뀐 칸들을 모아두는 클래스
+# 칸은 GameBoard 와 같은 1차원 인덱스(y * w + x)로 나타내며,
+# 한번에 많은 칸이 열리는 경우를 위해 칸 하나하나가 아닌 [start, end) 구간으로 저장함
+class ChangeSet:
+    def __init__(self):
+        self.full = False  # True 이면 게임판 전체가 바뀐 것으로 취급함 (새 게임, 게임판 불러오기 등)
+        self.ranges = []  # 바뀐 칸들의 [start, end) 구간 리스트. 겹치거나 순서가 섞여있을 수 있음
+
+    # 칸 하나가 바뀌었음을 기록
+    def add(self, i: int):
+        self.ranges.append((i, i + 1))
+
+    # [start, end) 구간의 칸들이 바뀌었음을 기록
+    def addRange(self, start: int, end: int):
+        if start < end:
+            self.ranges.append((start, end))
+
+    # 게임판 전체가 바뀌었음을 기록
+    def setFull(self):
+        self.full = True
+        self.ranges = []
+
+    # 다른 ChangeSet 의 내용을 이 ChangeSet 에 합침
+    def merge(self, other):
+        if self.full:
+            return
+        if other.full:
+            self.setFull()
+        else:
+            self.ranges.extend(other.ranges)
+
+    # 겹치거나 맞닿은 구간을 합쳐서, 정렬되고 서로 겹치지 않는 구간 리스트를 리턴
+    def getRanges(self):
+        if len(self.ranges) <= 1:
+            return list(self.ranges)
+
+        merged = []
+        currStart, currEnd = None, None
+        for start, end in sorted(self.ranges):
+            if currEnd is not None and start <= currEnd:
+                currEnd = max(currEnd, end)
+                continue
+            if currEnd is not None:
+                merged.append((currStart, currEnd))
+            currStart, currEnd = start, end
+        merged.append((currStart, currEnd))
+
+        self.ranges = merged
+        return list(merged)
+
+    # 바뀐 칸들의 인덱스를 중복 없이 순서대로 돌려줌 (full 인 경우는 따로 확인해야 함)
+    def __iter__(self):
+        for start, end in self.getRanges():
+            yield from range(start, end)
+
+    # 바뀐 칸의 개수 (full 인 경우는 따로 확인해야 함)
+    def __len__(self):
+        return sum(end - start for start, end in self.getRanges())
+
+    def __bool__(self):
+        return self.full or len(self.ranges) > 0
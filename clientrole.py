@@ -1,6 +1,7 @@
 from abc import ABCMeta, abstractmethod
 from typing import Optional, Callable, Sequence, Tuple
 
+from changeset import ChangeSet
 from constants import ImageType
 
 
@@ -53,6 +54,12 @@ class IClientRole(metaclass=ABCMeta):
     def getPlaytime(self) -> float:
         pass
 
+    # 마지막으로 부른 뒤로 열림 상태나 이미지가 바뀐 칸들을 리턴함
+    # 화면에서 바뀐 칸만 다시 그리는데 사용
+    @abstractmethod
+    def takeChanges(self) -> ChangeSet:
+        pass
+
     @abstractmethod
     def height(self) -> int:
         pass
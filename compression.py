@@ -0,0 +1,157 @@
+import lzma
+import time
+import zlib
+
+from constants import FRAME_HEADER, FRAME_COMPRESSED, FRAME_RESET
+
+
+# 지원하는 압축 방식. 클라이언트가 제시한 순서대로 이 중에서 처음으로 지원하는 것을 고름
+COMPRESSION_METHODS = ('zlib', 'lzma')
+
+# 내용이 이보다 작은 프레임은 압축하지 않고 그대로 보냄 (바이트)
+DEFAULT_THRESHOLD = 1024
+
+# 압축 수준. 게임판은 대부분 같은 값이라 낮은 수준으로도 충분히 작아지므로 빠른 쪽을 고름
+ZLIB_LEVEL = 1
+LZMA_PRESET = 1
+
+
+# 클라이언트가 제시한 압축 방식들 중 지원하는 첫 번째 방식을 리턴함 (없으면 None)
+def chooseCompression(offered, allowed=COMPRESSION_METHODS):
+    for method in offered:
+        if method in allowed:
+            return method
+    return None
+
+
+# 연결 하나의 압축 통계
+class CompressionStats:
+    def __init__(self, method):
+        self.method = method
+        self.frames = 0  # 처리한 프레임 수
+        self.compressedFrames = 0  # 그 중 압축한 프레임 수
+        self.rawBytes = 0  # 압축하기 전 내용의 크기 합
+        self.encodedBytes = 0  # 실제로 주고받은 내용의 크기 합
+        self.seconds = 0.0  # 압축하거나 푸는 데 사용한 CPU 시간
+
+    # 압축 후 크기 / 압축 전 크기 (작을수록 많이 줄어든 것)
+    def ratio(self) -> float:
+        if self.rawBytes == 0:
+            return 1.0
+        return self.encodedBytes / self.rawBytes
+
+    def asDict(self):
+        return {
+            'method': self.method,
+            'frames': self.frames,
+            'compressedFrames': self.compressedFrames,
+            'rawBytes': self.rawBytes,
+            'encodedBytes': self.encodedBytes,
+            'ratio': self.ratio(),
+            'seconds': self.seconds,
+        }
+
+
+# 서버가 보내는 프레임의 내용을 압축함
+# stream 이 True 이면 연결마다 하나의 압축 상태를 계속 이어서 사용하므로 비슷한 프레임이 반복될 때 더 작아지지만,
+# 프레임을 클라이언트마다 따로 압축해야 함 (zlib 만 지원)
+class FrameCompressor:
+    def __init__(self, method: str, stream: bool = False, threshold: int = DEFAULT_THRESHOLD):
+        self.method = method
+        self.stream = stream and method == 'zlib'
+        self.threshold = threshold
+        self.stats = CompressionStats(method)
+        self.compressor = zlib.compressobj(ZLIB_LEVEL) if self.stream else None
+        self.resetPending = False  # 다음에 압축하는 프레임에 FRAME_RESET 을 붙여야 하는지 여부
+
+    # 이미 압축한 프레임 중 일부를 보내지 않기로 했을 때 부름
+    # 스트림 압축이면 압축 상태를 새로 시작하고, 다음에 압축하는 프레임에 FRAME_RESET 을 붙여서 알려줌
+    def reset(self):
+        if self.stream:
+            self.compressor = zlib.compressobj(ZLIB_LEVEL)
+            self.resetPending = True
+
+    # FRAME_HEADER 로 시작하는 프레임을 받아, 내용이 충분히 크면 압축한 프레임을 리턴함
+    # 여러 클라이언트에게 같은 프레임을 보낼 때 같은 cache(dict) 를 넘기면, 같은 설정으로 압축한 결과를 같이 씀
+    def compressFrame(self, frame, cache=None):
+        kind, base, version, startTime, endTime, ackCount, msgLen = FRAME_HEADER.unpack_from(frame)
+        stats = self.stats
+        stats.frames += 1
+        stats.rawBytes += msgLen
+        if msgLen < self.threshold:
+            stats.encodedBytes += msgLen
+            return frame
+
+        key = (self.method, self.threshold)
+        if not self.stream and cache is not None and key in cache:
+            encoded, size = cache[key]
+        else:
+            started = time.thread_time()
+            body = memoryview(frame)[len(frame) - msgLen:]
+            if self.stream:
+                data = self.compressor.compress(body) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            elif self.method == 'zlib':
+                data = zlib.compress(body, ZLIB_LEVEL)
+            else:
+                data = lzma.compress(body, preset=LZMA_PRESET)
+            stats.seconds += time.thread_time() - started
+
+            # 스트림 압축은 압축 상태가 이미 바뀌었으므로 커지더라도 압축한 것을 보내야 함
+            if len(data) >= msgLen and not self.stream:
+                encoded, size = frame, msgLen
+            else:
+                kind |= FRAME_COMPRESSED
+                if self.resetPending:
+                    kind |= FRAME_RESET
+                    self.resetPending = False
+                header = FRAME_HEADER.pack(kind, base, version, startTime, endTime, ackCount, len(data))
+                encoded = b''.join([header, memoryview(frame)[FRAME_HEADER.size:len(frame) - msgLen], data])
+                size = len(data)
+            if not self.stream and cache is not None:
+                cache[key] = (encoded, size)
+
+        if encoded is not frame:
+            stats.compressedFrames += 1
+        stats.encodedBytes += size
+        return encoded
+
+
+# 클라이언트에서 FrameCompressor 가 압축한 내용을 풂
+class FrameDecompressor:
+    def __init__(self, method: str, stream: bool = False):
+        self.method = method
+        self.stream = stream and method == 'zlib'
+        self.stats = CompressionStats(method)
+        self.decompressor = zlib.decompressobj() if self.stream else None
+
+    # FRAME_RESET 이 붙은 프레임을 받으면 압축 상태를 새로 시작함
+    def reset(self):
+        if self.stream:
+            self.decompressor = zlib.decompressobj()
+
+    # 압축되지 않은 프레임의 내용도 통계에 넣기 위해 record 를 부름
+    def record(self, size: int):
+        self.stats.frames += 1
+        self.stats.rawBytes += size
+        self.stats.encodedBytes += size
+
+    # 압축된 내용을 풀어서 리턴함. 잘못된 데이터면 ValueError 를 발생시킴
+    def decompress(self, data):
+        started = time.thread_time()
+        try:
+            if self.stream:
+                result = self.decompressor.decompress(data)
+            elif self.method == 'zlib':
+                result = zlib.decompress(data)
+            else:
+                result = lzma.decompress(data)
+        except (zlib.error, lzma.LZMAError) as e:
+            raise ValueError('Invalid compressed frame') from e
+
+        stats = self.stats
+        stats.seconds += time.thread_time() - started
+        stats.frames += 1
+        stats.compressedFrames += 1
+        stats.rawBytes += len(result)
+        stats.encodedBytes += len(data)
+        return result
@@ -3,6 +3,7 @@
 
 import sys
 import os
+import struct
 
 from enum import IntEnum
 
@@ -16,7 +17,55 @@ class ImageType(IntEnum):
     WRONG_FLAG = 5  # 싱글플레이 게임이 끝날때 나타나는, 지뢰가 아닌데 지뢰라고 표기한 곳. 빨간 배경의 깃발 모습
 
 
+class GenerationMode(IntEnum):
+    RANDOM = 0  # 게임을 시작할 때 모든 지뢰를 무작위로 배치함
+    SAFE = 1  # 첫 번째로 연 칸에는 지뢰가 없도록, 지뢰를 첫 클릭 때 배치함
+    ZERO = 2  # 첫 번째로 연 칸과 그 주변(3x3)에 지뢰가 없도록, 지뢰를 첫 클릭 때 배치함 (칸이 부족하면 SAFE 처럼 동작)
+    NO_GUESS = 3  # 시작 칸이 열린 상태에서 추측 없이 끝까지 풀 수 있는 게임판 (generator.py 에서 만듦)
+
+
+# 클라이언트가 서버에게 보내는 action 의 종류 (바이너리 action 프레임의 opcode 로도 사용함)
+class ActionType(IntEnum):
+    OPEN_CELL = 1
+    OPEN_CELL_ADJACENT = 2
+    CYCLE_CELL_IMAGE = 3
+    RESYNC = 4  # 게임판 전체를 다시 보내달라는 요청. 게임판에는 적용되지 않음
+
+
+# 서버가 클라이언트에게 보내는 프레임의 종류
+class FrameKind(IntEnum):
+    SNAPSHOT = 0  # 게임판 전체 (GameBoard.serializeGame)
+    DELTA = 1  # 기준 버전 이후로 바뀐 칸들의 상태만 담음 (GameBoard.serializeChanges)
+    RESYNC = 2  # 게임판 전체. 주기적으로나 클라이언트가 요청할 때 보냄
+
+
 DEFAULT_PORT = 5995
-MAGIC_STRING = b'minesweeper-qt/1.0\n'
+MAGIC_STRING = b'minesweeper-qt/2.1\n'
+# 이전 버전의 매직 문자열들. 서버는 이 버전의 클라이언트도 받아줌
+MAGIC_STRING_V20 = b'minesweeper-qt/2.0\n'  # hello 를 주고받지 않음
+MAGIC_STRING_V12 = b'minesweeper-qt/1.2\n'  # hello 를 주고받지 않고, action 을 JSON 으로 보냄
+
+# 매직 문자열 뒤에 클라이언트와 서버가 한번씩 주고받는 hello 메시지의 헤더 (JSON 내용의 길이)
+# 클라이언트는 원하는 설정(압축 방식 등)을 보내고, 서버는 그 중 실제로 사용할 설정을 nonce 뒤에 보냄
+HELLO_HEADER = struct.Struct('!L')
+MAX_HELLO_SIZE = 4096
+
+# 서버가 보내는 프레임의 헤더: 종류(FrameKind), 기준 버전, 게임판 버전, 시작 후 지난 시간, 끝난 후 지난 시간,
+# ack 개수, 내용의 길이
+# 헤더 뒤에는 이 프레임에 반영된 action 들의 (nodeId, seqId) 가 ack 개수만큼 이어지고, 그 뒤에 내용이 옴
+# ack 가 (0, 0) 이면 새 게임이 시작된 것임
+# DELTA 는 기준 버전 이후로 바뀐 칸들을 모두 담고 있으므로, 기준 버전보다 오래된 게임판에는 적용할 수 없음
+FRAME_HEADER = struct.Struct('!B2L2d2L')
+FRAME_ACK = struct.Struct('!2L')
+
+# 프레임의 내용이 압축되었으면 종류(FrameKind)에 이 비트가 켜짐 (compression.py 참고)
+FRAME_COMPRESSED = 0x80
+
+# 스트림 압축을 쓰는 연결에서, 이 프레임부터 압축 상태를 새로 시작했으면 종류에 이 비트가 켜짐
+# 느린 클라이언트에게 보낼 프레임들을 버리고 게임판 전체로 합칠 때 사용함
+FRAME_RESET = 0x40
+
+# 클라이언트가 보내는 바이너리 action 프레임: seqId, ActionType, x, y
+ACTION_FRAME = struct.Struct('!LB2L')
 
 RESOURCE_PATH = os.path.join(getattr(sys, '_MEIPASS', os.path.abspath(os.path.dirname(__file__))), 'resource')
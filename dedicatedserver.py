@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import json
+import socket
+import time
+
+from typing import Optional
+
+from boardpool import BoardPool
+from compression import COMPRESSION_METHODS, DEFAULT_THRESHOLD
+from constants import GenerationMode, DEFAULT_PORT
+from generator import NoGuessGenerator
+from integratedserver import IntegratedServer, ClientState, acceptConnections
+from metrics import ServerMetrics, LOOP_PROBE_INTERVAL
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# 방 이름을 보내지 않은 클라이언트 (예전 버전 포함) 가 들어가는 방
+DEFAULT_ROOM = 'default'
+
+# 한 프로세스에서 만들 수 있는 방의 최대 개수
+DEFAULT_MAX_ROOMS = 1000
+
+# 클라이언트가 만드는 방의 최대 칸 수와 방 이름의 최대 길이
+MAX_ROOM_CELLS = 1000 * 1000
+MAX_ROOM_NAME = 64
+
+# 게임이 끝나고 이 시간(초)이 지나면 같은 설정으로 새 게임을 시작함
+RESTART_DELAY = 5.0
+
+# 클라이언트가 만든 방에 이 시간(초)이 지나도록 아무도 들어오지 않으면 닫음 (만든 클라이언트가 인증에 실패한 경우 등)
+EMPTY_ROOM_TIMEOUT = 30.0
+
+# 한번에 많은 클라이언트가 접속해도 거절되지 않도록 accept 대기열을 넉넉하게 잡음
+LISTEN_BACKLOG = 1024
+
+
+# 설정 dict 를 (너비, 높이, 지뢰 수, 생성 방식) 으로 바꿈. 잘못된 설정이면 ValueError 를 발생시킴
+def parseConfig(create) -> tuple:
+    if not isinstance(create, dict):
+        raise ValueError('Invalid room config')
+    width = create.get('width')
+    height = create.get('height')
+    mines = create.get('mines')
+    if not all(isinstance(value, int) for value in (width, height, mines)):
+        raise ValueError('Invalid room config')
+    if width <= 0 or height <= 0 or width * height > MAX_ROOM_CELLS or not 0 < mines < width * height:
+        raise ValueError('Invalid room config')
+    return width, height, mines, GenerationMode(create.get('mode', GenerationMode.RANDOM))
+
+
+# DedicatedServer 의 방 하나
+# 화면이 없으므로 게임이 끝나면 스스로 새 게임을 시작하고, 클라이언트가 만든 방은 모두 나가면 닫힘
+class Room(IntegratedServer):
+    def __init__(self, host, name: str, boardPool: BoardPool, persistent: bool):
+        super().__init__(boardPool, host.metrics)
+        self.host = host  # type: DedicatedServer
+        self.name = name
+        self.persistent = persistent  # False 이면 마지막 클라이언트가 나갈 때 닫힘
+        self.listening = True
+        self.restartTimer = None  # type: Optional[asyncio.TimerHandle]
+        self.created = asyncio.Event()  # 첫 게임판을 만들었으면 set 됨
+        self.setRefreshCallback(self.checkRestart)
+
+    # 게임이 끝났으면 RESTART_DELAY 뒤에 새 게임을 시작하도록 예약함
+    def checkRestart(self):
+        if self.endTime >= 0 and self.restartTimer is None and self.loop is not None:
+            self.restartTimer = self.loop.call_later(RESTART_DELAY, self.restart)
+
+    def restart(self):
+        self.restartTimer = None
+        self.host.startTask(self.host.resetRoom(self, self.config))
+
+    def removeNode(self, node: ClientState):
+        super().removeNode(node)
+        self.closeIfEmpty()
+
+    def expireSession(self, nodeId: int):
+        super().expireSession(nodeId)
+        self.closeIfEmpty()
+
+    # 클라이언트가 만든 방이 비어있으면 닫음. 연결이 끊긴 클라이언트가 다시 접속할 수 있는 동안은 닫지 않음
+    def closeIfEmpty(self):
+        if len(self.nodes) == 0 and len(self.sessions) == 0 and not self.persistent \
+                and self.host.rooms.get(self.name) is self:
+            self.host.removeRoom(self.name)
+
+    def detach(self):
+        if self.restartTimer is not None:
+            self.restartTimer.cancel()
+            self.restartTimer = None
+        super().detach()
+
+
+# PyQt5 없이 실행되는 서버
+# 한 프로세스, 한 이벤트 루프에서 여러 방을 열고, 클라이언트는 hello 의 'room' 으로 들어갈 방을 고름
+# 없는 방에 'create' 설정을 보내면 방을 만들고, 핀 번호를 hello 응답으로 알려줌
+class DedicatedServer:
+    clientType = ClientState  # 접속한 클라이언트마다 만드는 객체
+
+    # generatorWorkers 는 추측 없이 풀 수 있는 게임판을 만들 때 사용할 프로세스 수 (기본값은 CPU 수)
+    def __init__(self, port: int = DEFAULT_PORT, maxRooms: int = DEFAULT_MAX_ROOMS, allowCreate: bool = True,
+                 generatorWorkers: int = None):
+        self.port = port
+        self.maxRooms = maxRooms
+        self.allowCreate = allowCreate
+        self.rooms = dict()  # type: dict[str, Room]
+        self.boardPool = BoardPool(NoGuessGenerator(generatorWorkers))  # 모든 방이 같이 씀
+        self.metrics = ServerMetrics()  # 모든 방과 클라이언트가 같이 씀
+        self.compressionMethods = COMPRESSION_METHODS
+        self.compressionThreshold = DEFAULT_THRESHOLD
+        self.loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self.serverSock = None  # type: Optional[socket.socket]
+        self.tasks = set()  # 이벤트 루프는 태스크를 약하게 참조하므로 끝날 때까지 여기에 들고 있음
+
+    # 소켓을 열고 초기 방들을 만든 뒤 연결을 받기 시작함
+    # rooms 는 처음부터 열어둘 (방 이름, 설정) 들로, 이 방들은 비어도 닫히지 않음
+    async def serve(self, rooms=(), host: str = '0.0.0.0'):
+        self.loop = asyncio.get_running_loop()
+        self.serverSock = socket.socket()
+        self.serverSock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.serverSock.setblocking(False)
+        self.serverSock.bind((host, self.port))
+        self.serverSock.listen(LISTEN_BACKLOG)
+
+        for name, config in rooms:
+            room = self.addRoom(name, True)
+            await self.resetRoom(room, config)
+            print(f'Room {name!r}: pin {room.pin}, {config[0]}x{config[1]} with {config[2]} mines')
+
+        await acceptConnections(self.serverSock, self, self.clientType)
+
+    # 핸드셰이크에서 클라이언트가 들어갈 방과 hello 응답에 더할 내용을 리턴함
+    # 들어갈 방이 없으면 (None, {'error': 이유}) 를 리턴함
+    async def selectRoom(self, hello):
+        name = hello.get('room', DEFAULT_ROOM)
+        if not isinstance(name, str) or len(name) > MAX_ROOM_NAME:
+            return None, {'error': 'invalid room name'}
+
+        room = self.rooms.get(name)
+        if room is not None:
+            # 다른 클라이언트가 만드는 중인 방이면 빈 게임판을 받지 않도록 첫 게임판이 만들어질 때까지 기다림
+            await room.created.wait()
+            if self.rooms.get(name) is not room:
+                return None, {'error': 'no such room'}
+            return room, {'room': name}
+        if 'create' not in hello or not self.allowCreate:
+            return None, {'error': 'no such room'}
+        if len(self.rooms) >= self.maxRooms:
+            return None, {'error': 'too many rooms'}
+        try:
+            config = parseConfig(hello['create'])
+        except ValueError:
+            return None, {'error': 'invalid room config'}
+
+        # 게임판을 만드는 동안 같은 이름으로 들어오는 클라이언트는 게임판이 만들어진 뒤에 이 방에 들어감
+        room = self.addRoom(name, False)
+        await self.resetRoom(room, config)
+        return room, {'room': name, 'pin': room.pin}
+
+    def addRoom(self, name: str, persistent: bool) -> Room:
+        room = Room(self, name, self.boardPool, persistent)
+        room.attach(self.loop)
+        self.rooms[name] = room
+        if not persistent:
+            self.loop.call_later(EMPTY_ROOM_TIMEOUT, room.closeIfEmpty)
+        return room
+
+    def removeRoom(self, name: str):
+        room = self.rooms.pop(name, None)
+        if room is not None:
+            room.detach()
+
+    # 추측 없이 풀 수 있는 게임판은 만드는 데 오래 걸릴 수 있으므로 이벤트 루프 밖에서 만듦
+    async def resetRoom(self, room: Room, config):
+        board = await self.loop.run_in_executor(None, self.boardPool.take, config)
+        room.resetBoard(board, config)
+        room.created.set()
+
+    def startTask(self, coro):
+        task = self.loop.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    # 방마다 접속한 클라이언트 수와 게임 상태를 {방 이름: dict} 로 리턴함
+    def getRoomStats(self):
+        return {name: {'nodes': len(room.nodes), 'version': room.version, 'finished': room.endTime >= 0}
+                for name, room in list(self.rooms.items())}
+
+    # 서버 전체의 통계를 dict 로 리턴함
+    # 큐는 지금 상태를 보여주고, metrics 는 마지막으로 metrics.reset() 을 부른 뒤의 기록을 담음
+    def getStats(self):
+        nodes = [node for room in list(self.rooms.values()) for node in list(room.nodes.values())]
+        queued = [len(node.sendQueue) for node in nodes]
+        return {
+            'time': time.time(),
+            'rooms': len(self.rooms),
+            'nodes': len(nodes),
+            'queued': sum(queued),
+            'maxQueued': max(queued, default=0),
+            'metrics': self.metrics.asDict(),
+        }
+
+    # interval 초마다 통계를 한 줄의 JSON 으로 출력함. 각 줄의 metrics 는 그 주기 동안의 기록임
+    async def logStats(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            print(json.dumps(self.getStats()), flush=True)
+            self.metrics.reset()
+
+
+# 클라이언트마다 소켓을 하나씩 사용하므로, 가능하면 열 수 있는 파일 수의 상한을 최대로 올림
+def raiseFileLimit():
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+# dedicatedserver.py 와 shardedserver.py 가 같이 사용하는 명령줄 인자들
+def addServerArguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--rooms', type=int, default=1, help='처음부터 열어둘 방 수')
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=16)
+    parser.add_argument('--mines', type=int, default=99)
+    parser.add_argument('--mode', choices=[mode.name.lower() for mode in GenerationMode], default='safe')
+    parser.add_argument('--max-rooms', type=int, default=DEFAULT_MAX_ROOMS)
+    parser.add_argument('--no-create', action='store_true', help='클라이언트가 방을 만들지 못하게 함')
+    parser.add_argument('--stats-interval', type=float, default=0, help='N 초마다 통계를 JSON 으로 출력')
+    parser.add_argument('--probe-interval', type=float, default=LOOP_PROBE_INTERVAL,
+                        help='클라이언트가 접속해 있는 동안 이벤트 루프가 밀린 정도를 재는 주기(초). 0 이면 재지 않음')
+
+
+# args.stats_interval 이 있으면 통계를 출력하면서 server 를 실행함
+async def runServer(server: DedicatedServer, args):
+    server.metrics.probeInterval = args.probe_interval
+    statsTask = None
+    if args.stats_interval > 0:
+        statsTask = asyncio.get_running_loop().create_task(server.logStats(args.stats_interval))
+    try:
+        await server.serve(initialRooms(args), args.host)
+    finally:
+        if statsTask is not None:
+            statsTask.cancel()
+
+
+# 처음부터 열어둘 (방 이름, 설정) 들. 첫 방은 DEFAULT_ROOM 임
+def initialRooms(args):
+    config = (args.width, args.height, args.mines, GenerationMode[args.mode.upper()])
+    names = [DEFAULT_ROOM] + [str(k) for k in range(1, args.rooms)]
+    return [(name, config) for name in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='화면 없이 여러 방을 여는 협동 서버')
+    addServerArguments(parser)
+    args = parser.parse_args()
+
+    raiseFileLimit()
+    server = DedicatedServer(args.port, args.max_rooms, not args.no_create)
+    asyncio.run(runServer(server, args))
+
+
+if __name__ == '__main__':
+    main()
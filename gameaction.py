@@ -1,13 +1,70 @@
-# 클라이언트가 게임에서 행한 동작을 dict 형식으로 바꿈
+import json
+import struct
+
+from constants import ActionType, ACTION_FRAME
+
+
+# action 을 JSON 으로 주고받던 이전 버전에서 사용하던 이름
+ACTION_NAMES = {
+    'openCell': ActionType.OPEN_CELL,
+    'openCellAdjacent': ActionType.OPEN_CELL_ADJACENT,
+    'cycleCellImage': ActionType.CYCLE_CELL_IMAGE,
+    'resync': ActionType.RESYNC,
+}
+
+# 이전 버전의 JSON action 프레임 헤더: seqId, 내용의 길이
+JSON_FRAME_HEADER = struct.Struct('!2L')
+
+VALID_ACTIONS = frozenset(ActionType)
+
+
+# 클라이언트가 게임에서 행한 동작을 (ActionType, x, y) 튜플로 바꿈
 class GameAction:
     def openCell(self, x, y):
-        dic = {'action': 'openCell', 'x': x, 'y': y}
-        return dic
+        return ActionType.OPEN_CELL, x, y
 
     def openCellAdjacent(self, x, y):
-        dic = {'action': 'openCellAdjacent', 'x': x, 'y': y}
-        return dic
+        return ActionType.OPEN_CELL_ADJACENT, x, y
 
     def cycleCellImage(self, x, y):
-        dic = {'action': 'cycleCellImage', 'x': x, 'y': y}
-        return dic
+        return ActionType.CYCLE_CELL_IMAGE, x, y
+
+    # 게임판 전체를 다시 보내달라는 요청 (게임판에는 적용되지 않고 서버에서만 처리함)
+    def resync(self):
+        return ActionType.RESYNC, 0, 0
+
+
+# action 을 seqId 와 함께 바이너리 action 프레임(ACTION_FRAME)으로 만듦
+def encodeAction(seqId: int, action):
+    return ACTION_FRAME.pack(seqId, *action)
+
+
+# 버퍼에 완전히 도착한 바이너리 action 프레임들을 읽어서 ((seqId, action) 리스트, 읽은 바이트 수) 를 리턴함
+# 알 수 없는 action 이 있으면 ValueError 를 발생시킴
+def decodeActions(buf):
+    size = len(buf) - len(buf) % ACTION_FRAME.size
+    actions = []
+    for seqId, opcode, x, y in ACTION_FRAME.iter_unpack(memoryview(buf)[:size]):
+        if opcode not in VALID_ACTIONS:
+            raise ValueError('Unknown action')
+        actions.append((seqId, (ActionType(opcode), x, y)))
+    return actions, size
+
+
+# 이전 버전의 JSON action 프레임들을 읽어서 decodeActions 와 같은 형식으로 리턴함
+def decodeJsonActions(buf):
+    actions = []
+    offset = 0
+    while len(buf) - offset >= JSON_FRAME_HEADER.size:
+        seqId, msgLen = JSON_FRAME_HEADER.unpack_from(buf, offset)
+        if len(buf) - offset - JSON_FRAME_HEADER.size < msgLen:
+            break
+        msg = bytes(buf[offset + JSON_FRAME_HEADER.size:offset + JSON_FRAME_HEADER.size + msgLen])
+        offset += JSON_FRAME_HEADER.size + msgLen
+
+        try:
+            action = json.loads(msg.decode('utf-8'))
+            actions.append((seqId, (ACTION_NAMES[action['action']], int(action['x']), int(action['y']))))
+        except (UnicodeDecodeError, KeyError, TypeError) as e:
+            raise ValueError('Invalid action') from e
+    return actions, offset
@@ -1,79 +1,359 @@
+import re
 import random
-import pickle
+import struct
 
+from bisect import bisect_right
+from changeset import ChangeSet
 from constants import *
-from collections import deque
+
+
+# 칸의 이미지는 바이트 하나에 ImageType 값으로 저장하므로, 값에서 ImageType을 바로 찾기 위한 튜플
+IMAGE_TYPES = tuple(ImageType)
+GENERATION_MODES = tuple(GenerationMode)
+
+# 칸의 이미지로 올 수 있는 바이트 값들
+VALID_IMAGES = bytes(IMAGE_TYPES)
+
+# finishGame에서 (지뢰 여부 * 8 + 이미지) 값을 게임이 끝난 뒤의 이미지로 바꾸는 변환표
+FINISH_TABLE = bytes(
+    [ImageType.WRONG_FLAG if i == ImageType.FLAG else i for i in range(8)] +
+    [i if i in {ImageType.BLOWN_UP_MINE, ImageType.FLAG} else ImageType.MISSED_MINE for i in range(8)] +
+    [0] * 240
+)
+
+# 0/1 로 된 지뢰 정보를 0/8 로 바꾸는 변환표
+MINE_KEY_TABLE = bytes([0, 8] + [0] * 254)
+
+
+# 주변에 지뢰가 없는 칸(주변 지뢰 개수가 0)이 가로로 이어진 구간을 찾는 정규식
+ZERO_RUN = re.compile(b'\x00+')
+
+# 0이 아닌 칸이 가로로 이어진 구간을 찾는 정규식
+NONZERO_RUN = re.compile(b'[^\x00]+')
+
+# 0/1 로 된 마스크를 0x00/0xff 로 바꾸는 변환표
+MASK_TABLE = bytes([0, 0xff] + [0] * 254)
+
+
+# serializeGame 이 만드는 바이너리 형식
+# 헤더: 매직(4바이트), 버전, 생성 방식, 너비, 높이, 아직 배치하지 않은 지뢰 개수
+# 헤더 뒤에는 칸마다 1비트씩 지뢰, 열림, 이미지 비트 0~2 의 다섯 평면이 순서대로 이어짐 (바이트 단위로 채움)
+BOARD_MAGIC = b'MSWB'
+BOARD_VERSION = 1
+BOARD_HEADER = struct.Struct('!4sBB3L')
+IMAGE_BITS = 3
+
+# serializeChanges 가 만드는 바이너리 형식
+# 바뀐 구간마다 (시작 인덱스, 칸 수) 헤더 뒤에 칸마다 1바이트씩 상태(열림 여부 | 이미지 << 1)가 이어짐
+CHANGES_RANGE_HEADER = struct.Struct('!2L')
+
+# 칸 상태 바이트와 열림 여부, 이미지 사이의 변환표
+STATE_IMAGE_TABLE = bytes([(v << 1) & 0xff for v in range(256)])
+STATE_TO_OPENED_TABLE = bytes([v & 1 for v in range(256)])
+STATE_TO_IMAGE_TABLE = bytes([v >> 1 for v in range(256)])
+
+# 0/1 을 문자 '0'/'1' 로, 또 그 반대로 바꾸는 변환표 (비트 평면을 int(..., 2) 로 한번에 묶기 위함)
+BIT_TO_CHAR = bytes.maketrans(b'\x00\x01', b'01')
+CHAR_TO_BIT = bytes.maketrans(b'01', b'\x00\x01')
+
+# 이미지 값에서 k번째 비트만 꺼내는 변환표, 그리고 0/1 을 k번째 비트로 되돌리는 변환표
+IMAGE_BIT_TABLES = [bytes([(v >> k) & 1 for v in range(256)]) for k in range(IMAGE_BITS)]
+IMAGE_SHIFT_TABLES = [bytes([(v & 1) << k for v in range(256)]) for k in range(IMAGE_BITS)]
+
+
+# 0/1 로 된 바이트 배열을 칸마다 1비트로 묶음 (첫 칸이 첫 바이트의 최하위 비트)
+def packBits(plane):
+    n = len(plane)
+    if n == 0:
+        return b''
+    return int(plane.translate(BIT_TO_CHAR)[::-1], 2).to_bytes((n + 7) // 8, 'little')
+
+
+# packBits 로 묶은 데이터를 길이 n 인 0/1 바이트 배열로 풀어냄
+def unpackBits(data, n):
+    if n == 0:
+        return b''
+    bits = format(int.from_bytes(data, 'little'), 'b').encode('ascii')
+    bits = bits.rjust(n, b'0')[::-1]
+    return bits[:n].translate(CHAR_TO_BIT)
+
+
+# 두 바이트 배열을 칸마다 OR 연산한 결과를 리턴함
+# 파이썬 반복문 대신 큰 정수 연산을 사용하므로 게임판 전체를 한번에 처리할 수 있음
+def orPlanes(a, b):
+    n = len(a)
+    return (int.from_bytes(a, 'little') | int.from_bytes(b, 'little')).to_bytes(n, 'little')
 
 
 # 지뢰찾기 게임판
 class GameBoard:
     def __init__(self):
         # 이 변수들은 여기서는 선언만 하고 new_game() 에서 초기화 함
-        # 모든 2차원 리스트는 arr[y][x] 처럼 접근함
-        self.mines = [[]]  # 2차원 리스트, 지뢰인 칸은 True, 아니면 False
-        self.opened = [[]]  # 2차원 리스트, 열린 칸은 True, 아니면 False
-        self.images = [[]]  # 2차원 리스트, IMAGE_* 으로 각 칸을 표시함
+        # 모든 칸 정보는 길이가 w * h 인 bytearray 에 arr[y * w + x] 처럼 저장함
+        # (칸 하나가 1바이트를 차지하므로 큰 게임판에서도 메모리를 적게 사용함)
+        self.w = 0
+        self.h = 0
+        self.mines = bytearray()  # 지뢰인 칸은 1, 아니면 0
+        self.opened = bytearray()  # 열린 칸은 1, 아니면 0
+        self.images = bytearray()  # ImageType 값으로 각 칸을 표시함
+        self.counts = bytearray()  # 각 칸 주변(총 9칸)의 지뢰 개수. 지뢰 배치가 바뀔 때마다 다시 계산함
+
+        # 게임판 전체를 훑지 않도록 칸이 바뀔 때마다 갱신하는 개수들
+        self.mineCount = 0  # 지뢰의 총 개수
+        self.flagCount = 0  # 깃발(ImageType.FLAG)이 표시된 칸의 개수
+        self.blownCount = 0  # 폭발한 지뢰(ImageType.BLOWN_UP_MINE)의 개수
+        self.closedCount = 0  # 아직 열리지 않은, 지뢰가 아닌 칸의 개수. 0이 되면 승리
+
+        self.mode = GenerationMode.RANDOM  # 지뢰를 배치하는 방식
+        self.pendingMines = 0  # 첫 클릭 때 배치하기 위해 남겨둔 지뢰의 개수 (GenerationMode.SAFE, ZERO)
+        self.rng = random.Random()  # 지뢰 배치에 사용하는 난수 생성기
+
+        # 마지막으로 popChanges() 를 부른 뒤로 열림 상태나 이미지가 바뀐 칸들
+        self.changes = ChangeSet()
+
+        # 주변에 지뢰가 없는 칸들이 이어진 영역 정보. 처음 필요할 때 buildRegions() 에서 계산함
+        # (None 이면 아직 계산하지 않았거나 지뢰 배치가 바뀌어서 다시 계산해야 함)
+        self.zeroRuns = None  # 행마다 주변 지뢰가 0인 가로 구간 (시작, 끝, 영역 번호) 의 리스트
+        self.zeroStarts = None  # 행마다 zeroRuns 구간의 시작 위치 리스트 (bisect 용)
+        self.regionRuns = None  # 영역 번호 -> 그 영역에 속한 (y, 시작, 끝) 구간의 리스트
 
-        self.actionMap = {
-            'openCell': self.openCell,
-            'openCellAdjacent': self.openCellAdjacent,
-            'cycleCellImage': self.cycleCellImage
-        }
+        # ActionType 값을 인덱스로 해서 action 을 처리할 함수를 찾는 표
+        self.actionTable = (None, self.openCell, self.openCellAdjacent, self.cycleCellImage)
 
     # w x h 크기의 게임판을 만들고, mines개수의 지뢰를 랜덤하게 배치
-    def newGame(self, w: int, h: int, mines: int):
-        self.mines = []
-        self.opened = []
-        self.images = []
-
-        for i in range(h):
-            self.mines.append([])
-            self.opened.append([])
-            self.images.append([])
-            for j in range(w):
-                self.mines[i].append(False)
-                self.opened[i].append(False)
-                self.images[i].append(ImageType.NONE)
-
-        coords = [(x, y) for x in range(w) for y in range(h)]
-        for x, y in random.sample(coords, k=mines):
-            self.mines[y][x] = True
-
-    # pickle을 이용해 이 게임판을 문자열로 저장해 리턴
+    # mode 가 GenerationMode.SAFE 나 ZERO 이면 지뢰는 첫 번째 openCell 때 배치함
+    # (GenerationMode.NO_GUESS 는 여기서 만들지 않고 generator.py 를 사용해야 함)
+    # seed 를 주면 같은 seed 에 대해 (첫 클릭 위치가 같다면) 항상 같은 게임판이 만들어짐
+    # 지뢰 수가 칸 수보다 많으면 ValueError 를 발생시키고 게임판은 바꾸지 않음
+    def newGame(self, w: int, h: int, mines: int, mode: GenerationMode = GenerationMode.RANDOM, seed=None):
+        if mode == GenerationMode.NO_GUESS:
+            raise ValueError('No-guess boards are made by generator.NoGuessGenerator')
+        if not 0 <= mines <= w * h:
+            raise ValueError('Mine count does not fit on the board')
+
+        self.w = w
+        self.h = h
+        self.mines = bytearray(w * h)
+        self.opened = bytearray(w * h)
+        self.images = bytearray(w * h)
+        self.mode = mode
+        self.rng = random.Random(seed)
+
+        if mode == GenerationMode.RANDOM:
+            self.pendingMines = 0
+            self.placeMines(mines, ())
+        else:
+            # 아직 지뢰가 없으므로 주변 지뢰 개수는 모두 0
+            self.pendingMines = mines
+            self.counts = bytearray(w * h)
+
+        self.mineCount = mines
+        self.flagCount = 0
+        self.blownCount = 0
+        self.closedCount = w * h - mines
+        self.zeroRuns = None
+        self.changes.setFull()
+
+    # 이 게임판을 바이너리 형식(BOARD_HEADER 참고)으로 저장해 리턴
     def serializeGame(self):
-        return pickle.dumps(self)
+        parts = [
+            BOARD_HEADER.pack(BOARD_MAGIC, BOARD_VERSION, self.mode, self.w, self.h, self.pendingMines),
+            packBits(self.mines),
+            packBits(self.opened),
+        ]
+        for table in IMAGE_BIT_TABLES:
+            parts.append(packBits(self.images.translate(table)))
+        return b''.join(parts)
 
-    # pickle을 이용해 이 게임판을 불러옴
+    # serializeGame 으로 저장한 게임판을 불러옴
+    # 형식이 맞지 않으면 ValueError 를 발생시키고 게임판은 바꾸지 않음
     def deserializeGame(self, data):
-        game = pickle.loads(data)
-        self.mines = game.mines
-        self.opened = game.opened
-        self.images = game.images
+        data = memoryview(data)
+        if len(data) < BOARD_HEADER.size:
+            raise ValueError('Board data is too short')
+        magic, version, mode, w, h, pendingMines = BOARD_HEADER.unpack_from(data)
+        if magic != BOARD_MAGIC or version != BOARD_VERSION:
+            raise ValueError('Unsupported board format')
+
+        n = w * h
+        planeSize = (n + 7) // 8
+        if len(data) != BOARD_HEADER.size + planeSize * (2 + IMAGE_BITS) or pendingMines > n:
+            raise ValueError('Board data size does not match its header')
+
+        planes = [data[BOARD_HEADER.size + i * planeSize:BOARD_HEADER.size + (i + 1) * planeSize]
+                  for i in range(2 + IMAGE_BITS)]
+        images = 0
+        for k in range(IMAGE_BITS):
+            images |= int.from_bytes(unpackBits(planes[2 + k], n).translate(IMAGE_SHIFT_TABLES[k]), 'little')
+        images = images.to_bytes(n, 'little')
+        if images.translate(None, VALID_IMAGES) or mode not in GENERATION_MODES:
+            raise ValueError('Invalid board data')
+
+        self.w = w
+        self.h = h
+        self.mines = bytearray(unpackBits(planes[0], n))
+        self.opened = bytearray(unpackBits(planes[1], n))
+        self.images = bytearray(images)
+        self.mode = GENERATION_MODES[mode]
+        self.pendingMines = pendingMines
+        self.buildCounts()
+        self.rebuildCounters()
+        self.zeroRuns = None
+        self.changes.setFull()
+
+    # changes(ChangeSet) 에 있는 칸들의 열림 여부와 이미지를 바이너리 형식(CHANGES_RANGE_HEADER 참고)으로 저장해 리턴
+    # 다른 쪽에서 같은 게임판을 가지고 있다면 deserializeChanges 로 바뀐 칸들만 반영할 수 있음
+    def serializeChanges(self, changes: ChangeSet):
+        parts = []
+        for start, end in changes.getRanges():
+            parts.append(CHANGES_RANGE_HEADER.pack(start, end - start))
+            parts.append(self.getCellStates(start, end))
+        return b''.join(parts)
+
+    # serializeChanges 로 저장한 칸들의 상태를 반영하고, 바뀐 칸들을 ChangeSet 으로 리턴함
+    # 지뢰 배치는 그대로 두므로, 같은 지뢰 배치를 가진 게임판에만 사용해야 함
+    # 형식이 맞지 않으면 ValueError 를 발생시키고 게임판은 바꾸지 않음
+    def deserializeChanges(self, data):
+        data = memoryview(data)
+        ranges = []
+        offset = 0
+        while offset < len(data):
+            if len(data) - offset < CHANGES_RANGE_HEADER.size:
+                raise ValueError('Changes data is too short')
+            start, count = CHANGES_RANGE_HEADER.unpack_from(data, offset)
+            offset += CHANGES_RANGE_HEADER.size
+            states = bytes(data[offset:offset + count])
+            offset += count
+            if len(states) != count or start + count > self.w * self.h:
+                raise ValueError('Changed cells are out of the board')
+            if states.translate(STATE_TO_IMAGE_TABLE).translate(None, VALID_IMAGES):
+                raise ValueError('Invalid cell state')
+            ranges.append((start, states))
+
+        result = ChangeSet()
+        for start, states in ranges:
+            self.setCellStates(start, states)
+            result.addRange(start, start + len(states))
+        return result
+
+    # 같은 게임판을 하나 더 만들어 리턴함 (바뀐 칸 기록은 게임판 전체가 바뀐 것으로 시작함)
+    def copy(self):
+        board = GameBoard()
+        board.w = self.w
+        board.h = self.h
+        board.mines = bytearray(self.mines)
+        board.opened = bytearray(self.opened)
+        board.images = bytearray(self.images)
+        board.counts = bytearray(self.counts)
+        board.mineCount = self.mineCount
+        board.flagCount = self.flagCount
+        board.blownCount = self.blownCount
+        board.closedCount = self.closedCount
+        board.mode = self.mode
+        board.pendingMines = self.pendingMines
+        board.rng.setstate(self.rng.getstate())
+        # 영역 정보는 지뢰 배치가 바뀌면 새로 만들고 고치지는 않으므로 같이 써도 됨
+        board.zeroRuns = self.zeroRuns
+        board.zeroStarts = self.zeroStarts
+        board.regionRuns = self.regionRuns
+        board.changes.setFull()
+        return board
+
+    # [start, end) 구간 칸들의 상태(열림 여부 | 이미지 << 1)를 칸마다 1바이트로 리턴함
+    def getCellStates(self, start: int, end: int):
+        return orPlanes(self.opened[start:end], self.images[start:end].translate(STATE_IMAGE_TABLE))
+
+    # start 부터의 칸들을 getCellStates 가 만든 상태로 바꾸면서 개수들을 갱신함
+    def setCellStates(self, start: int, states):
+        end = start + len(states)
+        opened = states.translate(STATE_TO_OPENED_TABLE)
+        images = states.translate(STATE_TO_IMAGE_TABLE)
 
-    # gameaction에서 생성한 action을 적용시킴
+        oldImages = self.images[start:end]
+        self.flagCount += images.count(ImageType.FLAG) - oldImages.count(ImageType.FLAG)
+        self.blownCount += images.count(ImageType.BLOWN_UP_MINE) - oldImages.count(ImageType.BLOWN_UP_MINE)
+        mines = self.mines[start:end]
+        self.closedCount += orPlanes(mines, opened).count(0) - orPlanes(mines, self.opened[start:end]).count(0)
+
+        self.opened[start:end] = opened
+        self.images[start:end] = images
+        self.changes.addRange(start, end)
+
+    # gameaction에서 생성한 (ActionType, x, y) action을 적용시킴
+    # 이 action 으로 바뀐 칸들을 ChangeSet 으로 리턴함 (self.changes 에도 똑같이 기록됨)
     def doAction(self, action):
-        act = action['action']
-        x = action['x']
-        y = action['y']
-        self.actionMap[act](x, y)
+        act, x, y = action
+
+        changes = self.changes
+        self.changes = ChangeSet()
+        try:
+            self.actionTable[act](x, y)
+        finally:
+            result = self.changes
+            changes.merge(result)
+            self.changes = changes
+        return result
+
+    # 여러 action 을 순서대로 적용시키고, 바뀐 칸들을 하나의 ChangeSet 으로 합쳐서 리턴함
+    def doActions(self, actions):
+        result = ChangeSet()
+        for action in actions:
+            result.merge(self.doAction(action))
+        return result
+
+    # 마지막으로 부른 뒤로 바뀐 칸들을 ChangeSet 으로 리턴하고, 기록을 비움
+    def popChanges(self):
+        changes = self.changes
+        self.changes = ChangeSet()
+        return changes
+
+    # 해당 칸의 지뢰 여부를 직접 바꿈
+    # 테스트나 직접 만든 게임판을 구성할 때 사용
+    def setMine(self, x: int, y: int, mine: bool = True):
+        i = y * self.w + x
+        diff = (1 if mine else 0) - self.mines[i]
+        if diff == 0:
+            return
+
+        self.mines[i] += diff
+        self.mineCount += diff
+        self.zeroRuns = None
+        if not self.opened[i]:
+            self.closedCount -= diff
+        for cy in range(max(0, y - 1), min(self.h, y + 2)):
+            for cx in range(max(0, x - 1), min(self.w, x + 2)):
+                self.counts[cy * self.w + cx] += diff
+                # 열린 칸은 써있는 숫자가 바뀜
+                if self.opened[cy * self.w + cx]:
+                    self.changes.add(cy * self.w + cx)
 
     # 해당 칸의 플래그 정보를 바꿈
     # 이미 열린 칸에 플래그를 표시하지 못하도록 바꿈
     def cycleCellImage(self, x: int, y: int):
-        if not self.opened[y][x]:
-            self.images[y][x] = (self.images[y][x] + 1) % 3
+        i = y * self.w + x
+        if not self.opened[i]:
+            self.setImage(i, (self.images[i] + 1) % 3)
 
     # 해당 칸을 엶 (좌클릭 함)
     # 해당 칸은 열리고, 만약 빈 칸일 경우 그 주변 빈 칸도 같이 열림 (self.opened가 수정됨)
     # 열린 칸에 지뢰가 있었을 경우 True를 리턴하고 해당 칸의 이미지는 IMAGE_BLOWN_UP_MINE으로 바뀜
     # 단, 지뢰로 표시해놓은 칸은 무시
     def openCell(self, x: int, y: int):
-        if not self.opened[y][x] and (self.images[y][x] == ImageType.NONE or self.images[y][x] == ImageType.QUESTION):
-            for cx, cy in self.iterEmptyAdjacent(x, y):
-                self.opened[cy][cx] = True
-                self.images[cy][cx] = ImageType.NONE
-            if self.mines[y][x]:
-                self.images[y][x] = ImageType.BLOWN_UP_MINE
+        i = y * self.w + x
+        if not self.opened[i] and (self.images[i] == ImageType.NONE or self.images[i] == ImageType.QUESTION):
+            if self.pendingMines:
+                self.placeFirstClickMines(x, y)
+            if self.counts[i] == 0:
+                # 주변에 지뢰가 없으면 미리 계산해둔 영역을 한번에 엶
+                self.openMask(*self.findRegionMask(x, y))
+            else:
+                self.opened[i] = 1
+                self.setImage(i, ImageType.NONE)
+                self.changes.add(i)
+                if not self.mines[i]:
+                    self.closedCount -= 1
+            if self.mines[i]:
+                self.setImage(i, ImageType.BLOWN_UP_MINE)
                 return True
         return False
 
@@ -84,9 +364,9 @@ class GameBoard:
     def openCellAdjacent(self, x: int, y: int):
         count = 0
         for i in range(x - 1, x + 2):
-            if 0 <= i < len(self.mines):
+            if 0 <= i < self.w:
                 for j in range(y - 1, y + 2):
-                    if 0 <= j < len(self.mines):
+                    if 0 <= j < self.h:
                         b = self.openCell(i, j)
                         if b:
                             count += 1
@@ -98,96 +378,254 @@ class GameBoard:
     # 모든 지뢰의 위치를 공개함
     # IMAGE_* 에 붙어있는 설명을 읽기 바람
     def finishGame(self):
-        for row in range(len(self.images)):
-            for col in range(len(self.images[row])):
-                if self.mines[row][col] and self.images[row][col] not in {ImageType.BLOWN_UP_MINE, ImageType.FLAG}:
-                    self.images[row][col] = ImageType.MISSED_MINE
-                elif not self.mines[row][col] and self.images[row][col] == ImageType.FLAG:
-                    self.images[row][col] = ImageType.WRONG_FLAG
+        # (지뢰 여부 * 8 + 이미지) 값을 만든 뒤 변환표로 한번에 바꿈
+        key = orPlanes(self.mines.translate(MINE_KEY_TABLE), self.images)
+        images = key.translate(FINISH_TABLE)
+
+        # 이미지가 바뀐 칸들을 기록함
+        n = len(images)
+        diff = (int.from_bytes(self.images, 'little') ^ int.from_bytes(images, 'little')).to_bytes(n, 'little')
+        for m in NONZERO_RUN.finditer(diff):
+            self.changes.addRange(m.start(), m.end())
+
+        self.images = bytearray(images)
+        self.flagCount = self.images.count(ImageType.FLAG)
 
     # 남아있는 지뢰 개수를 셈 (잘못 표기한것도 포함)
     # 잘못 눌러서 이미 폭발한 지뢰도 지뢰로 표기한 것으로 간주함
     def countRemainingMine(self):
-        mineCount = 0
-        flagCount = 0
-        for i in self.mines:
-            mineCount += i.count(True)
-        for i in self.images:
-            flagCount += i.count(ImageType.FLAG) + i.count(ImageType.BLOWN_UP_MINE)
-        return mineCount - flagCount
+        return self.mineCount - self.flagCount - self.blownCount
 
     # 지뢰의 총 개수를 셈
     def countMine(self):
-        cnt = 0
-        for row in self.mines:
-            cnt += row.count(True)
-        return cnt
+        return self.mineCount
 
     # 게임에서 승리했는지 확인 (게임이 끝났으면 True)
     # 지뢰인 칸을 제외하고 모든 칸을 열었을 때가 승리 조건임
     def checkFinished(self):
-        for i in range(0, len(self.opened)):
-            for j in range(0, len(self.opened[i])):
-                if not self.mines[i][j] and not self.opened[i][j]:
-                    return False
-        return True
+        return self.closedCount == 0
 
     # 해당 칸에 써있는 숫자를 가져옴
     # 아직 열리지 않은 칸일 경우 None
     # 열렸지만 주변에 지뢰가 없을 경우 0
     def getCellText(self, x: int, y: int):
-        if not self.opened[y][x]:
+        if not self.opened[y * self.w + x]:
             return None
         else:
-            return self.countAdjacentMines(x, y)
+            return self.counts[y * self.w + x]
 
     # 해당 칸의 이미지 정보를 가져옴
     # (cycle_cell_image 함수와 IMAGE_* 변수 참고)
     def getCellImage(self, x: int, y: int):
-        return self.images[y][x]
+        return IMAGE_TYPES[self.images[y * self.w + x]]
 
     # 게임판의 높이를 리턴함
     def height(self):
-        return len(self.mines)
+        return self.h
 
     # 게임판의 너비를 리턴함
     def width(self):
-        return len(self.mines[0])
+        return self.w
 
     # ===========================================
     # 여기부터 아래에 있는 함수들은 이 클래스 내부에서 사용하기 위해 만들어진 함수임
     # ===========================================
 
     # 해당 칸 주변(총 9칸)의 지뢰 개수를 세서 int형으로 리턴
+    # (buildCounts 에서 미리 계산해둔 값을 읽기만 함)
     def countAdjacentMines(self, x: int, y: int):
-        count = 0
-        for i in range(y - 1, y + 2):
-            if 0 <= i < len(self.mines):
-                for j in range(x - 1, x + 2):
-                    if 0 <= j < len(self.mines[i]):
-                        if self.mines[i][j]:
-                            count += 1
-        return count
+        return self.counts[y * self.w + x]
+
+    # 지뢰가 없는 칸 중 excluded (1차원 인덱스) 를 제외한 곳에 count 개의 지뢰를 무작위로 배치함
+    # 좌표 리스트를 만들지 않고 range 에서 바로 인덱스를 뽑으므로 큰 게임판에서도 빠름
+    # 지뢰를 놓을 칸이 모자라면 ValueError 를 발생시킴
+    def placeMines(self, count: int, excluded):
+        excluded = set(excluded)
+        if count + len(excluded) > self.w * self.h:
+            raise ValueError('Mine count does not fit on the board')
+        picked = self.rng.sample(range(self.w * self.h), k=count + len(excluded))
+        for i in picked:
+            if count == 0:
+                break
+            if i not in excluded:
+                self.mines[i] = 1
+                count -= 1
+
+        self.buildCounts()
+        self.zeroRuns = None
+
+    # 첫 클릭 때 남겨두었던 지뢰를 (x, y) 를 피해서 배치함
+    def placeFirstClickMines(self, x: int, y: int):
+        if self.mode == GenerationMode.ZERO:
+            excluded = [cy * self.w + cx
+                        for cy in range(max(0, y - 1), min(self.h, y + 2))
+                        for cx in range(max(0, x - 1), min(self.w, x + 2))]
+        else:
+            excluded = [y * self.w + x]
+
+        # 칸이 모자라면 첫 클릭한 칸만, 그것도 모자라면 아무 칸도 피하지 않음
+        if self.w * self.h - len(excluded) < self.pendingMines:
+            excluded = [y * self.w + x]
+        if self.w * self.h - len(excluded) < self.pendingMines:
+            excluded = []
+
+        count = self.pendingMines
+        self.pendingMines = 0
+        self.placeMines(count, excluded)
+        # 지뢰 배치가 바뀌었으므로 칸 몇 개가 아니라 게임판 전체가 바뀐 것으로 취급함
+        self.changes.setFull()
+
+    # 해당 칸(1차원 인덱스)의 이미지를 바꾸면서 깃발, 폭발한 지뢰 개수를 갱신함
+    def setImage(self, i: int, image: int):
+        old = self.images[i]
+        if old == ImageType.FLAG:
+            self.flagCount -= 1
+        elif old == ImageType.BLOWN_UP_MINE:
+            self.blownCount -= 1
+        if image == ImageType.FLAG:
+            self.flagCount += 1
+        elif image == ImageType.BLOWN_UP_MINE:
+            self.blownCount += 1
+        if old != image:
+            self.images[i] = image
+            self.changes.add(i)
+
+    # 게임판 전체를 훑어서 지뢰, 깃발 등의 개수를 다시 셈
+    # 게임판을 통째로 불러온 경우에만 사용
+    def rebuildCounters(self):
+        self.mineCount = self.mines.count(1) + self.pendingMines
+        self.flagCount = self.images.count(ImageType.FLAG)
+        self.blownCount = self.images.count(ImageType.BLOWN_UP_MINE)
+        # 지뢰도 아니고 열리지도 않은 칸의 개수 (아직 배치하지 않은 지뢰도 빼야 함)
+        self.closedCount = orPlanes(self.mines, self.opened).count(0) - self.pendingMines
+
+    # 모든 칸의 주변 지뢰 개수를 한번에 계산해 self.counts 에 저장함
+    # 가장자리에 빈 칸을 한 줄씩 덧붙인 지뢰 정보를 큰 정수로 바꾼 뒤,
+    # 가로로 밀어서 더하고 다시 세로로 밀어서 더하는 방식으로 3x3 합을 구함 (한 칸의 합은 최대 9라서 자리올림이 없음)
+    def buildCounts(self):
+        w = self.w
+        h = self.h
+        p = w + 2
+        zeroRow = bytes(p)
+        padded = zeroRow + b''.join(b'\0' + self.mines[y * w:(y + 1) * w] + b'\0' for y in range(h)) + zeroRow
+        n = len(padded)
+
+        v = int.from_bytes(padded, 'little')
+        v = v + (v << 8) + (v >> 8)
+        v = v + (v << (8 * p)) + (v >> (8 * p))
+        summed = (v & ((1 << (8 * n)) - 1)).to_bytes(n, 'little')
+
+        self.counts = bytearray(b''.join(summed[(y + 1) * p + 1:(y + 1) * p + 1 + w] for y in range(h)))
 
     # 주변에 지뢰가 없는 모든 인접한 칸을 찾는 함수
     # 조금 더 엄밀히는, 주변에 지뢰가 없는 모든 칸의 인접한 칸을 찾는 함수
     # for x, y in self.iter_empty_adjacent(...) 처럼 사용
     def iterEmptyAdjacent(self, x: int, y: int):
-        visited = set()
-        bfs = deque([(x, y)])
-
-        while len(bfs) > 0:
-            cx, cy = bfs.popleft()
-            if cy < 0 or len(self.mines) <= cy or cx < 0 or len(self.mines[cy]) <= cx:
-                continue
-            if (cx, cy) in visited:
-                continue
-
-            visited.add((cx, cy))
-            yield cx, cy
-
-            if self.countAdjacentMines(cx, cy) == 0:
-                for i in [-1, 0, 1]:
-                    for j in [-1, 0, 1]:
-                        if (cx + i, cy + j) not in visited:
-                            bfs.append((cx + i, cy + j))
+        if self.counts[y * self.w + x] != 0:
+            yield x, y
+            return
+
+        start, mask = self.findRegionMask(x, y)
+        for m in NONZERO_RUN.finditer(mask):
+            for i in range(start + m.start(), start + m.end()):
+                yield i % self.w, i // self.w
+
+    # 1차원 인덱스 start 부터 시작하는 0/1 마스크에서 1인 칸들을 한번에 열고 이미지를 지움
+    # 마스크에는 지뢰가 아닌 칸만 있어야 함
+    def openMask(self, start: int, mask: bytes):
+        n = len(mask)
+        end = start + n
+
+        m = int.from_bytes(mask, 'little')
+        opened = int.from_bytes(self.opened[start:end], 'little')
+        newlyOpened = m & ~opened
+        self.closedCount -= newlyOpened.to_bytes(n, 'little').count(1)
+        self.opened[start:end] = (m | opened).to_bytes(n, 'little')
+
+        m = int.from_bytes(mask.translate(MASK_TABLE), 'little')
+        images = int.from_bytes(self.images[start:end], 'little')
+        cleared = images & m
+        clearedBytes = cleared.to_bytes(n, 'little')
+        self.flagCount -= clearedBytes.count(ImageType.FLAG)
+        self.blownCount -= clearedBytes.count(ImageType.BLOWN_UP_MINE)
+        self.images[start:end] = (images & ~m).to_bytes(n, 'little')
+
+        # 새로 열렸거나 이미지가 지워진 칸들을 기록함
+        for r in NONZERO_RUN.finditer((newlyOpened | cleared).to_bytes(n, 'little')):
+            self.changes.addRange(start + r.start(), start + r.end())
+
+    # (x, y) 칸이 속한 영역을 열 때 열리는 칸들을 (시작 인덱스, 0/1 마스크) 로 리턴함
+    # (x, y) 칸은 주변에 지뢰가 없는 칸이어야 함
+    # 마스크는 영역이 걸쳐있는 행들 전체를 덮으며, 영역의 경계(숫자가 써있는 칸)까지 포함함
+    def findRegionMask(self, x: int, y: int):
+        if self.zeroRuns is None:
+            self.buildRegions()
+
+        w = self.w
+        p = w + 2
+        runs = self.regionRuns[self.zeroRuns[y][bisect_right(self.zeroStarts[y], x) - 1][2]]
+        top = max(0, runs[0][0] - 1)
+        bottom = min(self.h, runs[-1][0] + 2)
+
+        # 가장자리에 한 칸씩 덧붙인 마스크에 영역을 칠한 뒤, 3x3 으로 넓혀서 경계까지 포함시킴
+        padded = bytearray(p * (bottom - top))
+        for ry, start, end in runs:
+            offset = (ry - top) * p + 1
+            padded[offset + start:offset + end] = b'\x01' * (end - start)
+
+        n = len(padded)
+        v = int.from_bytes(padded, 'little')
+        v = v | (v << 8) | (v >> 8)
+        v = v | (v << (8 * p)) | (v >> (8 * p))
+        dilated = (v & ((1 << (8 * n)) - 1)).to_bytes(n, 'little')
+
+        mask = b''.join(dilated[i * p + 1:i * p + 1 + w] for i in range(bottom - top))
+        return top * w, mask
+
+    # 주변에 지뢰가 없는 칸들이 (대각선 포함) 이어진 영역들을 찾아 번호를 붙임
+    # 칸 단위가 아닌 가로 구간 단위로 union-find 를 하므로 큰 게임판에서도 빠름
+    def buildRegions(self):
+        w = self.w
+        parent = []
+
+        def find(a):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            return a
+
+        zeroRuns = []
+        prev = []
+        for y in range(self.h):
+            curr = []
+            for m in ZERO_RUN.finditer(self.counts, y * w, (y + 1) * w):
+                run = len(parent)
+                parent.append(run)
+                curr.append((m.start() - y * w, m.end() - y * w, run))
+
+            # 윗줄의 구간 중 [start - 1, end] 범위와 겹치는 구간은 같은 영역임
+            j = 0
+            for start, end, run in curr:
+                while j < len(prev) and prev[j][1] < start:
+                    j += 1
+                k = j
+                while k < len(prev) and prev[k][0] <= end:
+                    a = find(run)
+                    b = find(prev[k][2])
+                    if a != b:
+                        parent[a] = b
+                    k += 1
+
+            zeroRuns.append(curr)
+            prev = curr
+
+        regionRuns = {}
+        for y in range(self.h):
+            row = [(start, end, find(run)) for start, end, run in zeroRuns[y]]
+            for start, end, region in row:
+                regionRuns.setdefault(region, []).append((y, start, end))
+            zeroRuns[y] = row
+
+        self.zeroRuns = zeroRuns
+        self.zeroStarts = [[start for start, _, _ in row] for row in zeroRuns]
+        self.regionRuns = regionRuns
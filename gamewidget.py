@@ -4,6 +4,7 @@ from PyQt5.QtCore import pyqtSignal, pyqtSlot, QThread, QCoreApplication, Qt
 from PyQt5.QtWidgets import QFrame, QGridLayout, QWidget, QMessageBox, QDialogButtonBox
 
 from cellwidget import CellWidget
+from constants import GenerationMode
 from networkclient import NetworkClient
 from serverrole import IServerRole
 from clientrole import IClientRole
@@ -62,9 +63,9 @@ class GameWidget(QFrame):
         if self.ensureIntegratedServer():
             self.server.newGameSameConfig()
 
-    def newGame(self, w, h, m):
+    def newGame(self, w, h, m, mode=GenerationMode.RANDOM):
         if self.ensureIntegratedServer():
-            self.server.newGame(w, h, m)
+            self.server.newGame(w, h, m, mode)
 
     def joinServer(self, addr, pin):
         networkClient = NetworkClient(addr, pin)
@@ -100,6 +101,9 @@ Tip. 쉽게 연결하기 위해서 LogMeIn Hamachi 등의
 
     @pyqtSlot()
     def buildUi(self):
+        # 모든 칸을 새로 만드므로 그동안 바뀐 칸 정보는 필요 없음
+        self.client.takeChanges()
+
         self.cells = []
         self.gridLayout = QGridLayout()
         self.gridLayout.setSpacing(2)
@@ -121,9 +125,17 @@ Tip. 쉽게 연결하기 위해서 LogMeIn Hamachi 등의
 
     @pyqtSlot()
     def updateUi(self):
-        for row in self.cells:
-            for cell in row:
-                cell.updateDisplay()
+        changes = self.client.takeChanges()
+        if changes.full:
+            for row in self.cells:
+                for cell in row:
+                    cell.updateDisplay()
+        else:
+            # 바뀐 칸들만 다시 그림
+            w = len(self.cells[0]) if self.cells else 0
+            for i in changes:
+                if i < w * len(self.cells):
+                    self.cells[i // w][i % w].updateDisplay()
 
         self.refreshed.emit()
 
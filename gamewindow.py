@@ -8,7 +8,7 @@ from PyQt5.QtWidgets import QLabel, QMessageBox, QLineEdit, QDialogButtonBox
 from PyQt5.QtWidgets import QLCDNumber, QFrame, QToolButton
 from PyQt5.QtWidgets import QVBoxLayout, QHBoxLayout
 
-from constants import RESOURCE_PATH
+from constants import RESOURCE_PATH, GenerationMode
 from gamewidget import GameWidget
 
 
@@ -73,6 +73,11 @@ class GameWindow(QMainWindow):
         action = menu.addAction('커스텀')
         action.triggered.connect(self.customGame)
 
+        menu.addSeparator()
+        self.noGuessAction = menu.addAction('추측 없는 게임판')
+        self.noGuessAction.setToolTip('운에 맡기지 않고 끝까지 풀 수 있는 게임판을 만듭니다')
+        self.noGuessAction.setCheckable(True)
+
         menu = menuBar.addMenu('협동 모드')
         action = menu.addAction('참가하기')
         action.setToolTip('다른 사람이 연 방에 들어갑니다')
@@ -159,7 +164,8 @@ class GameWindow(QMainWindow):
         self.gameWidget.resetGame()
 
     def newGame(self, width: int, height: int, mines: int):
-        self.gameWidget.newGame(width, height, mines)
+        mode = GenerationMode.NO_GUESS if self.noGuessAction.isChecked() else GenerationMode.RANDOM
+        self.gameWidget.newGame(width, height, mines, mode)
 
     def joinServer(self):
         dialog = QDialog(self)
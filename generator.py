@@ -0,0 +1,203 @@
+import os
+import time
+import random
+import threading
+import multiprocessing
+import concurrent.futures
+
+from constants import GenerationMode
+from gameboard import GameBoard
+from solver import Solver
+
+
+# 추측 없이 풀 수 있는 게임판을 찾을 때까지 기다리는 기본 시간(초)
+DEFAULT_TIMEOUT = 5.0
+
+# 이보다 칸이 적은 게임판은 프로세스로 나누는 비용이 더 크므로 현재 프로세스에서 만듦
+PARALLEL_MIN_CELLS = 2500
+
+
+# 시작 칸 (x, y) 와 그 주변에 지뢰가 없는 후보 게임판을 만들고 시작 칸을 열어둠
+# 같은 seed 로 부르면 항상 같은 게임판이 만들어짐
+def makeCandidate(w: int, h: int, mines: int, x: int, y: int, seed) -> GameBoard:
+    board = GameBoard()
+    board.newGame(w, h, mines, GenerationMode.ZERO, seed)
+    board.openCell(x, y)
+    return board
+
+
+# 솔버가 확실히 안전하다고 한 칸만 열어서 게임판을 끝까지 풀 수 있는지 확인
+# 확인하는 동안 게임판이 열리므로, 원본이 필요하면 복사본을 넘겨야 함
+# deadline (time.monotonic() 기준) 이 지날 때까지 확인하지 못하면 풀 수 없는 것으로 취급함
+def isSolvable(board: GameBoard, deadline: float = None) -> bool:
+    solver = Solver(board, deadline=deadline)
+    changes = board.popChanges()
+    while not board.checkFinished():
+        try:
+            safe, _ = solver.solve(changes)
+        except TimeoutError:
+            return False
+        if not safe:
+            return False
+        for x, y in safe:
+            board.openCell(x, y)
+        changes = board.popChanges()
+    return True
+
+
+# 프로세스 풀에서 실행되는 함수. 후보 게임판이 풀 수 있으면 True 를 리턴
+# 게임판 자체를 주고받지 않고 seed 만 주고받아서 프로세스 간 통신량을 줄임
+# time.monotonic() 은 프로세스끼리 같은 시계를 쓰므로 deadline 을 그대로 넘겨줄 수 있음
+def tryCandidate(w: int, h: int, mines: int, x: int, y: int, seed, deadline: float = None) -> bool:
+    return isSolvable(makeCandidate(w, h, mines, x, y, seed), deadline)
+
+
+# 게임판 설정 하나에 대한 생성 통계
+class GenerationStats:
+    def __init__(self):
+        self.attempts = 0  # 풀 수 있는지 확인한 후보 게임판 수
+        self.accepted = 0  # 풀 수 있었던 후보 게임판 수
+        self.boards = 0  # 만들어낸 게임판 수
+        self.fallbacks = 0  # 시간 안에 찾지 못해서 일반 게임판을 대신 만든 횟수
+        self.seconds = 0.0  # 게임판을 만드는 데 걸린 총 시간
+
+    def merge(self, other):
+        self.attempts += other.attempts
+        self.accepted += other.accepted
+        self.boards += other.boards
+        self.fallbacks += other.fallbacks
+        self.seconds += other.seconds
+
+    # 확인한 후보 중 풀 수 없어서 버린 비율
+    def rejectionRate(self) -> float:
+        if self.attempts == 0:
+            return 0.0
+        return 1 - self.accepted / self.attempts
+
+    def asDict(self):
+        return {
+            'attempts': self.attempts,
+            'accepted': self.accepted,
+            'boards': self.boards,
+            'fallbacks': self.fallbacks,
+            'seconds': self.seconds,
+            'rejectionRate': self.rejectionRate(),
+        }
+
+
+# 시작 칸이 열린 상태에서 추측 없이 끝까지 풀 수 있는 게임판(GenerationMode.NO_GUESS)을 만듦
+# 후보 게임판을 여러 프로세스에서 동시에 만들어서 확인하고, 시간 안에 찾지 못하면 일반 게임판을 만듦
+# 여러 스레드에서 동시에 generate 를 불러도 됨 (BoardPool 의 백그라운드 스레드와 take 등)
+class NoGuessGenerator:
+    def __init__(self, workers: int = None, timeout: float = DEFAULT_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.lock = threading.Lock()  # pool 과 stats 를 보호함
+        self.pool = None  # 처음 필요할 때 만듦
+        self.stats = dict()  # (w, h, mines) -> GenerationStats. 읽을 때는 getStats() 를 사용함
+
+    # 프로세스 풀을 정리함
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+
+    # 설정마다의 생성 통계를 {(w, h, mines): dict} 로 리턴함
+    def getStats(self):
+        with self.lock:
+            return {config: stats.asDict() for config, stats in self.stats.items()}
+
+    # w x h 크기에 mines개의 지뢰가 있는 게임판을 만들어서 리턴함
+    # 시작 칸(start, 기본값은 가운데 칸)은 열린 상태로 리턴됨
+    # seed 를 주면 같은 seed 에 대해 항상 같은 게임판이 만들어짐 (시간이 부족했던 경우는 제외)
+    def generate(self, w: int, h: int, mines: int, seed=None, start=None) -> GameBoard:
+        x, y = start if start is not None else (w // 2, h // 2)
+        stats = GenerationStats()  # 이번 호출의 통계. 다른 스레드와 겹치지 않도록 끝날 때 self.stats 에 합침
+        began = time.monotonic()
+
+        if seed is None:
+            seed = random.getrandbits(64)
+
+        if self.workers > 1 and w * h >= PARALLEL_MIN_CELLS:
+            found = self.searchParallel(w, h, mines, x, y, seed, stats, began + self.timeout)
+        else:
+            found = self.searchSerial(w, h, mines, x, y, seed, stats, began + self.timeout)
+
+        if found is not None:
+            board = makeCandidate(w, h, mines, x, y, found)
+            board.mode = GenerationMode.NO_GUESS
+        else:
+            board = makeCandidate(w, h, mines, x, y, f'{seed}/fallback')
+            stats.fallbacks += 1
+
+        # 시작 칸을 연 것까지 포함해서 게임판 전체가 새로 만들어진 것으로 취급함
+        board.changes.setFull()
+        stats.boards += 1
+        stats.seconds += time.monotonic() - began
+        with self.lock:
+            self.stats.setdefault((w, h, mines), GenerationStats()).merge(stats)
+        return board
+
+    # ===========================================
+    # 여기부터 아래에 있는 함수들은 이 클래스 내부에서 사용하기 위해 만들어진 함수임
+    # ===========================================
+
+    # 풀은 BoardPool 이나 서버의 스레드에서 만들어지므로, 다른 스레드가 잡고 있던 락을 물려받지 않도록
+    # fork 하지 않고 새 인터프리터로 시작함 (그래서 풀에서 부르는 tryCandidate 는 모듈 최상위 함수여야 함)
+    def getPool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.pool
+
+    # 후보 게임판을 현재 프로세스에서 하나씩 확인함. 찾은 후보의 seed 를 리턴 (못 찾으면 None)
+    # 후보 하나를 확인하는 도중에도 deadline 이 지나면 멈춤
+    def searchSerial(self, w, h, mines, x, y, seed, stats, deadline):
+        k = 0
+        while time.monotonic() < deadline:
+            candidate = f'{seed}/{k}'
+            k += 1
+            stats.attempts += 1
+            if tryCandidate(w, h, mines, x, y, candidate, deadline):
+                stats.accepted += 1
+                return candidate
+        return None
+
+    # 후보 게임판을 프로세스 풀에서 동시에 확인함. 찾은 후보의 seed 를 리턴 (못 찾으면 None)
+    # 같은 seed 에 대해 같은 결과가 나오도록, 번호가 가장 작은 성공한 후보를 고름
+    def searchParallel(self, w, h, mines, x, y, seed, stats, deadline):
+        pool = self.getPool()
+        pending = dict()  # future -> 후보 번호
+        results = dict()  # 후보 번호 -> 풀 수 있는지 여부
+        nextCandidate = 0
+        firstUnknown = 0  # 이 번호보다 작은 후보는 모두 결과가 나왔음
+
+        try:
+            while True:
+                while len(pending) < self.workers * 2:
+                    future = pool.submit(tryCandidate, w, h, mines, x, y, f'{seed}/{nextCandidate}', deadline)
+                    pending[future] = nextCandidate
+                    nextCandidate += 1
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+
+                done, _ = concurrent.futures.wait(pending, timeout=remaining,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    k = pending.pop(future)
+                    results[k] = future.result()
+                    stats.attempts += 1
+                    if results[k]:
+                        stats.accepted += 1
+
+                while firstUnknown in results:
+                    if results[firstUnknown]:
+                        return f'{seed}/{firstUnknown}'
+                    firstUnknown += 1
+        finally:
+            for future in pending:
+                future.cancel()
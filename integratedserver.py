@@ -1,227 +1,733 @@
+import asyncio
+import collections
 import hashlib
 import json
-import struct
 import secrets
 import socket
-import selectors
 import threading
 import time
 
 from typing import Optional
 
-from constants import ImageType, DEFAULT_PORT, MAGIC_STRING
-from gameaction import GameAction
+from changeset import ChangeSet
+from compression import COMPRESSION_METHODS, DEFAULT_THRESHOLD, FrameCompressor, chooseCompression
+from constants import ImageType, GenerationMode, FrameKind, ActionType, DEFAULT_PORT, MAGIC_STRING, MAGIC_STRING_V20, \
+    MAGIC_STRING_V12, HELLO_HEADER, MAX_HELLO_SIZE, FRAME_HEADER, FRAME_ACK
+from gameaction import GameAction, decodeActions, decodeJsonActions
+from boardpool import BoardPool
+from buffers import RecvBuffer, SendQueue
 from gameboard import GameBoard
+from metrics import ServerMetrics, TimedLock
+from generator import NoGuessGenerator
 from serverrole import IServerRole
 from clientrole import IClientRole
 
 
+# DELTA 프레임을 보낸 뒤 이 시간(초)이 지나면 모든 클라이언트에게 게임판 전체를 다시 보냄
+# 클라이언트의 게임판이 어떤 이유로든 어긋났더라도 이 시간 안에는 바로잡힘
+RESYNC_INTERVAL = 60.0
+
+# 클라이언트 소켓에서 받을 때 버퍼에 확보해둘 최소 빈 공간
+READ_SIZE = 4096
+
+# 클라이언트에게 보내지 못하고 쌓인 바이트가 이보다 (또는 게임판 전체 크기의 2배보다) 많아지면,
+# 아직 보내기 시작하지 않은 프레임들을 버리고 현재 게임판 전체와 그 프레임들의 ack 를 담은 프레임 하나로 바꿈
+SEND_QUEUE_LIMIT = 1 << 20
+
+# 쌓인 바이트가 이보다 많아지거나, 프레임 하나를 SEND_TIMEOUT 초 동안 다 보내지 못하면 연결을 끊음
+SEND_QUEUE_HARD_LIMIT = 64 << 20
+SEND_TIMEOUT = 30.0
+
+# 연결이 끊긴 클라이언트가 이 시간(초) 안에 다시 접속하면 같은 nodeId 로 이어서 접속함 (Session 참고)
+SESSION_TIMEOUT = 60.0
+
+# 다시 접속한 클라이언트에게 놓친 변경만 보내기 위해 기억해두는 최근 DELTA 프레임의 수
+# 이보다 많이 놓쳤거나, 그 사이에 게임판 전체를 보낸 적이 있으면 게임판 전체를 보냄
+HISTORY_SIZE = 256
+
+# 클라이언트가 보낸 매직 문자열 -> (그 버전의 action 프레임을 읽는 함수, hello 를 주고받는지 여부)
+PROTOCOLS = {
+    MAGIC_STRING: (decodeActions, True),
+    MAGIC_STRING_V20: (decodeActions, False),
+    MAGIC_STRING_V12: (decodeJsonActions, False),
+}
+
+
+# serverSock 으로 들어오는 연결마다 clientType (ClientState 나 그 하위 클래스) 을 만들어 처리하는 코루틴
+# host 는 selectRoom, compressionMethods, compressionThreshold 를 가진 객체 (IntegratedServer 나 DedicatedServer)
+async def acceptConnections(serverSock: socket.socket, host, clientType=None):
+    loop = asyncio.get_running_loop()
+    tasks = set()  # 이벤트 루프는 태스크를 약하게 참조하므로 끝날 때까지 여기에 들고 있음
+    while True:
+        sock, addr = await loop.sock_accept(serverSock)
+        print(f'Accepted connection from tcp://{addr[0]}:{addr[1]}')
+        host.metrics.connections += 1
+        sock.setblocking(False)
+        node = (clientType or ClientState)(host, sock)
+        task = loop.create_task(handleConnection(node))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+# 클라이언트가 hello 의 'resume' 으로 보낸, 이어서 접속하려는 세션을 확인함. 형식이 잘못되었으면 ValueError 를 발생시킴
+def parseResume(resume):
+    if not isinstance(resume, dict):
+        raise ValueError('Invalid hello')
+    node, token, version = resume.get('node'), resume.get('session'), resume.get('version')
+    if not isinstance(node, int) or not isinstance(token, str) or not isinstance(version, int):
+        raise ValueError('Invalid hello')
+    return {'node': node, 'session': token, 'version': version}
+
+
+# 연결되어 있는 동안 이벤트 루프가 밀린 정도를 재고, 연결이 끝나면 소켓을 닫음
+async def handleConnection(node):
+    node.metrics.connected += 1
+    node.metrics.watchLoop(node.loop)
+    try:
+        await node.handle()
+    finally:
+        node.metrics.connected -= 1
+        node.sock.close()
+
+
+# 접속한 클라이언트 하나를 처리함
+# 받는 쪽은 RecvBuffer 에 recv_into 로 바로 받고, 보내는 쪽은 SendQueue 에 프레임을 모아서 sendmsg 로 보냄
 class ClientState:
-    def __init__(self, server, nodeId):
-        self.server = server  # type: IntegratedServer
+    def __init__(self, host, sock: socket.socket):
+        self.host = host
+        self.server = None  # type: Optional[IntegratedServer]  # 핸드셰이크에서 고른 방 (게임판)
         self.ready = False
-        self.nodeId = nodeId
-        self.readBuf = b''
-        self.writeBuf = b''
-        self.processor = self._steps()
+        self.nodeId = -1  # 인증을 마치면 방에서 정해줌
+        self.sock = sock
+        self.loop = asyncio.get_running_loop()
+        self.recvBuf = RecvBuffer()
+        self.sendQueue = SendQueue()
+        self.pending = asyncio.Event()  # sendQueue 에 보낼 프레임이 있으면 set 됨
+        self.magic = None  # 클라이언트가 보낸 매직 문자열
+        self.decodeActions = None  # 매직 문자열로 정해지는, action 프레임을 읽는 함수
+        self.settings = None  # 클라이언트에게 알려준 압축 설정 (applyHello 의 리턴값)
+        self.compressor = None  # type: Optional[FrameCompressor]  # hello 에서 압축을 쓰기로 했으면 만듦
+        self.closing = False  # True 이면 writeLoop 가 끝나면서 연결이 끊김
+        self.coalesced = 0  # 클라이언트가 느려서 프레임들을 게임판 전체로 합친 횟수
+        self.bytesIn = 0  # 이 클라이언트에게서 받은 바이트 수
+        self.bytesOut = 0  # 이 클라이언트에게 보낸 바이트 수
+        self.metrics = host.metrics  # type: ServerMetrics
+        self.session = None  # 핸드셰이크에서 정해준 세션 토큰 (hello 를 주고받는 버전만)
+        self.resume = None  # 클라이언트가 이어서 접속하려는 세션 (parseResume 의 리턴값)
+
+    # 연결이 끊기거나 인증에 실패할 때까지 클라이언트를 처리하는 코루틴
+    # 받는 코루틴과 보내는 코루틴 중 하나가 끝나면 나머지도 멈춤
+    async def handle(self):
+        tasks = [self.loop.create_task(self.readLoop()), self.loop.create_task(self.writeLoop())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.ready:
+                self.server.removeNode(self)
+
+    async def readLoop(self):
+        try:
+            if self.ready or await self.handshake():
+                await self.readActions()
+        except (ConnectionError, ValueError):
+            pass
 
-    def process(self):
+    # 보낼 프레임이 있을 때만 소켓에 씀
+    async def writeLoop(self):
         try:
-            next(self.processor)
-        except StopIteration:
+            while not self.closing:
+                await self.pending.wait()
+                while len(self.sendQueue) > 0 and not self.closing:
+                    sent = self.sendQueue.send(self.sock)
+                    self.countSent(sent)
+                    if sent == 0:
+                        # 소켓 버퍼가 가득 찼으면 첫 프레임은 쓸 수 있을 때까지 기다렸다가 보냄
+                        # 그 동안 send 로 들어오는 프레임들은 큐에 쌓이거나 합쳐짐 (보내는 중인 첫 프레임은 버려지지 않음)
+                        frame = self.sendQueue.startSending()
+                        await asyncio.wait_for(self.loop.sock_sendall(self.sock, frame), SEND_TIMEOUT)
+                        self.sendQueue.advance(len(frame))
+                        self.countSent(len(frame))
+                self.pending.clear()
+        except asyncio.TimeoutError:
+            print(f'Disconnecting node {self.nodeId}: not reading for {SEND_TIMEOUT} seconds')
+            self.metrics.disconnects += 1
+        except OSError:
+            pass
+
+    def countSent(self, size: int):
+        self.bytesOut += size
+        self.metrics.bytesOut += size
+
+    # 버퍼에 n 바이트 이상 모일 때까지 받음
+    async def recvAtLeast(self, n: int):
+        while len(self.recvBuf) < n:
+            size = await self.loop.sock_recv_into(self.sock, self.recvBuf.writable(READ_SIZE))
+            if size == 0:
+                raise ConnectionError('Connection closed')
+            self.recvBuf.commit(size)
+            self.bytesIn += size
+            self.metrics.bytesIn += size
+
+    # 버퍼에서 n 바이트를 꺼냄
+    async def recvExactly(self, n: int):
+        await self.recvAtLeast(n)
+        data = bytes(self.recvBuf.view()[:n])
+        self.recvBuf.consume(n)
+        return data
+
+    # 매직 문자열과 핀 번호를 확인하고 처음 게임판을 보냄. 실패하면 False 를 리턴
+    # 클라이언트가 hello 를 보내는 버전이면, 들어갈 방과 압축 설정을 골라 nonce 뒤에 알려줌
+    # hello 를 보내지 않는 버전은 빈 hello 를 보낸 것처럼 기본 방에 들어감
+    async def handshake(self):
+        self.magic = await self.recvExactly(len(MAGIC_STRING))
+        protocol = PROTOCOLS.get(self.magic)
+        if protocol is None:
             return False
-        return True
+        self.decodeActions, hasHello = protocol
 
-    # 제네레이터 함수로 async 를 흉내냄
-    def _steps(self):
-        while len(self.readBuf) < len(MAGIC_STRING):
-            yield
-        if not self.readBuf.startswith(MAGIC_STRING):
-            return
-        self.readBuf = self.readBuf[len(MAGIC_STRING):]
+        hello = dict()
+        if hasHello:
+            size = HELLO_HEADER.unpack(await self.recvExactly(HELLO_HEADER.size))[0]
+            if size > MAX_HELLO_SIZE:
+                return False
+            try:
+                hello = json.loads((await self.recvExactly(size)).decode('utf-8'))
+            except UnicodeDecodeError as e:
+                raise ValueError('Invalid hello') from e
+            if not isinstance(hello, dict):
+                raise ValueError('Invalid hello')
+
+        self.server, reply = await self.host.selectRoom(hello)
+        if self.server is not None:
+            self.settings = self.applyHello(hello)
+            reply.update(self.settings)
+            if 'resume' in hello:
+                self.resume = parseResume(hello['resume'])
+            if hasHello:
+                # 연결이 끊기면 이 토큰으로 같은 세션에 이어서 접속할 수 있음
+                self.session = secrets.token_hex(16)
+                reply['session'] = self.session
+        elif not hasHello:
+            return False
 
         nonce = secrets.token_bytes(16)
-        answer = hashlib.sha224(self.server.pin.to_bytes(2, byteorder='little', signed=False) + nonce).digest()
-
-        self.writeBuf += nonce
+        greeting = nonce
+        if hasHello:
+            reply = json.dumps(reply).encode('utf-8')
+            greeting += HELLO_HEADER.pack(len(reply)) + reply
+        if self.server is None:
+            # 방을 찾지 못한 이유를 hello 로 알려주고 다 보낸 뒤에 연결을 끊음 (아직 큐에는 아무것도 없음)
+            await self.loop.sock_sendall(self.sock, greeting)
+            self.countSent(len(greeting))
+            return False
+        self.write(greeting)
 
-        while len(self.readBuf) < len(answer):
-            yield
-        if not secrets.compare_digest(self.readBuf, answer):
-            return
-        self.readBuf = b''
-        self.writeBuf += self.nodeId.to_bytes(4, byteorder='big', signed=False)
-        self.writeBuf += self.server.makeSnapshot(0, 0)
+        pin = self.server.pin
+        answer = hashlib.sha224(pin.to_bytes(2, byteorder='little', signed=False) + nonce).digest()
+        if not secrets.compare_digest(await self.recvExactly(len(answer)), answer):
+            return False
+        return self.admit()
+
+    # 인증을 마친 클라이언트를 방에 등록하고 처음 게임판을 보냄
+    # 이어서 접속한 클라이언트에게는 가능하면 놓친 변경만 보냄. 클라이언트는 nodeId 가 그대로인지 보고 이어졌는지 앎
+    # False 를 리턴하면 이 프로세스에서는 더 이상 연결을 처리하지 않음 (shardedserver.py 참고)
+    def admit(self):
+        self.nodeId = self.server.addNode(self)
+        self.write(self.nodeId.to_bytes(4, byteorder='big', signed=False))
         self.ready = True
+        if self.resume is not None and self.resume['node'] == self.nodeId:
+            self.send(self.server.makeResume(self.nodeId, self.resume['version']))
+        else:
+            self.send(self.server.makeSnapshot())
+        return True
 
+    # 다른 프로세스에서 핸드셰이크를 마치고 넘겨받은 연결을 room 에 등록함
+    # settings 는 그 때 클라이언트에게 알려준 압축 설정이고, leftover 는 인증 뒤에 이미 받아둔 데이터
+    # session 과 resume 은 핸드셰이크에서 정해준 세션 토큰과 클라이언트가 이어서 접속하려는 세션
+    def adopt(self, room, magic: bytes, settings, leftover: bytes, session=None, resume=None):
+        self.server = room
+        self.magic = magic
+        self.decodeActions = PROTOCOLS[magic][0]
+        self.settings = settings
+        self.session = session
+        self.resume = resume
+        if settings.get('compression') is not None:
+            self.compressor = FrameCompressor(settings['compression'], settings['stream'], settings['threshold'])
+        self.recvBuf.writable(len(leftover))[:len(leftover)] = leftover
+        self.recvBuf.commit(len(leftover))
+        self.admit()
+
+    # 클라이언트가 hello 로 보낸 압축 설정을 적용하고, 실제로 사용할 설정을 리턴함
+    # hello 의 형식이 잘못되었으면 ValueError 를 발생시킴
+    def applyHello(self, hello):
+        offered = hello.get('compression', [])
+        if not isinstance(offered, list):
+            raise ValueError('Invalid hello')
+
+        host = self.host
+        method = chooseCompression(offered, host.compressionMethods)
+        if method is not None:
+            self.compressor = FrameCompressor(method, bool(hello.get('stream', False)), host.compressionThreshold)
+            return {'compression': method, 'stream': self.compressor.stream, 'threshold': self.compressor.threshold}
+        return {'compression': None, 'stream': False}
+
+    # 잘못된 action 프레임을 받으면 ValueError 를 발생시킴
+    async def readActions(self):
         while True:
-            if len(self.readBuf) >= 8:
-                seqId, msgLen = struct.unpack('!2L', self.readBuf[:8])
-                self.readBuf = self.readBuf[8:]
-                while len(self.readBuf) < msgLen:
-                    yield
-                msg = self.readBuf[:msgLen]
-                self.readBuf = self.readBuf[msgLen:]
+            await self.recvAtLeast(len(self.recvBuf) + 1)
+
+            # 버퍼에 완전히 도착한 action 들을 모아서 한번에 처리함
+            actions, size = self.decodeActions(self.recvBuf.view())
+            self.recvBuf.consume(size)
 
-                action = json.loads(msg.decode('utf-8'))
-                print('Received', action)  # TODO: Remove
+            batch = []
+            for seqId, action in actions:
+                if action[0] == ActionType.RESYNC:
+                    self.server.requestResync(self.nodeId)
+                else:
+                    batch.append((action, self.nodeId, seqId))
+
+            if len(batch) > 0:
+                self.server.processBatch(batch)
+
+    # 큐에 쌓인 바이트가 SEND_QUEUE_HARD_LIMIT 를 넘으면 연결을 끊음
+    def write(self, data, tag=None):
+        self.sendQueue.push(data, tag)
+        if len(self.sendQueue) > SEND_QUEUE_HARD_LIMIT:
+            self.close(f'{len(self.sendQueue)} bytes queued')
+        self.pending.set()
+
+    # 남은 프레임을 보내지 않고 연결을 끊음
+    def close(self, reason):
+        if not self.closing:
+            print(f'Disconnecting node {self.nodeId}: {reason}')
+            self.metrics.disconnects += 1
+            self.closing = True
+            self.pending.set()
+
+    # 프레임을 큐에 넣음. 인증을 마친 클라이언트에게만 보냄
+    # 압축을 사용하는 클라이언트면 압축해서 넣음 (cache 는 FrameCompressor.compressFrame 참고)
+    # acks 는 프레임에 담긴 ack 리스트로, 프레임을 합칠 때 이 클라이언트에게 필요한 것만 골라 다시 보냄
+    def send(self, msg, cache=None, acks=()):
+        if not self.ready or self.closing:
+            return
+        if len(self.sendQueue) + len(msg) > self.server.sendQueueLimit():
+            self.coalesce(acks)
+            return
+        if self.compressor is not None:
+            msg = self.compressor.compressFrame(msg, cache)
+        self.write(msg, acks)
+
+    # 클라이언트가 따라오지 못하면 중간 상태들은 보낼 필요가 없으므로 (latest-state-wins),
+    # 아직 보내기 시작하지 않은 프레임들을 버리고 현재 게임판 전체를 담은 프레임 하나로 바꿈
+    # 버린 프레임들의 ack 중 이 클라이언트의 action 에 대한 것과 새 게임 표시 (0, 0) 는 순서대로 다시 담음
+    def coalesce(self, acks):
+        tags = self.sendQueue.dropUnsent()
+        tags.append(acks)
+        nodeId = self.nodeId
+        kept = [ack for tag in tags for ack in tag if ack[0] == nodeId or ack == (0, 0)]
 
-                self.server.process(action, self.nodeId, seqId)
-            yield
+        msg = self.server.makeSnapshot(acks=kept)
+        if self.compressor is not None:
+            # 버린 프레임들은 이미 압축 상태에 반영되었으므로 스트림 압축이면 새로 시작해야 함
+            self.compressor.reset()
+            msg = self.compressor.compressFrame(msg)
+        self.coalesced += 1
+        self.metrics.coalesced += 1
+        self.write(msg, kept)
 
 
-class IntegratedServer(IServerRole, IClientRole):
+# 방에 접속했던 클라이언트 하나의 세션
+# 연결이 끊겨도 SESSION_TIMEOUT 동안 남아있어서, 같은 토큰으로 다시 접속하면 같은 nodeId 를 받음
+class Session:
     def __init__(self):
+        self.token = None  # 이어서 접속할 때 확인하는 토큰 (마지막 핸드셰이크에서 정해준 것)
+        self.lastSeqId = 0  # 처리한 마지막 action 의 seqId. 다시 보낸 action 을 두 번 처리하지 않는 데 사용함
+        self.expireTimer = None  # type: Optional[asyncio.TimerHandle]  # 연결이 끊겨있는 동안만 있음
+
+    def cancelExpire(self):
+        if self.expireTimer is not None:
+            self.expireTimer.cancel()
+            self.expireTimer = None
+
+
+# 게임판 하나와 그 게임판에 접속한 클라이언트들 (방 하나)
+# 게임 창에서는 호스트의 IClientRole 이면서 직접 서버를 열고, DedicatedServer 에서는 방 하나로 사용됨
+class IntegratedServer(IServerRole, IClientRole):
+    # 여러 방이 미리 만들어둔 게임판을 같이 쓰려면 boardPool 을, 통계를 같이 모으려면 metrics 를 넘김
+    def __init__(self, boardPool: Optional[BoardPool] = None, metrics: Optional[ServerMetrics] = None):
         super().__init__()
+        if metrics is None:
+            metrics = ServerMetrics()
+        self.metrics = metrics
         self.lock = threading.Lock()
+        self.timedLock = TimedLock(self.lock, metrics)  # 서버에서 자주 잡는 processBatch 와 flush 에서만 사용함
         self.board = GameBoard()
+        self.config = (0, 0, 0, GenerationMode.RANDOM)  # 마지막으로 만든 게임판의 (너비, 높이, 지뢰 수, 생성 방식)
+        if boardPool is None:
+            boardPool = BoardPool(NoGuessGenerator())
+        self.generator = boardPool.generator
+        self.boardPool = boardPool
         self.startTime = -1
         self.endTime = -1
         self.action = GameAction()
 
         self.listening = False
-        self.processed = []
+        self.processed = []  # 처리했지만 아직 클라이언트들에게 보내지 않은 (nodeId, seqId, 바뀐 칸들)
+        self.version = 0  # 게임판이 바뀔 때마다 1씩 늘어나는 버전
+        self.sentVersion = 0  # 마지막으로 모든 클라이언트에게 보낸 프레임의 버전
+        self.snapshotCache = (-1, b'')  # 마지막으로 직렬화한 게임판의 (버전, 내용)
+        self.resyncNodes = set()  # 게임판 전체를 다시 보내달라고 요청한 클라이언트들
+        self.resyncVersion = -1  # 마지막으로 모든 클라이언트에게 게임판 전체를 보냈을 때의 버전
+        self.gameVersion = 0  # 지금 게임판으로 바꿨을 때의 버전. 이보다 작은 버전은 이전 게임의 것임
+        self.history = collections.deque(maxlen=HISTORY_SIZE)  # 최근 DELTA 프레임들의 (base, 바뀐 칸들, ack 리스트)
+        self.deltaFrames = True  # False 이면 DELTA 프레임 대신 항상 게임판 전체를 보냄
         self.nodes = dict()  # type: dict[int, ClientState]
+        self.sessions = dict()  # type: dict[int, Session]  # 접속해 있거나 최근에 끊긴 클라이언트들
         self.pin = secrets.randbelow(9999) + 1
         self.nodeId = 1
         self.seqId = 1
-        self.selector = selectors.DefaultSelector()
-        self.serverSock = socket.socket()
-        self.serverSock.setblocking(False)
+        self.serverSock = None  # type: Optional[socket.socket]  # startListening 에서 만듦
+        self.loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self.resyncTimer = None  # type: Optional[asyncio.TimerHandle]
+        self.flushScheduled = False  # flush 가 이미 이벤트 루프에 예약되었는지 여부
+        self.compressionMethods = COMPRESSION_METHODS  # 클라이언트에게 허용할 압축 방식. 비어있으면 압축하지 않음
+        self.compressionThreshold = DEFAULT_THRESHOLD
 
         self.thread = threading.Thread(target=self.run, name='serverhandler', daemon=True)
 
     def getHostingInfo(self):
         return {'pin': self.pin}
 
-    def run(self):
-        while True:
-            with self.lock:
-                processed = self.processed
-                self.processed = []
-
-            if len(processed) > 0:
-                msg = b''
-                for nodeId, seqId in processed:
-                    msg += self.makeSnapshot(nodeId, seqId)
-                for node in self.nodes.values():
-                    node.writeBuf += msg
-
-            events = self.selector.select(0.125)
-            for key, mask in events:
-                if key.data is None:
-                    self.handleNewConnection()
-                else:
-                    self.handleReadWrite(key.fileobj, mask, key.data)
+    # 클라이언트마다 보내지 못하고 쌓인 바이트 수, 프레임을 합친 횟수, 주고받은 바이트 수를 {nodeId: dict} 로 리턴함
+    def getQueueStats(self):
+        return {nodeId: {'queued': len(node.sendQueue), 'coalesced': node.coalesced,
+                         'bytesIn': node.bytesIn, 'bytesOut': node.bytesOut}
+                for nodeId, node in list(self.nodes.items())}
 
-    def handleNewConnection(self):
-        sock, addr = self.serverSock.accept()
-        print(f'Accepted connection from tcp://{addr[0]}:{addr[1]}')
-        sock.setblocking(False)
+    # 압축을 사용하는 클라이언트마다 압축 통계를 {nodeId: dict} 로 리턴함
+    def getCompressionStats(self):
+        return {nodeId: node.compressor.stats.asDict()
+                for nodeId, node in list(self.nodes.items()) if node.compressor is not None}
 
-        nodeId = self.nodeId
-        self.nodeId += 1
-        self.nodes[nodeId] = ClientState(self, nodeId)
-        self.selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, nodeId)
+    def run(self):
+        asyncio.run(self.serve())
 
-    def handleReadWrite(self, sock, mask, nodeId):
-        curr = self.nodes[nodeId]
-        if mask & selectors.EVENT_READ != 0:
-            try:
-                data = sock.recv(4096)
-            except ConnectionResetError:
-                # Graceful shutdown에는 이 예외가 발생하지 않음  (대신 길이가 0임)
-                data = b''
-
-            if len(data) == 0:
-                self.selector.unregister(sock)
-                del self.nodes[nodeId]
-                return
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.attach(loop)
+        await acceptConnections(self.serverSock, self)
 
-            curr.readBuf += data
+    # 이 방의 프레임들을 loop 에서 보내기 시작함. loop 에서 불러야 함
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        with self.lock:
+            self.loop = loop
+        self.resyncTimer = loop.call_later(RESYNC_INTERVAL, self.resyncAll)
+        # 이벤트 루프에 붙기 전에 처리한 action 이 있을 수 있음
+        self.flush()
 
-            if not curr.process():
-                self.selector.unregister(sock)
-                sock.close()
-                del self.nodes[nodeId]
+    # 방을 닫을 때 예약해둔 작업들을 멈춤. loop 에서 불러야 함
+    def detach(self):
+        with self.lock:
+            self.loop = None
+        if self.resyncTimer is not None:
+            self.resyncTimer.cancel()
+            self.resyncTimer = None
+        for session in self.sessions.values():
+            session.cancelExpire()
+
+    # 핸드셰이크에서 클라이언트가 들어갈 방과 hello 응답에 더할 내용을 리턴함
+    # 게임 창에서 연 서버에는 방이 하나뿐이므로 hello 의 방 이름은 보지 않음
+    async def selectRoom(self, hello):
+        return self, dict()
+
+    # 인증을 마친 클라이언트를 등록하고 nodeId 를 정해줌. 이벤트 루프에서만 불러야 함
+    # 클라이언트가 이어서 접속하려는 세션이 남아있으면 그 nodeId 를 다시 쓰고, 아니면 새 세션을 만듦
+    def addNode(self, node: ClientState) -> int:
+        nodeId = self.findSession(node.resume)
+        if nodeId is None:
+            nodeId = self.nodeId
+            self.nodeId += 1
+            self.sessions[nodeId] = Session()
+        elif nodeId in self.nodes:
+            # 예전 연결이 끊긴 것을 아직 모르고 있었음
+            self.nodes[nodeId].close('reconnected')
+        session = self.sessions[nodeId]
+        session.token = node.session
+        session.cancelExpire()
+        self.nodes[nodeId] = node
+        return nodeId
+
+    # resume 의 토큰이 맞는 세션이 남아있으면 그 nodeId 를 리턴함
+    def findSession(self, resume):
+        if resume is None:
+            return None
+        session = self.sessions.get(resume['node'])
+        if session is None or session.token is None:
+            return None
+        if not secrets.compare_digest(session.token.encode('utf-8'), resume['session'].encode('utf-8')):
+            return None
+        return resume['node']
+
+    # 연결이 끝난 클라이언트를 지우고, SESSION_TIMEOUT 뒤에 세션도 지우도록 예약함
+    # 같은 세션으로 다시 접속한 연결이 이미 등록되어 있으면 아무것도 하지 않음
+    def removeNode(self, node: ClientState):
+        nodeId = node.nodeId
+        if self.nodes.get(nodeId) is not node:
+            return
+        del self.nodes[nodeId]
+        if self.loop is not None:
+            self.sessions[nodeId].expireTimer = self.loop.call_later(SESSION_TIMEOUT, self.expireSession, nodeId)
+        else:
+            self.expireSession(nodeId)
+
+    def expireSession(self, nodeId: int):
+        if nodeId not in self.nodes:
+            self.sessions.pop(nodeId, None)
+
+    # 처리한 action 들을 클라이언트들에게 보내도록 이벤트 루프에 flush 를 예약함
+    # 여러 번 불러도 한번만 예약되므로, 그 사이에 처리한 action 들은 프레임 하나로 묶임
+    # 다른 스레드에서도 부를 수 있으며, self.lock 을 잡은 상태에서 불러야 함
+    def scheduleFlush(self):
+        if self.loop is not None and not self.flushScheduled:
+            self.flushScheduled = True
+            self.loop.call_soon_threadsafe(self.flush)
+
+    # 처리한 action 들과 게임판 전체를 다시 보내달라는 요청을 처리함. 이벤트 루프에서만 불러야 함
+    def flush(self):
+        start = time.perf_counter()
+        with self.timedLock:
+            self.flushScheduled = False
+            if self.loop is None:
                 return
-
-        if len(curr.writeBuf) > 0 and mask & selectors.EVENT_WRITE != 0:
-            offset = 0
-            while offset < len(curr.writeBuf):
-                try:
-                    ret = sock.send(curr.writeBuf)
-                    if ret <= 0:
-                        break
-                    offset += ret
-                except BlockingIOError:
-                    break
-            curr.writeBuf = curr.writeBuf[offset:]
+            processed = self.processed
+            self.processed = []
+            resyncNodes = self.resyncNodes
+            self.resyncNodes = set()
+            # 이번에 처리한 action 들을 프레임 하나로 만듦
+            if len(processed) > 0:
+                msg, acks = self.makeUpdate(processed)
+            else:
+                msg = None
+
+        # 모든 클라이언트가 같은 프레임을 받음 (압축 설정이 같은 클라이언트끼리는 압축한 결과도 같이 씀)
+        if msg is not None:
+            cache = dict()
+            for node in list(self.nodes.values()):
+                node.send(msg, cache, acks)
+            self.metrics.frames += 1
+
+        # 위에서 보낸 프레임보다 나중에 만들어지므로 클라이언트는 항상 최신 상태로 맞춰짐
+        if len(resyncNodes) > 0:
+            msg = self.makeSnapshot(FrameKind.RESYNC)
+            cache = dict()
+            for nodeId in resyncNodes:
+                node = self.nodes.get(nodeId)
+                if node is not None:
+                    node.send(msg, cache)
+        self.metrics.flush.record(time.perf_counter() - start)
+
+    # 게임판이 바뀌었으면 모든 클라이언트에게 게임판 전체를 다시 보내고, RESYNC_INTERVAL 뒤에 다시 부르도록 예약함
+    def resyncAll(self):
+        with self.lock:
+            if self.resyncVersion != self.version:
+                self.resyncVersion = self.version
+                self.resyncNodes.update(self.nodes)
+                self.scheduleFlush()
+        self.resyncTimer = self.loop.call_later(RESYNC_INTERVAL, self.resyncAll)
 
     def process(self, action, nodeId=0, seqId=None):
-        if self.checkFinished():
-            return
+        self.processBatch([(action, nodeId, seqId)])
+
+    # (action, nodeId, seqId) 의 리스트를 한번에 처리함
+    # 락은 한번만 잡고, 화면 새로고침도 한번만 함
+    # 게임이 끝난 뒤에 들어온 action 은 무시함
+    # 게임판 밖의 칸에 대한 action 은 (이전 게임판에서 보낸 것일 수 있으므로) 적용하지 않고 확인만 해줌
+    def processBatch(self, batch):
+        start = time.perf_counter()
+        with self.timedLock:
+            if self.endTime >= 0:
+                return
+            self.metrics.actions += len(batch)
 
-        with self.lock:
-            if seqId is None:
-                seqId = self.seqId
-                self.seqId += 1
             if self.startTime < 0:
                 self.startTime = time.monotonic()
 
-            self.board.doAction(action)
-            self.processed.append((nodeId, seqId))
-
-            if self.endTime < 0 and self.board.checkFinished():
-                self.endTime = time.monotonic()
+            for action, nodeId, seqId in batch:
+                if seqId is None:
+                    seqId = self.seqId
+                    self.seqId += 1
+                    session = None
+                else:
+                    session = self.sessions.get(nodeId)
+
+                if session is not None and seqId <= session.lastSeqId:
+                    # 다시 접속한 클라이언트가 확인받지 못해서 다시 보낸, 이미 처리한 action 은 확인만 해줌
+                    changes = ChangeSet()
+                elif 0 <= action[1] < self.board.width() and 0 <= action[2] < self.board.height():
+                    changes = self.board.doAction(action)
+                    self.version += 1
+                else:
+                    changes = ChangeSet()
+                if session is not None:
+                    session.lastSeqId = max(session.lastSeqId, seqId)
+                if self.listening:
+                    self.processed.append((nodeId, seqId, changes))
+                    self.scheduleFlush()
+
+                # 승리 여부는 GameBoard 가 개수로 관리하므로 확인하는 비용이 거의 없음
+                if self.board.checkFinished():
+                    self.endTime = time.monotonic()
+                    break
 
+            self.metrics.process.record(time.perf_counter() - start)
         self.refreshCallback()
 
-    def makeSnapshot(self, nodeId, seqId):
+    # 바뀐 칸들을 DELTA 프레임의 내용으로 만듦. 게임판 전체를 보내야 하면 None 을 리턴
+    # self.lock 을 잡은 상태에서 불러야 함
+    def encodeChanges(self, changes: ChangeSet):
+        if changes.full or not self.deltaFrames:
+            return None
+        delta = self.board.serializeChanges(changes)
+        # 게임판 전체는 칸마다 5비트, DELTA 는 칸마다 8비트 남짓이므로 이보다 크면 전체를 보내는 편이 작음
+        if len(delta) * 8 > self.board.width() * self.board.height() * 5:
+            return None
+        return delta
+
+    # 다른 처리를 마친 뒤 nodeId 클라이언트에게 게임판 전체를 다시 보냄
+    def requestResync(self, nodeId):
         with self.lock:
-            currTime = time.monotonic()
-            if self.startTime >= 0:
-                startTime = currTime - self.startTime
-            else:
-                startTime = self.startTime
-            if self.endTime >= 0:
-                endTime = currTime - self.endTime
-            else:
-                endTime = self.endTime
-            msg = self.board.serializeGame()
-        return struct.pack('!2L2dL', nodeId, seqId, startTime, endTime, len(msg)) + msg
+            self.resyncNodes.add(nodeId)
+            self.scheduleFlush()
+
+    # 지난번에 보낸 뒤로 처리한 (nodeId, seqId, 바뀐 칸들) 을 모두 담은 프레임 하나를 만들고 (프레임, ack 리스트) 를 리턴함
+    # 바뀐 칸들을 합쳐서 한번만 인코딩하고, 어떤 action 들이 반영되었는지는 ack 리스트로 알려줌
+    # (지뢰가 배치되었거나 바뀐 칸이 너무 많으면 DELTA 대신 게임판 전체를 보냄)
+    # self.lock 을 잡은 상태에서 불러야 함
+    def makeUpdate(self, processed):
+        changes = ChangeSet()
+        acks = []
+        for nodeId, seqId, curr in processed:
+            changes.merge(curr)
+            acks.append((nodeId, seqId))
+
+        delta = self.encodeChanges(changes)
+        base = self.sentVersion
+        self.sentVersion = self.version
+        if delta is None:
+            # 이전 DELTA 프레임들을 놓친 클라이언트도 이 프레임 하나로 맞춰지므로 더 이상 기억할 필요가 없음
+            self.history.clear()
+            return self.makeFrame(FrameKind.SNAPSHOT, base, acks, self.serializeBoard()), acks
+        self.history.append((base, changes, acks))
+        return self.makeFrame(FrameKind.DELTA, base, acks, delta), acks
+
+    # 현재 게임판 전체를 담은 프레임을 만듦
+    def makeSnapshot(self, kind=FrameKind.SNAPSHOT, acks=()):
+        with self.lock:
+            return self.makeFrame(kind, 0, acks, self.serializeBoard())
+
+    # 이어서 접속한 nodeId 클라이언트에게 version 뒤로 놓친 변경을 담은 프레임을 만듦
+    # 놓친 DELTA 프레임들이 history 에 모두 있으면 그 바뀐 칸들과 이 클라이언트의 ack 들을 합친 DELTA 프레임 하나를,
+    # 아니면 게임판 전체를 담은 프레임을 만듦. 이전 게임에서 끊겼으면 새 게임 표시 (0, 0) 를 담아서
+    # 클라이언트가 확인받지 못한 action 들을 새 게임에 다시 보내지 않게 함
+    def makeResume(self, nodeId: int, version: int):
+        with self.lock:
+            changes = None
+            acks = []
+            for base, curr, currAcks in self.history:
+                # ack 만 담은 프레임은 base 와 버전이 같으므로, 같은 base 의 프레임 중 첫 번째부터 합침
+                if changes is None and base == version:
+                    changes = ChangeSet()
+                if changes is not None:
+                    changes.merge(curr)
+                    acks.extend(ack for ack in currAcks if ack[0] == nodeId or ack == (0, 0))
+            if changes is None and version == self.sentVersion:
+                changes = ChangeSet()
+            if changes is not None:
+                delta = self.encodeChanges(changes)
+                if delta is not None:
+                    return self.makeFrame(FrameKind.DELTA, version, acks, delta)
+            acks = [(0, 0)] if version < self.gameVersion else []
+            return self.makeFrame(FrameKind.SNAPSHOT, 0, acks, self.serializeBoard())
+
+    # ClientState 가 보내지 못한 프레임들을 합치기 시작하는 바이트 수
+    # 게임판 전체보다 작으면 합친 프레임조차 한도를 넘으므로 게임판 전체 크기의 2배보다는 크게 잡음
+    # snapshotCache 는 통째로 바뀌므로 락 없이 읽어도 됨
+    def sendQueueLimit(self):
+        return max(SEND_QUEUE_LIMIT, 2 * len(self.snapshotCache[1]))
+
+    # 게임판을 직렬화함. 같은 버전의 게임판은 한번만 직렬화하고 그 결과를 같이 씀
+    # self.lock 을 잡은 상태에서 불러야 함
+    def serializeBoard(self):
+        self.metrics.snapshots += 1
+        version, data = self.snapshotCache
+        if version != self.version:
+            start = time.perf_counter()
+            data = self.board.serializeGame()
+            self.snapshotCache = (self.version, data)
+            self.metrics.serialize.record(time.perf_counter() - start)
+        else:
+            self.metrics.snapshotCacheHits += 1
+        return data
+
+    # self.lock 을 잡은 상태에서 불러야 함
+    def makeFrame(self, kind, base, acks, msg):
+        currTime = time.monotonic()
+        if self.startTime >= 0:
+            startTime = currTime - self.startTime
+        else:
+            startTime = self.startTime
+        if self.endTime >= 0:
+            endTime = currTime - self.endTime
+        else:
+            endTime = self.endTime
+        header = FRAME_HEADER.pack(kind, base, self.version, startTime, endTime, len(acks), len(msg))
+        return b''.join([header] + [FRAME_ACK.pack(nodeId, seqId) for nodeId, seqId in acks] + [msg])
 
     def startListening(self):
         if self.listening:
             return True
 
         try:
+            self.serverSock = socket.socket()
+            self.serverSock.setblocking(False)
             self.serverSock.bind(('0.0.0.0', DEFAULT_PORT))
             self.serverSock.listen(8)
-            self.selector.register(self.serverSock, selectors.EVENT_READ, None)
         except OSError:
+            self.serverSock.close()
             return False
 
         self.listening = True
         self.thread.start()
         return True
 
-    def newGame(self, width: int, height: int, mines: int):
-        self.board.newGame(width, height, mines)
-        self.startTime = -1
-        self.endTime = -1
-        if self.listening:
-            self.processed.append((0, 0))
+    def newGame(self, width: int, height: int, mines: int, mode: GenerationMode = GenerationMode.RANDOM):
+        config = (width, height, mines, mode)
+        self.resetBoard(self.boardPool.take(config), config)
         self.rebuildCallback()
 
     def newGameSameConfig(self):
-        self.board.newGame(self.width(), self.height(), self.board.countMine())
-        self.startTime = -1
-        self.endTime = -1
-        if self.listening:
-            self.processed.append((0, 0))
+        self.resetBoard(self.boardPool.take(self.config), self.config)
         self.refreshCallback()
 
+    # 새로 만든 게임판으로 바꾸고 시간을 초기화함
+    def resetBoard(self, board: GameBoard, config):
+        with self.lock:
+            self.board = board
+            self.config = config
+            self.version += 1
+            self.gameVersion = self.version
+            self.startTime = -1
+            self.endTime = -1
+            if self.listening:
+                changes = ChangeSet()
+                changes.setFull()
+                self.processed.append((0, 0, changes))
+                self.scheduleFlush()
+
     def cycleCellImage(self, x: int, y: int):
         if self.startTime < 0:
             self.startTime = time.monotonic()
@@ -238,6 +744,7 @@ class IntegratedServer(IServerRole, IClientRole):
             if self.board.openCell(x, y):
                 self.board.finishGame()
                 self.endTime = time.monotonic()
+            self.version += 1
         else:
             self.process(self.action.openCell(x, y))
 
@@ -252,6 +759,7 @@ class IntegratedServer(IServerRole, IClientRole):
             if self.board.openCellAdjacent(x, y):
                 self.board.finishGame()
                 self.endTime = time.monotonic()
+            self.version += 1
         else:
             self.process(self.action.openCellAdjacent(x, y))
 
@@ -285,6 +793,10 @@ class IntegratedServer(IServerRole, IClientRole):
                 return time.monotonic() - self.startTime
         return 0
 
+    def takeChanges(self) -> ChangeSet:
+        with self.lock:
+            return self.board.popChanges()
+
     def height(self) -> int:
         with self.lock:
             return self.board.height()
@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from typing import Optional
+
+from compression import COMPRESSION_METHODS, FrameDecompressor
+from constants import GenerationMode, ActionType, DEFAULT_PORT, MAGIC_STRING, HELLO_HEADER, FRAME_HEADER, FRAME_ACK, \
+    FRAME_COMPRESSED, FRAME_RESET, FrameKind
+from dedicatedserver import raiseFileLimit
+from gameaction import encodeAction
+from gameboard import BOARD_HEADER
+from metrics import LatencyHistogram
+
+
+# 클라이언트가 누르는 action 의 종류
+# flag 는 게임이 끝나지 않으므로 오래 측정할 때 사용하고, open 은 칸을 여는 비용까지 포함해서 측정함
+ACTIONS = {
+    'flag': (ActionType.CYCLE_CELL_IMAGE,),
+    'open': (ActionType.OPEN_CELL,),
+    'mixed': (ActionType.CYCLE_CELL_IMAGE, ActionType.OPEN_CELL, ActionType.OPEN_CELL_ADJACENT),
+}
+
+# 직접 띄운 서버가 연결을 받을 수 있게 될 때까지 기다리는 최대 시간 (초)
+SPAWN_TIMEOUT = 10.0
+
+
+# 부하 테스트 전체의 측정값. 모든 클라이언트가 같은 객체에 기록함
+class LoadResult:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.actionsSent = 0
+        self.actionsAcked = 0
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.frames = dict()  # FrameKind 이름 -> 받은 개수
+        self.latency = LatencyHistogram()  # action 을 보낸 뒤 그 ack 가 돌아올 때까지 걸린 시간
+        self.connectTime = LatencyHistogram()  # 연결을 시작한 뒤 처음 게임판을 받을 때까지 걸린 시간
+        self.errors = dict()  # 실패 이유 -> 개수
+
+    def fail(self, reason: str):
+        self.failed += 1
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+# 같은 방에 들어가는 클라이언트들이 공유하는 정보
+# 첫 클라이언트가 방을 만들고, 나머지는 서버가 정해준 핀 번호를 기다렸다가 들어감
+class RoomInfo:
+    def __init__(self, name: str, pin: Optional[int]):
+        self.name = name
+        self.pin = asyncio.get_running_loop().create_future()
+        if pin is not None:
+            self.pin.set_result(pin)
+        self.creating = pin is None  # 아직 방을 만들 클라이언트가 나오지 않았으면 True
+
+
+# NetworkClient 와 같은 프로토콜로 접속해서 정해진 빈도로 action 을 보내는 가상의 클라이언트
+class SwarmClient:
+    def __init__(self, args, room: RoomInfo, result: LoadResult, rng: random.Random):
+        self.args = args
+        self.room = room
+        self.result = result
+        self.rng = rng
+        self.nodeId = -1
+        self.creating = False  # 이 클라이언트가 방을 만드는지 여부
+        self.width = 0
+        self.height = 0
+        self.sentAt = dict()  # 확인받지 못한 seqId -> 보낸 시각
+        self.decompressor = None  # type: Optional[FrameDecompressor]
+
+    # start 부터 deadline 까지 action 을 보내고, deadline 뒤 1초까지는 남은 ack 를 기다림
+    async def run(self, start: float, deadline: float):
+        began = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(self.args.host, self.args.port)
+        except OSError as e:
+            self.result.fail(type(e).__name__)
+            return
+
+        try:
+            # 측정 시간이 끝난 뒤에야 연결되었으면 (부하 생성기나 서버가 밀린 것) 방이 이미 닫혔을 수 있으므로 들어가지 않음
+            if time.perf_counter() >= deadline:
+                self.result.fail('connected too late')
+                return
+            if not await self.handshake(reader, writer):
+                return
+            await self.readFrame(reader)
+            self.result.connected += 1
+            self.result.connectTime.record(time.perf_counter() - began)
+
+            clicker = asyncio.get_running_loop().create_task(self.click(writer, start, deadline))
+            try:
+                while time.perf_counter() < deadline or (self.sentAt and time.perf_counter() < deadline + 1):
+                    await asyncio.wait_for(self.readFrame(reader), max(0.01, deadline + 1 - time.perf_counter()))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                clicker.cancel()
+        except (OSError, asyncio.IncompleteReadError, ValueError, ConnectionError) as e:
+            self.result.fail(type(e).__name__)
+        finally:
+            writer.close()
+            # 방을 만들다가 실패했으면 기다리던 클라이언트들도 실패하게 함
+            if self.creating and not self.room.pin.done():
+                self.room.pin.set_exception(ConnectionError('Room was not created'))
+
+    # 방을 만들거나 핀 번호를 받은 뒤 인증까지 마침. 실패하면 False 를 리턴
+    async def handshake(self, reader, writer):
+        room = self.room
+        hello = {'compression': list(COMPRESSION_METHODS) if self.args.compression else [], 'stream': True,
+                 'room': room.name}
+        creating = self.creating = room.creating
+        if creating:
+            room.creating = False
+            args = self.args
+            hello['create'] = {'width': args.width, 'height': args.height, 'mines': args.mines,
+                               'mode': int(GenerationMode[args.mode.upper()])}
+        else:
+            await room.pin
+
+        hello = json.dumps(hello).encode('utf-8')
+        self.write(writer, MAGIC_STRING + HELLO_HEADER.pack(len(hello)) + hello)
+        nonce = await reader.readexactly(16)
+        size = HELLO_HEADER.unpack(await reader.readexactly(HELLO_HEADER.size))[0]
+        reply = json.loads(await reader.readexactly(size))
+        self.result.bytesReceived += 16 + HELLO_HEADER.size + size
+        # 같은 이름의 방이 이미 있으면 (이전 테스트의 방 등) 핀 번호를 받지 못하므로 들어갈 수 없음
+        if 'error' not in reply and creating and 'pin' not in reply:
+            reply['error'] = 'room already exists'
+        if 'error' in reply:
+            self.result.fail(reply['error'])
+            if creating:
+                room.pin.set_exception(ValueError(reply['error']))
+            return False
+        if creating:
+            room.pin.set_result(reply['pin'])
+        if reply.get('compression') is not None:
+            self.decompressor = FrameDecompressor(reply['compression'], reply.get('stream', False))
+
+        pin = room.pin.result()
+        self.write(writer, hashlib.sha224(pin.to_bytes(2, byteorder='little', signed=False) + nonce).digest())
+        data = await reader.readexactly(4)
+        self.result.bytesReceived += 4
+        self.nodeId = int.from_bytes(data, byteorder='big', signed=False)
+        return True
+
+    # 프레임 하나를 읽고 자신의 action 에 대한 ack 들의 레이턴시를 기록함
+    # 게임판 전체를 받으면 헤더만 읽어서 크기를 알아둠
+    async def readFrame(self, reader):
+        header = await reader.readexactly(FRAME_HEADER.size)
+        kind, base, version, startTime, endTime, ackCount, msgLen = FRAME_HEADER.unpack(header)
+        rest = await reader.readexactly(ackCount * FRAME_ACK.size + msgLen)
+        now = time.perf_counter()
+        result = self.result
+        result.bytesReceived += len(header) + len(rest)
+
+        for nodeId, seqId in FRAME_ACK.iter_unpack(memoryview(rest)[:ackCount * FRAME_ACK.size]):
+            if nodeId == self.nodeId:
+                sentAt = self.sentAt.pop(seqId, None)
+                if sentAt is not None:
+                    result.latency.record(now - sentAt)
+                    result.actionsAcked += 1
+
+        body = memoryview(rest)[ackCount * FRAME_ACK.size:]
+        if kind & FRAME_COMPRESSED:
+            if kind & FRAME_RESET:
+                self.decompressor.reset()
+            kind &= ~(FRAME_COMPRESSED | FRAME_RESET)
+            body = self.decompressor.decompress(body)
+        name = FrameKind(kind).name
+        result.frames[name] = result.frames.get(name, 0) + 1
+        if kind != FrameKind.DELTA:
+            magic, boardVersion, mode, self.width, self.height, pendingMines = BOARD_HEADER.unpack_from(body)
+
+    # start 부터 deadline 까지 평균 rate 번/초의 빈도로 (포아송 과정) 무작위 칸에 action 을 보냄
+    async def click(self, writer, start: float, deadline: float):
+        rng = self.rng
+        actions = ACTIONS[self.args.action]
+        seqId = 1
+        await asyncio.sleep(max(0.0, start - time.perf_counter()))
+        while True:
+            await asyncio.sleep(rng.expovariate(self.args.rate))
+            if time.perf_counter() >= deadline:
+                return
+            if self.width == 0 or self.height == 0:
+                continue
+            action = (rng.choice(actions), rng.randrange(self.width), rng.randrange(self.height))
+            self.sentAt[seqId] = time.perf_counter()
+            self.write(writer, encodeAction(seqId, action))
+            self.result.actionsSent += 1
+            seqId += 1
+
+    def write(self, writer, data):
+        writer.write(data)
+        self.result.bytesSent += len(data)
+
+
+# 클라이언트들을 ramp 초에 걸쳐 나눠서 접속시킨 뒤, 모두 함께 duration 초 동안 action 을 보내며 측정함
+async def swarm(args):
+    result = LoadResult()
+    rng = random.Random(args.seed)
+    rooms = [RoomInfo(f'{args.room_prefix}{k}', args.pin) for k in range(args.rooms)]
+    began = time.perf_counter()
+    start = began + args.ramp
+    deadline = start + args.duration
+    tasks = []
+    for k in range(args.clients):
+        client = SwarmClient(args, rooms[k % len(rooms)], result, random.Random(rng.getrandbits(64)))
+        tasks.append(asyncio.get_running_loop().create_task(client.run(start, deadline)))
+        if args.ramp > 0:
+            await asyncio.sleep(args.ramp / args.clients)
+    await asyncio.gather(*tasks)
+    return result, time.perf_counter() - began
+
+
+# 결과를 JSON 으로 저장하기 좋은 dict 로 바꿈
+def makeReport(result: LoadResult, args, seconds: float):
+    acked = result.actionsAcked
+    return {
+        'clients': args.clients,
+        'rooms': args.rooms,
+        'connected': result.connected,
+        'failed': result.failed,
+        'errors': result.errors,
+        'actionsSent': result.actionsSent,
+        'actionsAcked': acked,
+        'actionsLost': result.actionsSent - acked,
+        'seconds': seconds,
+        'actionsPerSecond': acked / args.duration if args.duration else 0.0,
+        'bytesSentPerAction': result.bytesSent / acked if acked else 0.0,
+        'bytesReceivedPerAction': result.bytesReceived / acked if acked else 0.0,
+        'frames': result.frames,
+        'latency': result.latency.summary(),
+        'connectTime': result.connectTime.summary(),
+    }
+
+
+def printReport(report):
+    print(f'clients    {report["connected"]:>12} connected, {report["failed"]} failed {report["errors"] or ""}')
+    print(f'actions    {report["actionsAcked"]:>12} acked ({report["actionsPerSecond"]:.1f}/s), '
+          f'{report["actionsLost"]} not acked')
+    print(f'bytes      {report["bytesSentPerAction"]:>12.1f} sent / {report["bytesReceivedPerAction"]:.1f} received '
+          f'per action')
+    print(f'frames     {report["frames"]}')
+    print()
+    print(f'{"latency":<10} {"count":>12} {"mean ms":>10} {"p50 ms":>10} {"p95 ms":>10} {"p99 ms":>10} {"max ms":>10}')
+    for name in ('latency', 'connectTime'):
+        t = report[name]
+        print(f'{name:<10} {t["count"]:>12} {t["mean"] * 1e3:>10.2f} {t["p50"] * 1e3:>10.2f} '
+              f'{t["p95"] * 1e3:>10.2f} {t["p99"] * 1e3:>10.2f} {t["max"] * 1e3:>10.2f}')
+
+
+# 측정할 서버를 하위 프로세스로 띄우고 연결을 받을 수 있을 때까지 기다림
+def spawnServer(args):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{args.spawn}server.py')
+    command = [sys.executable, script, '--host', args.host, '--port', str(args.port)]
+    if args.spawn == 'sharded' and args.workers is not None:
+        command += ['--workers', str(args.workers)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + SPAWN_TIMEOUT
+    while True:
+        try:
+            socket.create_connection((args.host, args.port), timeout=1).close()
+            return process
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError('Server did not start')
+            time.sleep(0.1)
+
+
+# 명령줄 인자를 읽음. argv 가 None 이면 sys.argv 를 사용함
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description='많은 가상 클라이언트로 협동 서버에 부하를 주는 테스트')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--pin', type=int, default=None,
+                        help='방을 만들지 않고 이 핀 번호로 이미 있는 방에 들어감 (게임 창에서 연 서버는 필수)')
+    parser.add_argument('--spawn', choices=['dedicated', 'sharded'], default=None,
+                        help='테스트할 서버를 이 컴퓨터에서 시작하고 끝나면 멈춤')
+    parser.add_argument('--workers', type=int, default=None, help='--spawn sharded 의 워커 프로세스 수')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--room-prefix', default='load-')
+    parser.add_argument('--rate', type=float, default=2.0, help='클라이언트마다 1초에 보낼 action 수')
+    parser.add_argument('--action', choices=ACTIONS, default='flag')
+    parser.add_argument('--duration', type=float, default=10.0, help='모두 접속한 뒤에 측정할 시간(초)')
+    parser.add_argument('--ramp', type=float, default=2.0, help='클라이언트들이 나눠서 접속하는 시간(초)')
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=16)
+    parser.add_argument('--mines', type=int, default=99)
+    parser.add_argument('--mode', choices=[mode.name.lower() for mode in GenerationMode], default='safe')
+    parser.add_argument('--no-compression', dest='compression', action='store_false')
+    parser.add_argument('--seed', default='0')
+    parser.add_argument('--json', action='store_true', help='결과를 JSON 으로 출력')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+    raiseFileLimit()
+    process = spawnServer(args) if args.spawn is not None else None
+    try:
+        result, seconds = asyncio.run(swarm(args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = makeReport(result, args, seconds)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        printReport(report)
+
+
+if __name__ == '__main__':
+    main()
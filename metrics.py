@@ -0,0 +1,161 @@
+import math
+import threading
+import time
+
+
+# 히스토그램 칸의 세밀함. 2배 구간을 이만큼의 칸으로 나눔 (오차는 대략 2^(1/8) - 1 = 9% 이내)
+BUCKETS_PER_DOUBLING = 8
+
+
+# 걸린 시간의 분포를 저장하는 히스토그램
+# 값을 모두 저장하지 않고 로그 단위 칸마다 개수만 세므로, 아무리 많이 기록해도 크기가 거의 일정함
+# 여러 프로세스에서 만든 히스토그램을 merge() 로 합칠 수 있음
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = dict()  # 칸 번호 -> 개수
+        self.count = 0
+        self.total = 0.0  # 기록한 시간의 합(초)
+        self.min = math.inf
+        self.max = 0.0
+
+    # 걸린 시간(초)을 기록함
+    def record(self, seconds: float):
+        if seconds > 0:
+            bucket = math.floor(math.log2(seconds) * BUCKETS_PER_DOUBLING)
+        else:
+            bucket = None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        # 서버에서는 락을 잡을 때마다 불리므로 min(), max() 대신 비교함
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    # p (0 ~ 100) 백분위수를 리턴함 (기록한 값이 없으면 0)
+    # 칸의 윗경계를 리턴하므로 실제 값보다 조금 클 수 있음
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = self.buckets.get(None, 0)
+        if seen >= rank:
+            return 0.0
+        for bucket in sorted(b for b in self.buckets if b is not None):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.max, 2 ** ((bucket + 1) / BUCKETS_PER_DOUBLING))
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    # 사람이 읽거나 JSON 으로 저장하기 좋은 요약을 리턴함 (시간은 초 단위)
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+# 클라이언트가 접속해 있는 동안 이벤트 루프가 밀린 정도를 재는 기본 주기 (초)
+LOOP_PROBE_INTERVAL = 0.1
+
+
+# 서버에서 시간이 어디에 쓰이는지 알기 위한 카운터와 히스토그램들
+# 운영 중에도 켜둘 수 있도록 기록할 때는 perf_counter 두 번과 히스토그램 칸 하나만 늘림
+# 여러 스레드에서 락 없이 기록하므로 드물게 한두 개가 빠질 수 있음
+class ServerMetrics:
+    # 걸린 시간(초)의 분포를 기록하는 것들
+    HISTOGRAMS = (
+        'process',  # processBatch 한 번 (락을 기다린 시간 포함)
+        'serialize',  # 게임판 전체를 직렬화하는 데 걸린 시간 (캐시를 쓰지 못한 경우만)
+        'flush',  # 처리한 action 들을 프레임으로 만들어 모든 클라이언트의 큐에 넣기까지
+        'loopLag',  # 이벤트 루프에 예약한 콜백이 예정보다 늦게 실행된 시간
+        'lockWait',  # processBatch 와 flush 가 방의 락을 다른 스레드가 잡고 있어서 기다린 시간 (기다린 경우만)
+        'lockHold',  # processBatch 와 flush 가 방의 락을 잡고 있던 시간
+    )
+    # 개수나 바이트 수를 세는 것들
+    COUNTERS = (
+        'actions',  # 처리한 action 수
+        'frames',  # 모든 클라이언트에게 보낸 프레임 수
+        'snapshots',  # 게임판 전체를 담은 프레임을 만든 횟수
+        'snapshotCacheHits',  # 그 중 직렬화한 결과를 다시 쓴 횟수
+        'coalesced',  # 느린 클라이언트의 프레임들을 하나로 합친 횟수
+        'connections',  # 받은 연결 수
+        'disconnects',  # 느리거나 데이터를 너무 많이 쌓아서 끊은 연결 수
+        'bytesIn',  # 클라이언트들에게서 받은 바이트 수
+        'bytesOut',  # 클라이언트들에게 보낸 바이트 수
+    )
+
+    # probeInterval 은 이벤트 루프가 밀린 정도를 재는 주기 (초). 0 이면 재지 않음
+    def __init__(self, probeInterval: float = LOOP_PROBE_INTERVAL):
+        self.probeInterval = probeInterval
+        self.probe = None  # 예약해둔 probeLoop 의 TimerHandle. 재고 있지 않으면 None
+        self.connected = 0  # 지금 연결되어 있는 클라이언트 수 (reset 으로 지우지 않음)
+        self.reset()
+
+    # 지금까지 기록한 것을 모두 지움. 주기적으로 출력할 때 각 줄이 한 주기만 담도록 출력한 뒤 부름
+    def reset(self):
+        for name in self.HISTOGRAMS:
+            setattr(self, name, LatencyHistogram())
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+
+    # JSON 으로 저장하기 좋은 dict 를 리턴함 (시간은 초 단위)
+    def asDict(self):
+        result = {name: getattr(self, name) for name in self.COUNTERS}
+        result.update((name, getattr(self, name).summary()) for name in self.HISTOGRAMS)
+        return result
+
+    # 클라이언트가 접속할 때 불러서, 연결이 남아있는 동안 loop 가 밀린 정도를 probeInterval 마다 잼
+    # 접속한 클라이언트가 없으면 멈추므로 아무도 없는 서버는 깨어나지 않음. loop 에서 불러야 함
+    def watchLoop(self, loop):
+        if self.probe is None and self.probeInterval > 0:
+            self.probe = loop.call_later(self.probeInterval, self.probeLoop, loop, loop.time() + self.probeInterval)
+
+    def probeLoop(self, loop, expected: float):
+        self.probe = None
+        self.loopLag.record(max(0.0, loop.time() - expected))
+        if self.connected > 0:
+            self.watchLoop(loop)
+
+
+# lock 을 기다린 시간과 잡고 있던 시간을 metrics 에 기록하면서 잡음. with 문으로만 사용함
+# 보통 lock 보다 몇 배 느리므로 자주 불리는 곳 (칸 하나를 읽는 함수 등) 에서는 lock 을 직접 사용함
+class TimedLock:
+    def __init__(self, lock: threading.Lock, metrics: ServerMetrics):
+        self.lock = lock
+        self.metrics = metrics
+        self.acquiredAt = 0.0
+
+    def __enter__(self):
+        # 대부분은 바로 잡히므로 그 때는 기다린 시간을 재지 않음
+        if not self.lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self.lock.acquire()
+            self.acquiredAt = time.perf_counter()
+            self.metrics.lockWait.record(self.acquiredAt - start)
+        else:
+            self.acquiredAt = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # 락을 놓기 전에 기록하므로 같은 락을 쓰는 스레드끼리는 기록이 섞이지 않음
+        self.metrics.lockHold.record(time.perf_counter() - self.acquiredAt)
+        self.lock.release()
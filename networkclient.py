@@ -7,14 +7,31 @@ import time
 
 from typing import Optional
 
+from changeset import ChangeSet
 from clientrole import IClientRole
-from constants import ImageType, DEFAULT_PORT, MAGIC_STRING
-from gameaction import GameAction
+from constants import ImageType, FrameKind, ActionType, DEFAULT_PORT, MAGIC_STRING, HELLO_HEADER, MAX_HELLO_SIZE, \
+    FRAME_HEADER, FRAME_ACK, FRAME_COMPRESSED, FRAME_RESET
+from buffers import RecvBuffer
+from compression import COMPRESSION_METHODS, FrameDecompressor
+from gameaction import GameAction, encodeAction
 from gameboard import GameBoard
 
 
+# 연결이 끊기면 이 횟수만큼 다시 접속해봄. 사이에 기다리는 시간은 RECONNECT_DELAY 초부터 두 배씩 늘어남
+# 모두 합쳐도 서버가 세션을 남겨두는 시간 (integratedserver.SESSION_TIMEOUT) 보다 짧아야 함
+RECONNECT_ATTEMPTS = 5
+RECONNECT_DELAY = 0.5
+
+# 서버에 접속할 때 기다리는 최대 시간(초)
+CONNECT_TIMEOUT = 10.0
+
+
 class NetworkClient(IClientRole):
-    def __init__(self, addr: str, pin: int):
+    # compression 에는 서버에 제시할 압축 방식들을 선호하는 순서대로 넘김 (비어있으면 압축하지 않음)
+    # DedicatedServer 에 접속할 때는 room 에 들어갈 방 이름을 넘기고,
+    # 없는 방을 만들려면 create 에 {'width', 'height', 'mines', 'mode'} 를 넘김 (이 때는 pin 대신 서버가 정해준 핀을 사용함)
+    def __init__(self, addr: str, pin: int, compression=COMPRESSION_METHODS, stream: bool = True,
+                 room: Optional[str] = None, create: Optional[dict] = None):
         super().__init__()
 
         self.disconnectedCallback = None
@@ -28,9 +45,21 @@ class NetworkClient(IClientRole):
         self.socket = None  # type: Optional[socket.socket]
         self.nodeId = -1
         self.seqId = 1
-        self.board = GameBoard()
+        self.confirmed = GameBoard()  # 서버가 보내준 내용만 반영한 게임판
+        self.version = 0  # confirmed 의 버전 (서버의 게임판 버전)
+        self.board = GameBoard()  # confirmed 에 아직 확인받지 못한 액션들을 적용한, 화면에 보여줄 게임판
+        self.predicted = ChangeSet()  # board 에서 확인받지 못한 액션들 때문에 confirmed 와 달라졌을 수 있는 칸들
         self.startTime = -1
         self.endTime = -1
+        self.hello = {'compression': list(compression), 'stream': stream}
+        if room is not None:
+            self.hello['room'] = room
+        if create is not None:
+            self.hello['create'] = create
+        self.pin = -1  # 실제로 사용한 핀 번호 (방을 만들었으면 서버가 정해준 것)
+        self.session = None  # 서버가 정해준 세션 토큰. 연결이 끊기면 이 토큰으로 이어서 접속함
+        self.connected = False  # 마지막 연결에서 인증을 마쳤는지 여부
+        self.decompressor = None  # type: Optional[FrameDecompressor]  # 서버가 압축을 쓰기로 했으면 만듦
 
         self.thread = threading.Thread(target=self.run, args=(addr, pin), daemon=True)
         self.thread.start()
@@ -38,101 +67,240 @@ class NetworkClient(IClientRole):
     def setDisconnectedCallback(self, fn):
         self.disconnectedCallback = fn
 
+    # 연결이 끊기면 같은 세션으로 다시 접속해서, 놓친 변경을 받고 확인받지 못한 action 들을 다시 보냄
     def run(self, addr, pin):
-        try:
-            port = pin // 10000
-            pin %= 10000
-            if port == 0:
-                port = DEFAULT_PORT
-
-            sock = socket.socket()
-            sock.connect((addr, port))
-            sock.sendall(MAGIC_STRING)
-
-            nonce = b''
-            while len(nonce) < 16:
-                buf = sock.recv(4096)
-                if len(buf) == 0:
-                    self.disconnectedCallback('알 수 없는 연결 오류가 발생했습니다')
+        port = pin // 10000
+        pin %= 10000
+        if port == 0:
+            port = DEFAULT_PORT
+
+        attempts = 0
+        while True:
+            try:
+                reason = self.connect(addr, port, pin)
+                if reason is not None:
+                    self.disconnectedCallback(reason)
                     return
-                nonce += buf
-
-            auth = hashlib.sha224(pin.to_bytes(2, byteorder='little', signed=False) + nonce).digest()
-            sock.sendall(auth)
-
-            recvBuf = b''
-            while len(recvBuf) < 4:
-                buf = sock.recv(4096)
-                if len(buf) == 0:
-                    self.disconnectedCallback('핀 번호가 올바르지 않습니다')
-                    return
-                recvBuf += buf
+            except OSError as e:
+                reason = e.strerror or '알 수 없는 연결 오류가 발생했습니다'
+            except ValueError:
+                self.disconnectedCallback('서버가 잘못된 데이터를 보냈습니다')
+                return
+
+            with self.lock:
+                self.socket = None
+            if self.connected:
+                attempts = 0  # 방금 끊긴 연결은 접속에 성공했었으므로 처음부터 다시 셈
+            if self.session is None or attempts >= RECONNECT_ATTEMPTS:
+                self.disconnectedCallback(reason)
+                return
+            time.sleep(RECONNECT_DELAY * 2 ** attempts)
+            attempts += 1
+            pin = self.pin
+
+    # 서버에 접속해서 연결이 끊길 때까지 프레임을 받음
+    # 다시 접속해도 소용없는 이유 (핀 번호가 틀림, 서버가 거절함 등) 로 끝나면 그 메시지를 리턴하고,
+    # 연결이 끊기면 OSError 를, 잘못된 데이터를 받으면 ValueError 를 발생시킴
+    def connect(self, addr, port, pin):
+        self.connected = False
+        sock = socket.create_connection((addr, port), CONNECT_TIMEOUT)
+        try:
+            sock.settimeout(None)
+            return self.receive(sock, pin)
+        finally:
+            sock.close()
+
+    def receive(self, sock, pin):
+        hello = dict(self.hello)
+        if self.session is not None:
+            with self.lock:
+                hello['resume'] = {'node': self.nodeId, 'session': self.session, 'version': self.version}
+        hello = json.dumps(hello).encode('utf-8')
+        sock.sendall(MAGIC_STRING + HELLO_HEADER.pack(len(hello)) + hello)
+
+        # 받은 데이터는 복사하지 않고 recvBuf 안에서 바로 읽음
+        recvBuf = RecvBuffer()
+        self.recvAtLeast(sock, recvBuf, 16 + HELLO_HEADER.size)
+        nonce = bytes(recvBuf.view()[:16])
+        helloLen = HELLO_HEADER.unpack_from(recvBuf.buf, recvBuf.start + 16)[0]
+        recvBuf.consume(16 + HELLO_HEADER.size)
+        if helloLen > MAX_HELLO_SIZE:
+            raise ValueError('Invalid hello')
+        self.recvAtLeast(sock, recvBuf, helloLen)
+        reply = json.loads(bytes(recvBuf.view()[:helloLen]).decode('utf-8'))
+        recvBuf.consume(helloLen)
+        if not isinstance(reply, dict) or not isinstance(reply.get('pin', pin), int):
+            raise ValueError('Invalid hello')
+        if 'error' in reply:
+            return f"서버가 연결을 거절했습니다 ({reply['error']})"
+        pin = reply.get('pin', pin)
+        self.pin = pin
+        if reply.get('compression') is not None:
+            self.decompressor = FrameDecompressor(reply['compression'], reply.get('stream', False))
+        else:
+            self.decompressor = None
 
-            self.nodeId = struct.unpack('!L', recvBuf[:4])[0]
-            recvBuf = recvBuf[4:]
+        auth = hashlib.sha224(pin.to_bytes(2, byteorder='little', signed=False) + nonce).digest()
+        sock.sendall(auth)
 
+        # 서버는 핀 번호가 틀리면 nodeId 를 보내지 않고 연결을 끊음
+        # 이어서 접속할 때는 이미 맞았던 핀 번호를 보내므로, 이 때 끊긴 것은 다시 접속해볼 연결 문제로 봄
+        try:
+            self.recvAtLeast(sock, recvBuf, 4)
+        except ConnectionError:
+            if self.session is not None:
+                raise
+            return '핀 번호가 올바르지 않습니다'
+
+        nodeId = struct.unpack_from('!L', recvBuf.buf, recvBuf.start)[0]
+        recvBuf.consume(4)
+        with self.lock:
+            if nodeId != self.nodeId:
+                # 이어서 접속하지 못했으면 확인받지 못한 action 들은 다른 클라이언트의 것이 되므로 버림
+                self.pendingActions = dict()
+            self.nodeId = nodeId
+        self.session = reply.get('session')
+        # 방은 이미 만들어졌으므로 다시 접속할 때는 만들지 않음 (그 사이에 방이 닫혔으면 거절됨)
+        self.hello.pop('create', None)
+        self.connected = True
+
+        headerSize = FRAME_HEADER.size
+        while True:
+            self.recvAtLeast(sock, recvBuf, headerSize)
+
+            # 시계가 완벽히 동기화되지는 않겠지만, 적어도 게임이 끝난 후에 뜨는 '걸린 시간'은 정확함
+            currTime = time.monotonic()
+            kind, base, version, startTime, endTime, ackCount, msgLen = \
+                FRAME_HEADER.unpack_from(recvBuf.buf, recvBuf.start)
+            if startTime >= 0:
+                startTime = currTime - startTime
+            if endTime >= 0:
+                endTime = currTime - endTime
+
+            # 프레임 전체가 들어갈 공간을 미리 확보해서 큰 게임판도 한번에 받음
+            frameSize = headerSize + ackCount * FRAME_ACK.size + msgLen
+            self.recvAtLeast(sock, recvBuf, frameSize)
+
+            frame = recvBuf.view()
+            acks = list(FRAME_ACK.iter_unpack(frame[headerSize:frameSize - msgLen]))
+            data = frame[frameSize - msgLen:frameSize]
+            if kind & FRAME_COMPRESSED:
+                if self.decompressor is None:
+                    raise ValueError('Unexpected compressed frame')
+                if kind & FRAME_RESET:
+                    self.decompressor.reset()
+                kind &= ~(FRAME_COMPRESSED | FRAME_RESET)
+                data = self.decompressor.decompress(data)
+            elif self.decompressor is not None:
+                self.decompressor.record(msgLen)
+            self.updateBoard(kind, base, version, startTime, endTime, acks, data)
+            recvBuf.consume(frameSize)
+
+            if self.socket is None:
+                self.resubmit(sock)
+
+    # 버퍼에 n 바이트 이상 모일 때까지 받음. 연결이 끊기면 ConnectionError 를 발생시킴
+    @staticmethod
+    def recvAtLeast(sock, recvBuf: RecvBuffer, n: int):
+        while len(recvBuf) < n:
+            if recvBuf.recvInto(sock, n - len(recvBuf)) == 0:
+                raise ConnectionError('Connection closed')
+
+    # 접속한 뒤 첫 프레임을 받으면 확인받지 못한 action 들을 (다시) 보내고 action 을 보내기 시작함
+    # 첫 프레임에 새 게임 표시가 있으면 이전 게임의 action 들은 그 때 지워지므로 새 게임에 보내지 않음
+    # 서버는 이미 처리한 seqId 는 확인만 해주므로 같은 action 이 두 번 적용되지 않음
+    def resubmit(self, sock):
+        with self.lock:
+            data = b''.join(encodeAction(seqId, action) for seqId, action in self.pendingActions.items())
+            if len(data) > 0:
+                sock.sendall(data)
             self.socket = sock
 
-            while True:
-                while len(recvBuf) < 28:
-                    buf = sock.recv(4096)
-                    if len(buf) == 0:
-                        self.disconnectedCallback('알 수 없는 연결 오류가 발생했습니다')
-                        return
-                    recvBuf += buf
-
-                # 시계가 완벽히 동기화되지는 않겠지만, 적어도 게임이 끝난 후에 뜨는 '걸린 시간'은 정확함
-                currTime = time.monotonic()
-                nodeId, seqId, startTime, endTime, msgLen = struct.unpack('!2L2dL', recvBuf[:28])
-                if startTime >= 0:
-                    startTime = currTime - startTime
-                if endTime >= 0:
-                    endTime = currTime - endTime
-
-                if len(recvBuf) - 28 < msgLen:
-                    buf = sock.recv(4096)
-                    if len(buf) == 0:
-                        self.disconnectedCallback('알 수 없는 연결 오류가 발생했습니다')
-                        return
-                    recvBuf += buf
-
-                self.updateBoard(nodeId, seqId, startTime, endTime, recvBuf[28:28+msgLen])
-                recvBuf = recvBuf[28+msgLen:]
-        except ConnectionError as e:
-            self.disconnectedCallback(e.strerror)
-
-    def updateBoard(self, nodeId, seqId, startTime, endTime, data):
+    def updateBoard(self, kind, base, version, startTime, endTime, acks, data):
         with self.lock:
             self.startTime = startTime
             self.endTime = endTime
-            if seqId == 0:
-                self.pendingActions = dict()
-            elif nodeId == self.nodeId:
-                if seqId in self.pendingActions:
-                    del self.pendingActions[seqId]
+            for nodeId, seqId in acks:
+                if nodeId == 0 and seqId == 0:
+                    self.pendingActions = dict()
+                elif nodeId == self.nodeId:
+                    if seqId in self.pendingActions:
+                        del self.pendingActions[seqId]
 
             w = self.board.width()
             h = self.board.height()
-            self.board.deserializeGame(data)
-
-            for action in self.pendingActions.values():
-                self.board.doAction(action)
+            if kind == FrameKind.DELTA:
+                try:
+                    if base > self.version:
+                        raise ValueError('Missed some changes')
+                    changes = self.confirmed.deserializeChanges(data)
+                except ValueError:
+                    # 게임판이 서버와 어긋났으므로 전체를 다시 받음
+                    self.sendAction(0, self.action.resync())
+                    return
+                self.version = version
+                self.predict(changes)
+            else:
+                self.confirmed.deserializeGame(data)
+                self.version = version
+                self.board = self.confirmed.copy()
+                self.predicted = self.predictActions(self.pendingActions.values())
 
         if w != self.board.width() or h != self.board.height():
             self.rebuildCallback()
         else:
             self.refreshCallback()
 
-    def performAction(self, action: dict):
+    # confirmed 에서 changes 에 있는 칸들이 바뀌었을 때 board 를 다시 맞춤
+    # 바뀐 칸들과 예측으로 바뀌었던 칸들만 confirmed 에서 복사한 뒤, 확인받지 못한 액션들을 다시 적용함
+    # self.lock 을 잡은 상태에서 불러야 함
+    def predict(self, changes: ChangeSet):
+        restore = ChangeSet()
+        restore.merge(changes)
+        restore.merge(self.predicted)
+        if restore.full:
+            self.board = self.confirmed.copy()
+        else:
+            for start, end in restore.getRanges():
+                self.board.setCellStates(start, self.confirmed.getCellStates(start, end))
+        self.predicted = self.predictActions(self.pendingActions.values())
+
+    # 확인받지 못한 action 들을 board 에 적용하고 바뀐 칸들을 리턴함
+    # 첫 클릭 때 지뢰를 배치하는 게임판 (GenerationMode.SAFE, ZERO) 에 아직 지뢰가 없으면 칸을 여는 action 은 예측하지 않음
+    # 클라이언트가 지뢰를 배치하면 서버와 배치가 달라서, 서버가 보낸 게임판을 받기 전까지 잘못된 칸들이 보이기 때문
+    # self.lock 을 잡은 상태에서 불러야 함
+    def predictActions(self, actions):
+        result = ChangeSet()
+        for action in actions:
+            if self.board.pendingMines > 0 and action[0] != ActionType.CYCLE_CELL_IMAGE:
+                continue
+            result.merge(self.board.doAction(action))
+        return result
+
+    # 서버가 압축을 쓰기로 했으면 지금까지의 압축 통계를 dict 로 리턴함
+    def getCompressionStats(self):
+        if self.decompressor is None:
+            return None
+        return self.decompressor.stats.asDict()
+
+    # 다시 접속하는 중이면 보내지 않음 (확인받지 못한 action 은 다시 접속한 뒤 resubmit 에서 보냄)
+    def sendAction(self, seqId: int, action):
+        sock = self.socket
+        if sock is None:
+            return
+        try:
+            sock.sendall(encodeAction(seqId, action))
+        except OSError:
+            pass  # 받는 스레드가 연결이 끊긴 것을 알아채고 다시 접속함
+
+    def performAction(self, action):
         with self.lock:
             seqId = self.seqId
             self.seqId += 1
             self.pendingActions[seqId] = action
+            self.predicted.merge(self.predictActions([action]))
 
-        msg = json.dumps(action).encode('utf-8')
-        self.socket.sendall(struct.pack('!2L', seqId, len(msg)) + msg)
-
-        self.board.doAction(action)
+        self.sendAction(seqId, action)
         self.refreshCallback()
 
     def cycleCellImage(self, x: int, y: int):
@@ -172,6 +340,10 @@ class NetworkClient(IClientRole):
                 return time.monotonic() - self.startTime
         return 0
 
+    def takeChanges(self) -> ChangeSet:
+        with self.lock:
+            return self.board.popChanges()
+
     def height(self) -> int:
         with self.lock:
             return self.board.height()
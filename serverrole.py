@@ -1,9 +1,11 @@
 from abc import ABCMeta, abstractmethod
 
+from constants import GenerationMode
+
 
 class IServerRole(metaclass=ABCMeta):
     @abstractmethod
-    def newGame(self, width: int, height: int, mines: int):
+    def newGame(self, width: int, height: int, mines: int, mode: GenerationMode = GenerationMode.RANDOM):
         pass
 
     @abstractmethod
@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import time
+
+from collections import deque
+from typing import Optional
+
+from constants import GenerationMode, DEFAULT_PORT
+from dedicatedserver import DedicatedServer, DEFAULT_MAX_ROOMS, addServerArguments, raiseFileLimit, runServer
+from integratedserver import ClientState, handleConnection
+from metrics import LOOP_PROBE_INTERVAL
+
+
+# 프론트엔드와 워커가 주고받는 제어 메시지 (JSON) 의 최대 크기
+MAX_CONTROL_MESSAGE = 65536
+
+# 인증 뒤에 이미 받아둔 데이터가 이보다 많으면 워커에게 넘기지 않고 연결을 끊음
+MAX_LEFTOVER = 16384
+
+# 워커가 부하 통계를 프론트엔드에게 보내는 주기 (초)
+STATS_INTERVAL = 1.0
+
+# 소켓을 다른 프로세스에 넘기려면 socket.send_fds 가 필요함 (Python 3.9 이상의 유닉스)
+HAS_SEND_FDS = hasattr(socket, 'send_fds')
+
+
+# 프론트엔드가 기억하는, 워커 프로세스에 있는 방 하나
+class RemoteRoom:
+    def __init__(self, name: str, worker, pin: int, persistent: bool):
+        self.name = name
+        self.worker = worker  # type: WorkerHandle
+        self.pin = pin
+        self.persistent = persistent
+        self.config = None  # 워커에게 만들어달라고 보낸 설정. 워커가 죽으면 이 설정으로 다시 만듦
+        # 워커가 첫 게임판을 만드는 동안 넘겨받은 연결은 워커가 붙잡아두므로, 만들어달라고 보내면 바로 set 함
+        self.created = asyncio.Event()
+
+    def detach(self):
+        pass
+
+
+# 프론트엔드가 들고 있는 워커 프로세스 하나
+class WorkerHandle:
+    # probeInterval 은 워커의 ServerMetrics 에 넘겨줄 이벤트 루프를 재는 주기
+    def __init__(self, index: int, probeInterval: float):
+        self.index = index
+        self.control, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # 프론트엔드에는 이벤트 루프와 스레드들이 돌고 있으므로 fork 하지 않고 새 인터프리터로 시작함
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(target=runWorker, args=(index, child, probeInterval), daemon=True)
+        self.process.start()
+        child.close()
+        self.control.setblocking(False)
+        self.rooms = 0  # 이 워커에 만든 방 수
+        self.handoffs = 0  # 이 워커에 넘긴 연결 수
+        self.stats = dict()  # 워커가 마지막으로 보낸 부하 통계
+        self.pending = deque()  # 소켓 버퍼가 가득 차서 아직 보내지 못한 (메시지, fd 리스트). fd 들은 보낼 때까지 열어둠
+
+    # 아직 보내지 못한 메시지들을 버리고 같이 보내려던 fd 들을 닫음
+    def dropPending(self):
+        for data, fds in self.pending:
+            for fd in fds:
+                os.close(fd)
+        self.pending.clear()
+
+    # 새 방을 어느 워커에 둘지 정할 때 사용하는 부하. 접속한 클라이언트 수를 먼저 보고, 같으면 방 수를 봄
+    def load(self):
+        return self.stats.get('nodes', 0), self.rooms
+
+    def asDict(self):
+        stats = {key: value for key, value in self.stats.items() if key != 'type'}
+        return dict(stats, worker=self.index, pid=self.process.pid, alive=self.process.is_alive(),
+                    assignedRooms=self.rooms, handoffs=self.handoffs, pendingControl=len(self.pending))
+
+
+# 프론트엔드에서 핸드셰이크까지만 처리하고, 인증을 마치면 연결을 방이 있는 워커에게 넘김
+class HandoffClient(ClientState):
+    def admit(self):
+        self.host.handoff(self)
+        return False
+
+
+# 여러 워커 프로세스에 방을 나눠서, 한 프로세스의 이벤트 루프에 모든 방이 몰리지 않도록 하는 서버
+# 프론트엔드(이 프로세스)는 연결을 받아 매직 문자열, hello, 핀 번호를 확인한 뒤 socket.send_fds 로 워커에게 넘기고,
+# 각 워커는 자신이 맡은 방들을 DedicatedServer 처럼 처리함
+# 방 이름과 핀 번호는 프론트엔드가 정해서 워커에게 알려줌
+# 워커가 죽으면 새 워커를 띄우고, 처음부터 열어둔 방은 같은 이름과 핀 번호로 다시 만듦
+class ShardedServer(DedicatedServer):
+    clientType = HandoffClient
+
+    def __init__(self, workers: int = None, port: int = DEFAULT_PORT, maxRooms: int = DEFAULT_MAX_ROOMS,
+                 allowCreate: bool = True):
+        super().__init__(port, maxRooms, allowCreate)
+        self.workerCount = workers or os.cpu_count() or 1
+        self.workers = []  # type: list[WorkerHandle]
+
+    # 워커 프로세스들을 시작하고 연결을 받기 시작함. 멈추면 워커들도 끝냄
+    async def serve(self, rooms=(), host: str = '0.0.0.0'):
+        self.loop = asyncio.get_running_loop()
+        self.workers = [self.startWorker(index) for index in range(self.workerCount)]
+        try:
+            await super().serve(rooms, host)
+        finally:
+            for worker in self.workers:
+                self.forgetWorker(worker)
+                worker.process.terminate()
+                worker.process.join()
+
+    # 워커 프로세스를 시작하고, 제어 메시지와 프로세스가 끝나는 것을 이벤트 루프에서 기다림
+    def startWorker(self, index: int) -> WorkerHandle:
+        worker = WorkerHandle(index, self.metrics.probeInterval)
+        self.loop.add_reader(worker.control, self.readControl, worker)
+        self.loop.add_reader(worker.process.sentinel, self.workerExited, worker)
+        return worker
+
+    # 워커를 더 이상 지켜보지 않고, 보내지 못한 메시지와 함께 넘기려던 연결들을 끊음
+    def forgetWorker(self, worker: WorkerHandle):
+        self.loop.remove_reader(worker.control)
+        self.loop.remove_writer(worker.control)
+        self.loop.remove_reader(worker.process.sentinel)
+        worker.control.close()
+        worker.dropPending()
+
+    # 워커 프로세스가 끝났으면 그 워커의 방들을 지우고 같은 번호로 새 워커를 띄움
+    # 그 워커에 있던 연결과 세션은 없어지므로 클라이언트는 다시 접속해서 새 nodeId 와 스냅샷을 받음
+    def workerExited(self, worker: WorkerHandle):
+        self.forgetWorker(worker)
+        worker.process.join()
+        print(f'Worker {worker.index} exited with code {worker.process.exitcode}; restarting it')
+        lost = [room for room in self.rooms.values() if room.worker is worker]
+        for room in lost:
+            del self.rooms[room.name]
+
+        self.workers[worker.index] = self.startWorker(worker.index)
+        for old in lost:
+            if old.persistent and old.config is not None:
+                room = self.addRoom(old.name, True)
+                room.pin = old.pin
+                self.startTask(self.resetRoom(room, old.config))
+
+    # 부하가 가장 적은 워커에 방을 만들고 핀 번호를 정함 (게임판은 resetRoom 에서 워커가 만듦)
+    def addRoom(self, name: str, persistent: bool) -> RemoteRoom:
+        worker = min(self.workers, key=WorkerHandle.load)
+        room = RemoteRoom(name, worker, secrets.randbelow(9999) + 1, persistent)
+        worker.rooms += 1
+        self.rooms[name] = room
+        return room
+
+    async def resetRoom(self, room: RemoteRoom, config):
+        room.config = config
+        self.sendControl(room.worker, {'type': 'create', 'room': room.name, 'pin': room.pin,
+                                       'config': list(config), 'persistent': room.persistent})
+        room.created.set()
+
+    # 인증을 마친 연결을 방이 있는 워커에게 넘김. 이 프로세스의 소켓은 handleConnection 이 닫음
+    # 인증 응답을 받기 전에 nonce 와 hello 는 모두 보냈으므로 큐에 남은 데이터는 없음
+    def handoff(self, node: HandoffClient):
+        room = node.server  # type: RemoteRoom
+        leftover = bytes(node.recvBuf.view())
+        if len(leftover) > MAX_LEFTOVER:
+            return
+        self.sendControl(room.worker, {'type': 'adopt', 'room': room.name, 'magic': node.magic.decode('latin-1'),
+                                       'settings': node.settings, 'leftover': leftover.hex(),
+                                       'session': node.session, 'resume': node.resume}, [node.sock.fileno()])
+        room.worker.handoffs += 1
+
+    # 워커에게 제어 메시지를 보냄. 한번에 많은 연결을 넘겨서 소켓 버퍼가 가득 차면 순서대로 쌓아두고
+    # 보낼 수 있게 되었을 때 sendPending 에서 보냄. fds 는 복사해서 들고 있으므로 부른 쪽은 자기 소켓을 닫아도 됨
+    # 워커가 죽어서 보낼 수 없으면 버림 (넘기려던 연결은 끊어짐)
+    def sendControl(self, worker: WorkerHandle, msg, fds=()):
+        data = json.dumps(msg).encode('utf-8')
+        if not worker.pending:
+            try:
+                socket.send_fds(worker.control, [data], list(fds))
+                return
+            except BlockingIOError:
+                self.loop.add_writer(worker.control, self.sendPending, worker)
+            except OSError:
+                print(f'Worker {worker.index} is gone; dropped {msg["type"]} for room {msg["room"]!r}')
+                return
+        worker.pending.append((data, [os.dup(fd) for fd in fds]))
+
+    def sendPending(self, worker: WorkerHandle):
+        while worker.pending:
+            data, fds = worker.pending[0]
+            try:
+                socket.send_fds(worker.control, [data], fds)
+            except BlockingIOError:
+                return
+            except OSError:
+                # 워커가 죽었으면 workerExited 가 남은 메시지들을 정리함
+                break
+            worker.pending.popleft()
+            for fd in fds:
+                os.close(fd)
+        self.loop.remove_writer(worker.control)
+
+    def readControl(self, worker: WorkerHandle):
+        while True:
+            try:
+                data = worker.control.recv(MAX_CONTROL_MESSAGE)
+            except BlockingIOError:
+                return
+            msg = json.loads(data)
+            if msg['type'] == 'stats':
+                worker.stats = msg
+            elif msg['type'] == 'closed':
+                room = self.rooms.get(msg['room'])
+                if room is not None and room.worker is worker:
+                    del self.rooms[msg['room']]
+                    worker.rooms -= 1
+
+    # 워커마다 마지막으로 받은 부하 통계를 리스트로 리턴함
+    def getWorkerStats(self):
+        return [worker.asDict() for worker in self.workers]
+
+    # 프론트엔드의 통계 (핸드셰이크만 처리하므로 연결 수와 주고받은 바이트 수 정도) 와 워커들의 통계
+    # 워커의 metrics 는 워커가 마지막으로 보낸 한 주기 (STATS_INTERVAL) 동안의 기록임
+    def getStats(self):
+        return {
+            'time': time.time(),
+            'rooms': len(self.rooms),
+            'nodes': sum(worker.stats.get('nodes', 0) for worker in self.workers),
+            'metrics': self.metrics.asDict(),
+            'workers': self.getWorkerStats(),
+        }
+
+
+# 워커 프로세스에서 실행되는 서버
+# 소켓을 직접 받지 않고, 프론트엔드가 control 로 보내주는 방과 연결만 처리함
+class WorkerServer(DedicatedServer):
+    def __init__(self, index: int, control: socket.socket, probeInterval: float = LOOP_PROBE_INTERVAL):
+        # 워커가 여러 개이므로 추측 없이 풀 수 있는 게임판은 워커마다 한 프로세스로 만듦
+        super().__init__(generatorWorkers=1)
+        self.metrics.probeInterval = probeInterval
+        self.index = index
+        self.control = control
+        self.parentPid = os.getppid()
+        self.stopped = None  # type: Optional[asyncio.Future]
+        self.waiting = dict()  # 게임판을 만드는 중인 방 이름 -> 그 동안 넘겨받은 (메시지, 소켓) 리스트
+        self.lastCpu = (time.monotonic(), time.process_time())
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = self.loop.create_future()
+        self.control.setblocking(False)
+        self.loop.add_reader(self.control, self.readControl)
+        self.loop.call_later(STATS_INTERVAL, self.sendStats)
+        await self.stopped
+
+    def readControl(self):
+        while True:
+            try:
+                data, fds, flags, addr = socket.recv_fds(self.control, MAX_CONTROL_MESSAGE, 1)
+            except BlockingIOError:
+                return
+            msg = json.loads(data)
+            if msg['type'] == 'create':
+                width, height, mines, mode = msg['config']
+                room = self.addRoom(msg['room'], msg['persistent'])
+                room.pin = msg['pin']
+                self.waiting[room.name] = []
+                self.startTask(self.createRoom(room, (width, height, mines, GenerationMode(mode))))
+            elif msg['type'] == 'adopt':
+                self.adopt(msg, socket.socket(fileno=fds[0]))
+
+    # 방의 첫 게임판을 만든 뒤, 그 동안 넘겨받아 기다리던 연결들을 방에 등록함
+    async def createRoom(self, room, config):
+        try:
+            await self.resetRoom(room, config)
+        finally:
+            for msg, sock in self.waiting.pop(room.name, ()):
+                self.adopt(msg, sock)
+
+    # 프론트엔드가 넘겨준 연결을 방에 등록함. 그 사이에 방이 닫혔으면 연결을 끊음
+    # 방의 첫 게임판이 아직 없으면 빈 게임판을 보내지 않도록 게임판이 만들어질 때까지 기다림
+    def adopt(self, msg, sock: socket.socket):
+        if msg['room'] in self.waiting:
+            self.waiting[msg['room']].append((msg, sock))
+            return
+        room = self.rooms.get(msg['room'])
+        if room is None:
+            sock.close()
+            return
+        sock.setblocking(False)
+        node = ClientState(self, sock)
+        node.adopt(room, msg['magic'].encode('latin-1'), msg['settings'], bytes.fromhex(msg['leftover']),
+                   msg['session'], msg['resume'])
+        self.startTask(handleConnection(node))
+
+    def removeRoom(self, name: str):
+        super().removeRoom(name)
+        for msg, sock in self.waiting.pop(name, ()):
+            sock.close()
+        self.sendControl({'type': 'closed', 'room': name})
+
+    # 부하 통계를 프론트엔드에게 보내고, 프론트엔드가 없어졌으면 워커를 끝냄
+    def sendStats(self):
+        now, cpu = time.monotonic(), time.process_time()
+        lastNow, lastCpu = self.lastCpu
+        self.lastCpu = (now, cpu)
+        self.sendControl({
+            'type': 'stats',
+            'rooms': len(self.rooms),
+            'nodes': sum(len(room.nodes) for room in self.rooms.values()),
+            'cpu': (cpu - lastCpu) / (now - lastNow),  # 지난 주기 동안 사용한 코어 수
+            'queued': sum(len(node.sendQueue) for room in self.rooms.values() for node in room.nodes.values()),
+            'metrics': self.metrics.asDict(),
+        })
+        self.metrics.reset()
+        if os.getppid() != self.parentPid:
+            self.stopped.set_result(None)
+            return
+        self.loop.call_later(STATS_INTERVAL, self.sendStats)
+
+    def sendControl(self, msg):
+        try:
+            self.control.send(json.dumps(msg).encode('utf-8'))
+        except (BlockingIOError, ConnectionError):
+            pass
+
+
+# 워커 프로세스의 시작점. Ctrl+C 는 프론트엔드만 처리하고, 워커는 프론트엔드가 끝날 때 같이 끝남
+def runWorker(index: int, control: socket.socket, probeInterval: float):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raiseFileLimit()
+    asyncio.run(WorkerServer(index, control, probeInterval).run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='방들을 여러 워커 프로세스에 나눠서 처리하는 협동 서버')
+    addServerArguments(parser)
+    parser.add_argument('--workers', type=int, default=None, help='워커 프로세스 수 (기본값: CPU 개수)')
+    args = parser.parse_args()
+    if not HAS_SEND_FDS:
+        parser.error('이 플랫폼에서는 socket.send_fds 를 사용할 수 없습니다')
+
+    raiseFileLimit()
+    server = ShardedServer(args.workers, args.port, args.max_rooms, not args.no_create)
+    asyncio.run(runServer(server, args))
+
+
+if __name__ == '__main__':
+    main()
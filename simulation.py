@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import concurrent.futures
+
+from constants import GenerationMode
+from gameaction import GameAction
+from gameboard import GameBoard, orPlanes
+from generator import NoGuessGenerator
+from metrics import LatencyHistogram
+from solver import Solver
+
+
+# Qt 없이 GameBoard 로 게임을 여러 판 자동으로 진행해보는 시뮬레이션
+# 처리량(초당 게임 수, 초당 동작 수)과 동작별 걸린 시간 분포를 재서 용량 계획과 성능 저하 확인에 사용함
+# python simulation.py --games 100000 --width 30 --height 16 --density 0.2 --player solver 처럼 실행함
+
+
+PLAYERS = ('random', 'solver')
+
+# 랜덤으로 칸을 고를 때, 이만큼 실패하면 빈 칸을 순서대로 찾음
+RANDOM_PICK_TRIES = 16
+
+# 한 번에 프로세스 하나에 맡길 최대 게임 수
+MAX_CHUNK = 1000
+
+
+# 시뮬레이션 결과. 여러 프로세스의 결과를 merge() 로 합칠 수 있음
+class SimulationResult:
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.actions = 0
+        self.timings = dict()  # 동작 이름 -> LatencyHistogram
+
+    def record(self, name: str, seconds: float):
+        histogram = self.timings.get(name)
+        if histogram is None:
+            histogram = self.timings[name] = LatencyHistogram()
+        histogram.record(seconds)
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins += other.wins
+        self.actions += other.actions
+        for name, histogram in other.timings.items():
+            self.timings.setdefault(name, LatencyHistogram()).merge(histogram)
+
+
+# 열리지 않은 칸 중 skip 이 0 인 칸을 하나 랜덤으로 골라 인덱스를 리턴함 (없으면 -1)
+# skip 은 칸마다 0 이 아니면 고르지 않는 bytes 같은 객체
+def pickCell(rng: random.Random, skip) -> int:
+    n = len(skip)
+    for _ in range(RANDOM_PICK_TRIES):
+        i = rng.randrange(n)
+        if not skip[i]:
+            return i
+
+    # 남은 칸이 적으면 랜덤한 위치부터 차례로 찾음
+    start = rng.randrange(n)
+    i = skip.find(0, start)
+    if i < 0:
+        i = skip.find(0, 0, start)
+    return i
+
+
+# 게임판 하나를 끝날 때까지 진행함. 이기면 True 를 리턴
+# random: 열리지 않은 칸을 아무거나 엶
+# solver: 솔버가 안전하다고 한 칸을 열고, 안전한 칸이 없을 때만 지뢰인지 모르는 칸을 아무거나 엶
+def playGame(board: GameBoard, player: str, rng: random.Random, result: SimulationResult) -> bool:
+    w = board.width()
+    solver = Solver(board) if player == 'solver' else None
+    action = GameAction()
+
+    def open(i):
+        start = time.perf_counter()
+        board.doAction(action.openCell(i % w, i // w))
+        result.record('openCell', time.perf_counter() - start)
+        result.actions += 1
+
+    while not board.checkFinished():
+        if solver is None:
+            open(pickCell(rng, board.opened))
+        else:
+            start = time.perf_counter()
+            safe, _ = solver.solve(board.popChanges())
+            result.record('solve', time.perf_counter() - start)
+
+            if safe:
+                for x, y in safe:
+                    open(y * w + x)
+            else:
+                # 지뢰라고 알아낸 칸(MINE)과 열린 칸을 제외하고 고름
+                open(pickCell(rng, orPlanes(solver.state, board.opened)))
+
+        if board.blownCount:
+            return False
+    return True
+
+
+# 프로세스 풀에서 실행되는 함수. first 번째 게임부터 count 판을 진행하고 결과를 리턴함
+# 게임마다 (seed, 게임 번호) 로 게임판과 플레이어의 난수를 정하므로 같은 설정이면 항상 같은 게임이 나옴
+# (같은 난수를 쓰면 플레이어가 처음 고르는 칸이 항상 지뢰가 되므로 플레이어의 난수는 따로 만듦)
+def runGames(w: int, h: int, mines: int, mode: GenerationMode, player: str, seed, first: int, count: int):
+    result = SimulationResult()
+    generator = NoGuessGenerator(workers=1) if mode == GenerationMode.NO_GUESS else None
+
+    for k in range(first, first + count):
+        rng = random.Random(f'{seed}/{k}/player')
+        start = time.perf_counter()
+        if generator is not None:
+            board = generator.generate(w, h, mines, seed=f'{seed}/{k}')
+        else:
+            board = GameBoard()
+            board.newGame(w, h, mines, mode, seed=f'{seed}/{k}')
+        result.record('newGame', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        if playGame(board, player, rng, result):
+            result.wins += 1
+        result.record('game', time.perf_counter() - start)
+        result.games += 1
+    return result
+
+
+# games 판을 workers 개의 프로세스에 나누어 진행하고, 합친 결과와 걸린 시간(초)을 리턴함
+def simulate(games: int, w: int, h: int, mines: int, mode: GenerationMode = GenerationMode.RANDOM,
+             player: str = 'random', workers: int = None, seed=0):
+    workers = workers or os.cpu_count() or 1
+    result = SimulationResult()
+    start = time.perf_counter()
+
+    if workers == 1:
+        result.merge(runGames(w, h, mines, mode, player, seed, 0, games))
+        return result, time.perf_counter() - start
+
+    # 진행 상황이 고르게 나뉘도록 프로세스 수보다 잘게 나눔
+    chunk = max(1, min(MAX_CHUNK, games // (workers * 4)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(runGames, w, h, mines, mode, player, seed, first, min(chunk, games - first))
+                   for first in range(0, games, chunk)]
+        for future in concurrent.futures.as_completed(futures):
+            result.merge(future.result())
+    return result, time.perf_counter() - start
+
+
+# 결과를 JSON 으로 저장하기 좋은 dict 로 바꿈
+def makeReport(result: SimulationResult, seconds: float):
+    return {
+        'games': result.games,
+        'wins': result.wins,
+        'actions': result.actions,
+        'seconds': seconds,
+        'gamesPerSecond': result.games / seconds if seconds else 0.0,
+        'actionsPerSecond': result.actions / seconds if seconds else 0.0,
+        'winRate': result.wins / result.games if result.games else 0.0,
+        'timings': {name: histogram.summary() for name, histogram in sorted(result.timings.items())},
+    }
+
+
+def printReport(report):
+    print(f'games      {report["games"]:>12} ({report["gamesPerSecond"]:.1f}/s)')
+    print(f'actions    {report["actions"]:>12} ({report["actionsPerSecond"]:.1f}/s)')
+    print(f'win rate   {report["winRate"] * 100:>11.2f}%')
+    print(f'elapsed    {report["seconds"]:>11.2f}s')
+    print()
+    print(f'{"operation":<10} {"count":>12} {"mean us":>10} {"p50 us":>10} {"p90 us":>10} {"p99 us":>10} {"max us":>10}')
+    for name, t in report['timings'].items():
+        print(f'{name:<10} {t["count"]:>12} {t["mean"] * 1e6:>10.1f} {t["p50"] * 1e6:>10.1f} '
+              f'{t["p90"] * 1e6:>10.1f} {t["p99"] * 1e6:>10.1f} {t["max"] * 1e6:>10.1f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GameBoard 를 Qt 없이 자동으로 진행하는 시뮬레이션')
+    parser.add_argument('--games', type=int, default=1000, help='진행할 게임 수')
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=16)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--mines', type=int, help='지뢰 수')
+    group.add_argument('--density', type=float, default=0.2, help='칸 수에 대한 지뢰 비율')
+    parser.add_argument('--mode', choices=[m.name.lower() for m in GenerationMode], default='zero',
+                        help='게임판 생성 방식')
+    parser.add_argument('--player', choices=PLAYERS, default='solver')
+    parser.add_argument('--workers', type=int, default=None, help='프로세스 수 (기본값: CPU 개수)')
+    parser.add_argument('--seed', default='0')
+    parser.add_argument('--json', action='store_true', help='결과를 JSON 으로 출력')
+    args = parser.parse_args(argv)
+
+    mines = args.mines if args.mines is not None else int(args.width * args.height * args.density)
+    mode = GenerationMode[args.mode.upper()]
+    result, seconds = simulate(args.games, args.width, args.height, mines, mode, args.player, args.workers, args.seed)
+
+    report = makeReport(result, seconds)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        printReport(report)
+
+
+if __name__ == '__main__':
+    main()
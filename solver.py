@@ -0,0 +1,346 @@
+import time
+
+from constants import ImageType
+from gameboard import GameBoard, NONZERO_RUN, orPlanes
+
+
+# 칸마다 솔버가 알아낸 상태
+UNKNOWN = 0
+SAFE = 1
+MINE = 2
+
+# 정확히 모든 경우를 세어보는 연결 요소의 최대 칸 수
+# (경우의 수가 2^n 까지 늘어나므로 너무 크게 잡으면 오래 걸림)
+MAX_ENUMERATION_CELLS = 24
+
+# 경우의 수를 셀 때 이만큼의 경우를 확인할 때마다 deadline 이 지났는지 봄
+DEADLINE_CHECK_NODES = 1024
+
+
+# 게임판에서 보이는 정보(열린 칸의 숫자, 깃발, 폭발한 지뢰)만으로
+# 확실히 안전한 칸과 확실히 지뢰인 칸을 찾아내는 솔버
+# 게임판이 바뀌면 solve(changes) 처럼 바뀐 칸을 넘겨주어서 그 주변만 다시 계산하게 할 수 있음
+# deadline (time.monotonic() 기준) 을 주면 그 시간이 지났을 때 solve 가 TimeoutError 를 발생시킴
+class Solver:
+    def __init__(self, board: GameBoard, trustFlags: bool = False, deadline: float = None):
+        self.board = board
+        self.trustFlags = trustFlags  # True 이면 깃발이 꽂힌 칸을 지뢰로 취급함
+        self.deadline = deadline
+        self.reset()
+
+    # 지금까지 알아낸 것을 모두 잊고 게임판 전체를 다시 살펴보게 함
+    def reset(self):
+        board = self.board
+        self.w = board.width()
+        self.h = board.height()
+        # 가장자리가 아닌 칸의 주변 3x3 칸까지의 인덱스 차이
+        self.offsets = tuple(dy * self.w + dx for dy in (-1, 0, 1) for dx in (-1, 0, 1))
+        self.state = bytearray(self.w * self.h)  # 칸마다 UNKNOWN, SAFE, MINE 중 하나
+        self.constraints = dict()  # 열린 칸 -> (모르는 이웃 칸들, 그 중 지뢰의 개수)
+        self.dirty = set()  # 다시 살펴봐야 하는 열린 칸들
+        self.safe = set()  # 아직 열리지 않았지만 안전하다고 알아낸 칸들
+        self.mines = set()  # 아직 열리지 않았지만 지뢰라고 알아낸 칸들
+
+        # 열린 칸과 이미지가 있는 칸만 살펴보면 되므로 구간 단위로 훑음
+        for r in NONZERO_RUN.finditer(board.opened):
+            for i in range(r.start(), r.end()):
+                self.state[i] = SAFE
+                if board.counts[i] > 0:
+                    self.dirty.add(i)
+        for r in NONZERO_RUN.finditer(board.images):
+            for i in range(r.start(), r.end()):
+                if self.isKnownMine(i):
+                    self.setState(i, MINE)
+                    self.dirty.discard(i)
+
+    # 게임판에서 changes(ChangeSet) 에 있는 칸들이 바뀌었음을 알려줌
+    def update(self, changes):
+        if changes.full or self.w != self.board.width() or self.h != self.board.height():
+            self.reset()
+            return
+
+        board = self.board
+        for i in changes:
+            if self.isKnownMine(i):
+                self.setState(i, MINE)
+            elif board.opened[i]:
+                self.setState(i, SAFE)
+                if board.counts[i]:
+                    self.dirty.add(i)
+            elif self.trustFlags and self.state[i] == MINE:
+                # 깃발을 뽑은 경우, 깃발만 보고 지뢰라고 판단했었을 수 있으므로 처음부터 다시 판단함
+                self.reset()
+                return
+            self.markNeighborsDirty(i)
+
+    # 확실히 안전한 칸들과 확실히 지뢰인 칸들을 찾아 ((x, y) 리스트, (x, y) 리스트) 로 리턴함
+    # 이미 열렸거나 폭발한 칸은 포함하지 않음
+    def solve(self, changes=None):
+        if changes is not None:
+            self.update(changes)
+
+        touched = set()
+        while True:
+            self.checkDeadline()
+            touched |= self.propagate()
+            if self.applySubsetRule(touched):
+                continue
+            if self.applyEnumeration(touched):
+                continue
+            if self.applyGlobalRule():
+                continue
+            break
+
+        safe = [(i % self.w, i // self.w) for i in sorted(self.safe)]
+        mines = [(i % self.w, i // self.w) for i in sorted(self.mines)]
+        return safe, mines
+
+    # ===========================================
+    # 여기부터 아래에 있는 함수들은 이 클래스 내부에서 사용하기 위해 만들어진 함수임
+    # ===========================================
+
+    def checkDeadline(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise TimeoutError('Solver deadline exceeded')
+
+    # 보이는 정보만으로 지뢰임을 알 수 있는 칸인지 확인
+    def isKnownMine(self, i: int):
+        image = self.board.images[i]
+        if image == ImageType.BLOWN_UP_MINE:
+            return True
+        return self.trustFlags and image == ImageType.FLAG and not self.board.opened[i]
+
+    # i 주변(3x3) 칸들의 인덱스 리스트를 리턴함
+    def neighbors(self, i: int):
+        w = self.w
+        x = i % w
+        if 0 < x < w - 1 and w <= i < len(self.state) - w:
+            return [i + d for d in self.offsets]
+
+        y = i // w
+        return [cy * w + cx
+                for cy in range(max(0, y - 1), min(self.h, y + 2))
+                for cx in range(max(0, x - 1), min(w, x + 2))]
+
+    # 칸의 상태를 바꾸고 safe, mines 집합을 갱신함
+    def setState(self, i: int, value: int):
+        self.state[i] = value
+        self.safe.discard(i)
+        self.mines.discard(i)
+        if not self.board.opened[i]:
+            if value == SAFE:
+                self.safe.add(i)
+            elif value == MINE:
+                self.mines.add(i)
+
+    # i 주변의 열린 칸들을 다시 살펴보게 함
+    # 주변에 지뢰가 없는 칸은 게임판이 주변을 항상 같이 열어주므로 제약조건이 될 일이 없어서 제외함
+    def markNeighborsDirty(self, i: int):
+        opened = self.board.opened
+        counts = self.board.counts
+        state = self.state
+        for j in self.neighbors(i):
+            if opened[j] and counts[j] and state[j] != MINE:
+                self.dirty.add(j)
+
+    # 칸의 상태를 정하고 주변 열린 칸들을 다시 살펴보게 함
+    # 원래 모르던 칸이었으면 True 를 리턴
+    def mark(self, i: int, value: int):
+        if self.state[i] != UNKNOWN:
+            return False
+        self.setState(i, value)
+        self.markNeighborsDirty(i)
+        return True
+
+    # dirty 인 열린 칸마다 제약조건을 다시 만들면서 한 칸짜리 규칙을 적용함
+    # 모르는 이웃이 전부 지뢰이거나 전부 안전한 경우를 찾음
+    # 살펴본 열린 칸들을 리턴함
+    def propagate(self):
+        board = self.board
+        touched = set()
+        while self.dirty:
+            c = self.dirty.pop()
+            touched.add(c)
+            if self.state[c] == MINE or not board.opened[c]:
+                self.constraints.pop(c, None)
+                continue
+
+            unknown = []
+            need = board.counts[c]
+            for j in self.neighbors(c):
+                if self.state[j] == MINE:
+                    need -= 1
+                elif self.state[j] == UNKNOWN and not board.opened[j]:
+                    unknown.append(j)
+
+            if not unknown:
+                self.constraints.pop(c, None)
+            elif need == 0:
+                self.constraints.pop(c, None)
+                for j in unknown:
+                    self.mark(j, SAFE)
+            elif need == len(unknown):
+                self.constraints.pop(c, None)
+                for j in unknown:
+                    self.mark(j, MINE)
+            else:
+                self.constraints[c] = (frozenset(unknown), need)
+        return touched
+
+    # 모르는 칸 -> 그 칸을 포함하는 제약조건(열린 칸)들
+    def buildCellIndex(self):
+        index = dict()
+        for c, (cells, _) in self.constraints.items():
+            for j in cells:
+                index.setdefault(j, []).append(c)
+        return index
+
+    # 제약조건 A 의 칸들이 제약조건 B 의 칸들에 모두 포함되면, B - A 의 지뢰 개수를 알 수 있음
+    # touched 에 있는 제약조건이 포함된 쌍만 확인함
+    # 새로 알아낸 칸이 있으면 True 를 리턴
+    def applySubsetRule(self, touched):
+        index = self.buildCellIndex()
+        found = False
+        for a in touched:
+            if a not in self.constraints:
+                continue
+            cellsA, needA = self.constraints[a]
+            others = set()
+            for j in cellsA:
+                others.update(index[j])
+            others.discard(a)
+
+            for b in others:
+                cellsB, needB = self.constraints[b]
+                if cellsA < cellsB:
+                    small, smallNeed, large, largeNeed = cellsA, needA, cellsB, needB
+                elif cellsB < cellsA:
+                    small, smallNeed, large, largeNeed = cellsB, needB, cellsA, needA
+                else:
+                    continue
+
+                rest = large - small
+                if largeNeed - smallNeed == 0:
+                    for j in rest:
+                        found |= self.mark(j, SAFE)
+                elif largeNeed - smallNeed == len(rest):
+                    for j in rest:
+                        found |= self.mark(j, MINE)
+        return found
+
+    # touched 에 있는 제약조건이 속한 연결 요소(모르는 칸을 공유하는 제약조건끼리 묶은 것)마다
+    # 가능한 지뢰 배치를 모두 세어보고, 모든 경우에 안전하거나 모든 경우에 지뢰인 칸을 찾음
+    # 새로 알아낸 칸이 있으면 True 를 리턴
+    def applyEnumeration(self, touched):
+        index = self.buildCellIndex()
+        visited = set()
+        found = False
+        for start in touched:
+            if start not in self.constraints or start in visited:
+                continue
+
+            # 연결 요소를 찾음
+            component = []
+            cells = []
+            cellSet = set()
+            stack = [start]
+            visited.add(start)
+            while stack:
+                c = stack.pop()
+                component.append(c)
+                for j in self.constraints[c][0]:
+                    if j not in cellSet:
+                        cellSet.add(j)
+                        cells.append(j)
+                    for other in index[j]:
+                        if other not in visited:
+                            visited.add(other)
+                            stack.append(other)
+
+            if len(cells) > MAX_ENUMERATION_CELLS:
+                continue
+
+            self.checkDeadline()
+            solutions, mineCounts = self.enumerateComponent(cells, [self.constraints[c] for c in component],
+                                                            self.deadline)
+            if solutions == 0:
+                continue
+            for j, count in zip(cells, mineCounts):
+                if count == 0:
+                    found |= self.mark(j, SAFE)
+                elif count == solutions:
+                    found |= self.mark(j, MINE)
+        return found
+
+    # 칸들에 지뢰를 놓는 모든 경우 중 제약조건을 모두 만족하는 경우의 수와,
+    # 각 칸이 지뢰인 경우의 수를 리턴함. deadline 이 지나면 TimeoutError 를 발생시킴
+    @staticmethod
+    def enumerateComponent(cells, constraints, deadline: float = None):
+        position = {j: k for k, j in enumerate(cells)}
+        cellConstraints = [[] for _ in cells]
+        need = []
+        left = []
+        for ci, (constraintCells, n) in enumerate(constraints):
+            need.append(n)
+            left.append(len(constraintCells))
+            for j in constraintCells:
+                cellConstraints[position[j]].append(ci)
+
+        assignment = [0] * len(cells)
+        mineCounts = [0] * len(cells)
+        solutions = 0
+        nodes = 0
+
+        def search(k):
+            nonlocal solutions, nodes
+            nodes += 1
+            if deadline is not None and nodes % DEADLINE_CHECK_NODES == 0 and time.monotonic() > deadline:
+                raise TimeoutError('Solver deadline exceeded')
+            if k == len(cells):
+                solutions += 1
+                for m in range(len(cells)):
+                    mineCounts[m] += assignment[m]
+                return
+
+            for value in (0, 1):
+                ok = True
+                for ci in cellConstraints[k]:
+                    rem = need[ci] - value
+                    if rem < 0 or rem > left[ci] - 1:
+                        ok = False
+                        break
+                if not ok:
+                    continue
+
+                for ci in cellConstraints[k]:
+                    need[ci] -= value
+                    left[ci] -= 1
+                assignment[k] = value
+                search(k + 1)
+                for ci in cellConstraints[k]:
+                    need[ci] += value
+                    left[ci] += 1
+            assignment[k] = 0
+
+        search(0)
+        return solutions, mineCounts
+
+    # 남은 지뢰 개수가 0 이거나, 모르는 칸의 개수와 같으면 모르는 칸 전체를 정할 수 있음
+    # 새로 알아낸 칸이 있으면 True 를 리턴
+    def applyGlobalRule(self):
+        board = self.board
+        if board.pendingMines:
+            return False
+
+        # 폭발한 지뢰도 MINE 이므로 전체 지뢰 개수에서 MINE 인 칸을 모두 빼면 됨
+        remaining = board.countMine() - self.state.count(MINE)
+        # 상태를 모르면서 열리지도 않은 칸의 개수
+        unknown = orPlanes(self.state, board.opened).count(0)
+        if unknown == 0 or (remaining != 0 and remaining != unknown):
+            return False
+
+        value = SAFE if remaining == 0 else MINE
+        for i in range(len(self.state)):
+            if self.state[i] == UNKNOWN and not board.opened[i]:
+                self.mark(i, value)
+        return True
@@ -0,0 +1,30 @@
+import unittest
+
+from benchmark import compareResults, DEFAULT_THRESHOLD
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    def test_compare_results(self):
+        baseline = {'fast': 1e-3, 'slow': 1e-3, 'edge': 1e-3, 'tiny': 1e-7, 'zero': 0.0, 'removed': 1e-3}
+        results = {'fast': 0.5e-3, 'slow': 1.5e-3, 'edge': 1.1e-3, 'tiny': 1e-6, 'zero': 1e-3, 'added': 1e-3}
+        rows = {row[0]: row for row in compareResults(baseline, results)}
+
+        # 기준이나 지금 결과 중 한쪽에만 있는 벤치마크는 비교하지 않음
+        self.assertEqual(set(rows), {'fast', 'slow', 'edge', 'tiny', 'zero'})
+        self.assertEqual(rows['slow'][1:4], (1e-3, 1.5e-3, 1.5))
+        self.assertTrue(rows['slow'][4])
+        self.assertFalse(rows['fast'][4])
+        # DEFAULT_THRESHOLD (20%) 보다 덜 느려진 것은 괜찮음
+        self.assertLess(rows['edge'][3], 1 + DEFAULT_THRESHOLD)
+        self.assertFalse(rows['edge'][4])
+        # 비율이 커도 차이가 측정 오차 수준이면 느려진 것으로 보지 않음
+        self.assertFalse(rows['tiny'][4])
+        self.assertEqual(rows['zero'][3], 1.0)
+        self.assertFalse(rows['zero'][4])
+
+        rows = {row[0]: row for row in compareResults(baseline, results, threshold=0.05)}
+        self.assertTrue(rows['edge'][4])
+
+
+if __name__ == '__main__':
+    unittest.main()
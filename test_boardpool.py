@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+
+from boardpool import BoardPool
+from constants import GenerationMode
+from generator import NoGuessGenerator
+
+
+SMALL = (9, 9, 10, GenerationMode.RANDOM)
+MEDIUM = (16, 16, 40, GenerationMode.RANDOM)
+LARGE = (30, 16, 99, GenerationMode.RANDOM)
+
+
+class BoardPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.generator = NoGuessGenerator(workers=1)
+
+    def tearDown(self):
+        self.generator.shutdown()
+
+    # 백그라운드 스레드가 게임판을 다 채울 때까지 기다림
+    def waitFilled(self, pool, counts):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with pool.condition:
+                if {config: len(boards) for config, boards in pool.boards.items()} == counts:
+                    return
+            time.sleep(0.01)
+        self.fail(f'Pool was not filled to {counts}')
+
+    def test_hits(self):
+        pool = BoardPool(self.generator, depth=2)
+        board = pool.take(SMALL)
+        self.assertEqual((board.width(), board.height(), board.countMine()), (9, 9, 10))
+        self.assertEqual((pool.hits, pool.misses), (0, 1))
+
+        self.waitFilled(pool, {SMALL: 2})
+        self.assertEqual(pool.cells, 2 * 81)
+        pool.take(SMALL)
+        self.assertEqual((pool.hits, pool.misses), (1, 1))
+        self.waitFilled(pool, {SMALL: 2})
+        pool.shutdown()
+
+        # 멈춘 뒤에도 게임판은 그 자리에서 만들어줌
+        self.assertEqual(pool.take(SMALL).countMine(), 10)
+        self.assertEqual(pool.cells, 0)
+
+    def test_max_configs(self):
+        pool = BoardPool(self.generator, depth=1, maxConfigs=2)
+        pool.take(SMALL)
+        pool.take(MEDIUM)
+        self.waitFilled(pool, {SMALL: 1, MEDIUM: 1})
+
+        # SMALL 을 다시 사용했으므로 가장 오래 사용하지 않은 MEDIUM 이 버려짐
+        pool.take(SMALL)
+        pool.take(LARGE)
+        self.waitFilled(pool, {SMALL: 1, LARGE: 1})
+        self.assertEqual(list(pool.boards), [SMALL, LARGE])
+        self.assertEqual(pool.cells, 81 + 480)
+        pool.shutdown()
+
+    def test_max_cells(self):
+        pool = BoardPool(self.generator, depth=4, maxCells=2 * 81 + 10)
+        pool.take(SMALL)
+        self.waitFilled(pool, {SMALL: 2})
+        time.sleep(0.05)
+        with pool.condition:
+            self.assertEqual(len(pool.boards[SMALL]), 2)
+            self.assertLessEqual(pool.cells, pool.maxCells)
+        pool.shutdown()
+
+    def test_concurrent_generate(self):
+        # 풀의 백그라운드 스레드와 take 처럼 여러 스레드가 같은 generator 를 같이 씀
+        threads = [threading.Thread(target=self.generator.generate, args=(9, 9, 10)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = self.generator.getStats()[(9, 9, 10)]
+        self.assertEqual(stats['boards'], 4)
+        self.assertGreaterEqual(stats['attempts'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
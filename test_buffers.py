@@ -0,0 +1,87 @@
+import socket
+import unittest
+
+from buffers import RecvBuffer, SendQueue
+
+
+class BuffersTestCase(unittest.TestCase):
+    def test_recv_buffer(self):
+        buf = RecvBuffer(8)
+        view = buf.writable(4)
+        view[:6] = b'abcdef'
+        buf.commit(6)
+        buf.consume(4)
+        self.assertEqual(bytes(buf.view()), b'ef')
+
+        # 빈 공간이 모자라면 읽은 부분을 당기거나 더 큰 버퍼로 옮김
+        buf.writable(6)[:6] = b'ghijkl'
+        buf.commit(6)
+        self.assertEqual(bytes(buf.view()), b'efghijkl')
+        buf.writable(100)[:1] = b'm'
+        buf.commit(1)
+        self.assertEqual(bytes(buf.view()), b'efghijklm')
+        buf.consume(9)
+        self.assertEqual(len(buf), 0)
+
+    def test_send_queue(self):
+        a, b = socket.socketpair()
+        a.setblocking(False)
+        try:
+            frame = bytes(range(256)) * 1024
+            queue = SendQueue()
+            queue.push(frame)
+            queue.push(b'')
+            queue.push(frame)
+            self.assertEqual(len(queue), len(frame) * 2)
+
+            recvBuf = RecvBuffer()
+            while len(recvBuf) < len(frame) * 2:
+                queue.send(a)
+                recvBuf.recvInto(b)
+            self.assertEqual(len(queue), 0)
+            self.assertEqual(bytes(recvBuf.view()), frame * 2)
+        finally:
+            a.close()
+            b.close()
+
+    def test_drop_unsent(self):
+        queue = SendQueue()
+        queue.push(b'hello')
+        queue.push(b'abcd', 1)
+        queue.push(b'efgh', 2)
+        queue.push(b'ijkl', 3)
+        queue.advance(7)
+
+        # 일부만 보낸 첫 프레임은 남기고 나머지를 버림
+        self.assertEqual(queue.dropUnsent(), [2, 3])
+        self.assertEqual(len(queue), 2)
+        queue.push(b'mnop', 4)
+        queue.advance(2)
+        self.assertEqual(queue.dropUnsent(), [4])
+        self.assertEqual(len(queue), 0)
+
+        # tag 가 None 인 데이터는 남겨둠
+        queue.push(b'nonce')
+        queue.push(b'qrst', 5)
+        self.assertEqual(queue.dropUnsent(), [5])
+        self.assertEqual(len(queue), 5)
+
+    def test_drop_while_sending(self):
+        queue = SendQueue()
+        queue.push(b'abcd', 1)
+        queue.push(b'efgh', 2)
+
+        # 다른 곳에서 보내는 중인 첫 프레임은 버리지 않음
+        frame = queue.startSending()
+        self.assertEqual(queue.dropUnsent(), [2])
+        self.assertEqual(len(queue), 4)
+        queue.push(b'ijkl', 3)
+        queue.advance(len(frame))
+        self.assertEqual(len(queue), 4)
+        self.assertEqual(bytes(queue.frames[0]), b'ijkl')
+        self.assertEqual(queue.dropUnsent(), [3])
+        self.assertEqual(len(queue), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
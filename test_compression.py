@@ -0,0 +1,52 @@
+import unittest
+
+from compression import FrameCompressor, FrameDecompressor, chooseCompression
+from constants import FRAME_HEADER, FRAME_ACK, FRAME_COMPRESSED, FRAME_RESET, FrameKind
+
+
+def makeFrame(body):
+    return FRAME_HEADER.pack(FrameKind.SNAPSHOT, 0, 1, -1, -1, 1, len(body)) + FRAME_ACK.pack(3, 4) + body
+
+
+class CompressionTestCase(unittest.TestCase):
+    def test_choose(self):
+        self.assertEqual(chooseCompression(['brotli', 'lzma', 'zlib']), 'lzma')
+        self.assertIsNone(chooseCompression(['zlib'], ()))
+
+    def test_roundtrip(self):
+        body = bytes(4096) + bytes(range(256))
+        for method, stream in [('zlib', False), ('zlib', True), ('lzma', False)]:
+            compressor = FrameCompressor(method, stream)
+            decompressor = FrameDecompressor(method, stream)
+            for _ in range(2):
+                frame = compressor.compressFrame(makeFrame(body))
+                kind, base, version, startTime, endTime, ackCount, msgLen = FRAME_HEADER.unpack_from(frame)
+                self.assertTrue(kind & FRAME_COMPRESSED)
+                self.assertEqual(FRAME_ACK.unpack_from(frame, FRAME_HEADER.size), (3, 4))
+                self.assertEqual(decompressor.decompress(frame[len(frame) - msgLen:]), body)
+            self.assertLess(compressor.stats.ratio(), 0.5)
+
+        # 작은 프레임은 그대로 보내고, 같은 cache 를 넘기면 한 번만 압축함
+        small = makeFrame(b'abc')
+        self.assertIs(FrameCompressor('zlib').compressFrame(small), small)
+        cache = dict()
+        frame = FrameCompressor('zlib').compressFrame(makeFrame(body), cache)
+        self.assertIs(FrameCompressor('zlib').compressFrame(makeFrame(body), cache), frame)
+
+        # 스트림 압축 중 보내지 않은 프레임이 있으면 양쪽 모두 압축 상태를 새로 시작함
+        compressor = FrameCompressor('zlib', True)
+        decompressor = FrameDecompressor('zlib', True)
+        compressor.compressFrame(makeFrame(body))
+        compressor.reset()
+        frame = compressor.compressFrame(makeFrame(body))
+        kind, base, version, startTime, endTime, ackCount, msgLen = FRAME_HEADER.unpack_from(frame)
+        self.assertTrue(kind & FRAME_RESET)
+        decompressor.reset()
+        self.assertEqual(decompressor.decompress(frame[len(frame) - msgLen:]), body)
+
+        with self.assertRaises(ValueError):
+            FrameDecompressor('zlib').decompress(b'garbage')
+
+
+if __name__ == '__main__':
+    unittest.main()
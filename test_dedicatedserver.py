@@ -0,0 +1,148 @@
+import asyncio
+import unittest
+
+from constants import GenerationMode, FrameKind
+from dedicatedserver import DedicatedServer, DEFAULT_ROOM
+from gameboard import GameBoard
+from test_integratedserver import LoopbackClient, waitUntil
+
+
+# 테스트에서 처음부터 열어두는 방의 설정
+DEFAULT_CONFIG = (9, 9, 10, GenerationMode.RANDOM)
+
+
+# name 방을 만들어달라는 hello
+def createHello(name, width, height, mines):
+    return {'compression': [], 'room': name,
+            'create': {'width': width, 'height': height, 'mines': mines, 'mode': GenerationMode.RANDOM}}
+
+
+class DedicatedServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = DedicatedServer(port=0, maxRooms=3)
+        self.serveTask = asyncio.get_running_loop().create_task(
+            self.server.serve([(DEFAULT_ROOM, DEFAULT_CONFIG)], '127.0.0.1'))
+        self.assertTrue(await waitUntil(lambda: DEFAULT_ROOM in self.server.rooms))
+        self.port = self.server.serverSock.getsockname()[1]
+        self.clients = []
+
+    async def connect(self):
+        client = await LoopbackClient.connect(self.port)
+        self.clients.append(client)
+        return client
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            client.close()
+        self.serveTask.cancel()
+        await asyncio.gather(self.serveTask, return_exceptions=True)
+        for name in list(self.server.rooms):
+            self.server.removeRoom(name)
+        self.server.serverSock.close()
+        self.server.boardPool.shutdown()
+
+    # 스냅샷 프레임을 받아서 (너비, 높이, 지뢰 수) 를 리턴함
+    async def readSize(self, client):
+        kind, _, _, _, data = await client.readFrame()
+        self.assertEqual(kind, FrameKind.SNAPSHOT)
+        board = GameBoard()
+        board.deserializeGame(data)
+        return board.width(), board.height(), board.countMine()
+
+    async def test_default_room(self):
+        client = await self.connect()
+        self.assertIsNotNone(await client.handshake(self.server.rooms[DEFAULT_ROOM].pin))
+        self.assertEqual(client.reply['room'], DEFAULT_ROOM)
+        self.assertNotIn('pin', client.reply)
+        self.assertEqual(await self.readSize(client), (9, 9, 10))
+
+    async def test_create_room(self):
+        client = await self.connect()
+        self.assertIsNotNone(await client.handshake(hello=createHello('new', 5, 4, 3)))
+        self.assertEqual(client.reply['room'], 'new')
+        room = self.server.rooms['new']
+        self.assertEqual(client.reply['pin'], room.pin)
+        self.assertEqual(await self.readSize(client), (5, 4, 3))
+
+        # 이미 있는 방에 create 를 보내면 설정은 무시하고 그 방에 들어감
+        other = await self.connect()
+        self.assertIsNotNone(await other.handshake(room.pin, hello=createHello('new', 30, 16, 99)))
+        self.assertNotIn('pin', other.reply)
+        self.assertEqual(await self.readSize(other), (5, 4, 3))
+        self.assertEqual(len(room.nodes), 2)
+
+    # 방을 만드는 중에 같은 방을 만들려고 한 클라이언트는 게임판이 만들어진 뒤에 그 방에 들어감
+    async def test_concurrent_create(self):
+        creator = await self.connect()
+        created = asyncio.get_running_loop().create_task(
+            creator.handshake(hello=createHello('new', 1000, 1000, 200000)))
+        self.assertTrue(await waitUntil(lambda: 'new' in self.server.rooms))
+        room = self.server.rooms['new']
+        self.assertFalse(room.created.is_set())
+
+        other = await self.connect()
+        self.assertIsNotNone(await other.handshake(room.pin, hello=createHello('new', 5, 4, 3)))
+        self.assertNotIn('pin', other.reply)
+        self.assertIsNotNone(await created)
+        for client in (creator, other):
+            self.assertEqual(await self.readSize(client), (1000, 1000, 200000))
+        self.assertEqual(len(room.nodes), 2)
+
+    async def test_reject_room(self):
+        hellos = [
+            ({'compression': [], 'room': 'missing'}, 'no such room'),
+            (createHello('bad', 5, 4, 0), 'invalid room config'),
+            (createHello('bad', 5, 4, 20), 'invalid room config'),
+            (createHello('bad', 5000, 5000, 10), 'invalid room config'),
+            ({'compression': [], 'room': 'bad', 'create': {'width': '5', 'height': 4, 'mines': 3}},
+             'invalid room config'),
+            ({'compression': [], 'room': 'bad', 'create': {'width': 5, 'height': 4, 'mines': 3, 'mode': 9}},
+             'invalid room config'),
+            ({'compression': [], 'room': 'x' * 100}, 'invalid room name'),
+        ]
+        for hello, error in hellos:
+            client = await self.connect()
+            self.assertIsNone(await client.handshake(hello=hello))
+            self.assertEqual(client.reply['error'], error)
+            self.assertTrue(await client.isClosed())
+        self.assertEqual(list(self.server.rooms), [DEFAULT_ROOM])
+
+        # 방을 더 만들 수 없으면 거절함
+        for name in ('a', 'b'):
+            client = await self.connect()
+            self.assertIsNotNone(await client.handshake(hello=createHello(name, 5, 4, 3)))
+        client = await self.connect()
+        self.assertIsNone(await client.handshake(hello=createHello('c', 5, 4, 3)))
+        self.assertEqual(client.reply['error'], 'too many rooms')
+
+        # 방 만들기를 막아두면 없는 방은 만들지 않음
+        self.server.allowCreate = False
+        client = await self.connect()
+        self.assertIsNone(await client.handshake(hello=createHello('d', 5, 4, 3)))
+        self.assertEqual(client.reply['error'], 'no such room')
+
+    async def test_pin_per_room(self):
+        creator = await self.connect()
+        self.assertIsNotNone(await creator.handshake(hello=createHello('new', 5, 4, 3)))
+        room = self.server.rooms['new']
+        default = self.server.rooms[DEFAULT_ROOM]
+        if room.pin == default.pin:
+            room.pin = default.pin % 9999 + 1
+
+        # 다른 방의 핀 번호로는 들어갈 수 없음
+        client = await self.connect()
+        self.assertIsNone(await client.handshake(default.pin, hello={'compression': [], 'room': 'new'}))
+        self.assertTrue(await client.isClosed())
+        client = await self.connect()
+        self.assertIsNone(await client.handshake(room.pin))
+        self.assertTrue(await client.isClosed())
+        self.assertEqual(len(room.nodes), 1)
+        self.assertEqual(len(default.nodes), 0)
+
+        client = await self.connect()
+        self.assertIsNotNone(await client.handshake(room.pin, hello={'compression': [], 'room': 'new'}))
+        self.assertEqual(await self.readSize(client), (5, 4, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
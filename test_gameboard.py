@@ -1,5 +1,7 @@
+import random
 import unittest
 
+from gameaction import GameAction, encodeAction, decodeActions, decodeJsonActions
 from gameboard import *
 
 
@@ -7,23 +9,92 @@ class GameBoardTestCase(unittest.TestCase):
     def setUp(self):
         self.game = GameBoard()
         self.game.newGame(7, 5, 0)
-        self.game.mines[0][0] = True
-        self.game.mines[1][1] = True
-        self.game.mines[2][2] = True
+        self.game.setMine(0, 0)
+        self.game.setMine(1, 1)
+        self.game.setMine(2, 2)
 
     def test_newGame(self):
         self.game.newGame(7, 5, 3)
         cnt = 0
-        for i in range(len(self.game.mines)):
-            for j in range(len(self.game.mines[i])):
-                if self.game.mines[i][j]:
+        for i in range(self.game.height()):
+            for j in range(self.game.width()):
+                if self.game.mines[i * self.game.width() + j]:
                     cnt += 1
         self.assertEqual(cnt, 3)
 
+    def test_newGame_seed(self):
+        other = GameBoard()
+        self.game.newGame(30, 16, 99, seed=1234)
+        other.newGame(30, 16, 99, seed=1234)
+        self.assertEqual(self.game.mines, other.mines)
+
+    def test_newGame_first_click(self):
+        for mode in [GenerationMode.SAFE, GenerationMode.ZERO]:
+            for _ in range(20):
+                self.game.newGame(9, 9, 30, mode)
+                self.assertEqual(self.game.countMine(), 30)
+                self.assertEqual(self.game.openCell(4, 4), False)
+                self.assertEqual(self.game.countMine(), 30)
+                self.assertEqual(self.game.mines.count(1), 30)
+                if mode == GenerationMode.ZERO:
+                    self.assertEqual(self.game.getCellText(4, 4), 0)
+
+        self.game.newGame(3, 3, 8, GenerationMode.ZERO)
+        self.assertEqual(self.game.openCell(1, 1), False)
+        self.assertEqual(self.game.getCellText(1, 1), 8)
+
+    # 지뢰가 칸보다 많으면 줄여서 배치하지 않고 거절함 (그러면 끝낼 수 없는 게임판이 됨)
+    def test_newGame_too_many_mines(self):
+        self.game.newGame(3, 3, 9)
+        self.assertEqual(self.game.countMine(), 9)
+        for mode in [GenerationMode.RANDOM, GenerationMode.SAFE, GenerationMode.ZERO]:
+            self.assertRaises(ValueError, self.game.newGame, 3, 3, 10, mode)
+            self.assertRaises(ValueError, self.game.newGame, 3, 3, -1, mode)
+        self.assertEqual((self.game.width(), self.game.countMine()), (3, 9))
+        self.assertRaises(ValueError, self.game.placeMines, 5, range(5))
+
     def test_serialization(self):
         self.assertEqual(type(self.game.serializeGame()), type(b''))
         self.game.deserializeGame(self.game.serializeGame())
 
+        self.game.cycleCellImage(0, 0)
+        self.game.cycleCellImage(1, 1)
+        self.game.cycleCellImage(1, 1)
+        self.game.openCell(2, 2)
+        self.game.openCell(6, 4)
+        other = GameBoard()
+        other.deserializeGame(self.game.serializeGame())
+        self.assertEqual((other.width(), other.height()), (7, 5))
+        self.assertEqual(other.mines, self.game.mines)
+        self.assertEqual(other.opened, self.game.opened)
+        self.assertEqual(other.images, self.game.images)
+        self.assertEqual(other.countRemainingMine(), self.game.countRemainingMine())
+        self.assertEqual(other.getCellImage(1, 1), ImageType.QUESTION)
+
+        data = self.game.serializeGame()
+        self.assertRaises(ValueError, other.deserializeGame, data[:-1])
+        self.assertRaises(ValueError, other.deserializeGame, b'garbage' + data)
+        self.assertEqual(other.mines, self.game.mines)
+
+    def test_serialize_changes(self):
+        other = self.game.copy()
+        self.game.popChanges()
+        self.game.cycleCellImage(0, 0)
+        self.game.openCell(6, 4)
+        self.game.openCell(2, 2)
+        data = self.game.serializeChanges(self.game.popChanges())
+
+        changes = other.deserializeChanges(data)
+        self.assertEqual(len(changes), 32)
+        self.assertEqual(other.opened, self.game.opened)
+        self.assertEqual(other.images, self.game.images)
+        self.assertEqual((other.flagCount, other.blownCount, other.closedCount),
+                         (self.game.flagCount, self.game.blownCount, self.game.closedCount))
+
+        self.assertRaises(ValueError, other.deserializeChanges, data[:-1])
+        self.assertRaises(ValueError, other.deserializeChanges, b'\0\0\0\0\0\0\0\x01\xff')
+        self.assertEqual(other.images, self.game.images)
+
     def test_cycleCellImage(self):
         self.assertEqual(self.game.getCellImage(0, 0), ImageType.NONE)
         self.game.cycleCellImage(0, 0)
@@ -51,7 +122,7 @@ class GameBoardTestCase(unittest.TestCase):
         self.assertEqual(self.game.openCell(1, 1), True)
         self.assertEqual(self.game.getCellImage(1, 1), ImageType.BLOWN_UP_MINE)
 
-        self.game.images[2][2] = ImageType.BLOWN_UP_MINE
+        self.game.images[2 * 7 + 2] = ImageType.BLOWN_UP_MINE
         self.assertEqual(self.game.openCell(2, 2), False)
 
         self.assertEqual(self.game.openCell(6, 4), False)
@@ -87,7 +158,7 @@ class GameBoardTestCase(unittest.TestCase):
         self.assertEqual(self.game.openCellAdjacent(6, 4), False)
 
     def test_finishGame(self):
-        self.game.mines[3][3] = True
+        self.game.setMine(3, 3)
 
         self.game.cycleCellImage(0, 0)
         self.game.cycleCellImage(0, 1)
@@ -134,9 +205,55 @@ class GameBoardTestCase(unittest.TestCase):
         self.assertEqual(self.game.countMine(), 3)
         self.game.cycleCellImage(0, 0)
         self.assertEqual(self.game.countMine(), 3)
-        self.game.mines[4][6] = True
+        self.game.setMine(6, 4)
         self.assertEqual(self.game.countMine(), 4)
 
+    def test_changes(self):
+        self.assertTrue(self.game.popChanges().full)
+        self.assertFalse(self.game.popChanges())
+
+        changes = self.game.doAction(GameAction().cycleCellImage(0, 0))
+        self.assertEqual(list(changes), [0])
+        self.assertEqual(list(self.game.doAction(GameAction().openCell(0, 0))), [])
+
+        changes = self.game.doAction(GameAction().openCell(6, 0))
+        self.assertEqual(len(changes), 30)
+        self.assertEqual(set(changes), {i for i in range(35) if self.game.opened[i]})
+        self.assertEqual(len(self.game.popChanges()), 31)
+
+        self.game.finishGame()
+        self.assertEqual(list(self.game.popChanges()), [8, 16])
+
+    def test_doActions(self):
+        action = GameAction()
+        changes = self.game.doActions([action.cycleCellImage(0, 0), action.openCell(0, 1), action.cycleCellImage(0, 1)])
+        self.assertEqual(list(changes), [0, 7])
+        self.assertEqual(self.game.getCellImage(0, 0), ImageType.FLAG)
+        self.assertEqual(self.game.getCellText(0, 1), 2)
+
+    def test_action_codec(self):
+        action = GameAction()
+        data = encodeAction(3, action.openCell(1, 2)) + encodeAction(4, action.resync())
+        self.assertEqual(decodeActions(data + data[:5]), ([(3, action.openCell(1, 2)), (4, action.resync())], len(data)))
+        self.assertRaises(ValueError, decodeActions, encodeAction(5, (9, 0, 0)))
+
+        msg = b'{"action": "cycleCellImage", "x": 0, "y": 1}'
+        data = struct.pack('!2L', 6, len(msg)) + msg
+        self.assertEqual(decodeJsonActions(data + data[:-1]), ([(6, action.cycleCellImage(0, 1))], len(data)))
+
+    def test_counters(self):
+        self.game.newGame(16, 16, 40)
+        rng = random.Random(1)
+        for _ in range(200):
+            x = rng.randrange(16)
+            y = rng.randrange(16)
+            rng.choice([self.game.openCell, self.game.openCellAdjacent, self.game.cycleCellImage])(x, y)
+        self.game.finishGame()
+
+        counters = (self.game.mineCount, self.game.flagCount, self.game.blownCount, self.game.closedCount)
+        self.game.rebuildCounters()
+        self.assertEqual(counters, (self.game.mineCount, self.game.flagCount, self.game.blownCount, self.game.closedCount))
+
     def test_check_finished(self):
         self.game.cycleCellImage(2, 2)
 
@@ -168,7 +285,7 @@ class GameBoardTestCase(unittest.TestCase):
         self.assertEqual(self.game.getCellText(1, 1), 3)
 
     def test_count_adjacent_mine(self):
-        self.game.mines[4][6] = True
+        self.game.setMine(6, 4)
 
         self.assertEqual(self.game.countAdjacentMines(1, 1), 3)
         self.assertEqual(self.game.countAdjacentMines(0, 0), 2)
@@ -178,12 +295,25 @@ class GameBoardTestCase(unittest.TestCase):
         self.assertEqual(self.game.countAdjacentMines(5, 4), 1)
         self.assertEqual(self.game.countAdjacentMines(6, 3), 1)
 
+    def test_build_counts(self):
+        self.game.newGame(13, 8, 30)
+        counts = self.game.counts
+        self.game.buildCounts()
+        self.assertEqual(counts, self.game.counts)
+        for y in range(8):
+            for x in range(13):
+                cnt = 0
+                for i in range(max(0, y - 1), min(8, y + 2)):
+                    for j in range(max(0, x - 1), min(13, x + 2)):
+                        cnt += self.game.mines[i * 13 + j]
+                self.assertEqual(self.game.countAdjacentMines(x, y), cnt)
+
     def test_iter_empty_adjacent(self):
-        self.game.mines[3][2] = True
-        self.game.mines[4][2] = True
-        self.game.mines[2][4] = True
-        self.game.mines[2][5] = True
-        self.game.mines[2][6] = True
+        self.game.setMine(2, 3)
+        self.game.setMine(2, 4)
+        self.game.setMine(4, 2)
+        self.game.setMine(5, 2)
+        self.game.setMine(6, 2)
 
         self.assertEqual(sum([1 for x in self.game.iterEmptyAdjacent(0, 2)]), 1)
         self.assertEqual(sum([1 for x in self.game.iterEmptyAdjacent(0, 3)]), 6)
@@ -192,6 +322,100 @@ class GameBoardTestCase(unittest.TestCase):
         self.assertEqual(sum([1 for x in self.game.iterEmptyAdjacent(3, 0)]), 10)
         self.assertEqual(sum([1 for x in self.game.iterEmptyAdjacent(6, 4)]), 8)
 
+    # (x, y) 칸이 속한 영역 번호
+    def region(self, x, y):
+        if self.game.zeroRuns is None:
+            self.game.buildRegions()
+        for start, end, region in self.game.zeroRuns[y]:
+            if start <= x < end:
+                return region
+        return None
+
+    # 칸 단위로 (대각선 포함) 이어진 영역을 찾아서 findRegionMask 와 같은 형식으로 리턴함
+    def floodMask(self, x, y):
+        w, h = self.game.width(), self.game.height()
+        seen = {(x, y)}
+        stack = [(x, y)]
+        while stack:
+            cx, cy = stack.pop()
+            for nx in range(max(0, cx - 1), min(w, cx + 2)):
+                for ny in range(max(0, cy - 1), min(h, cy + 2)):
+                    if (nx, ny) not in seen and self.game.countAdjacentMines(nx, ny) == 0:
+                        seen.add((nx, ny))
+                        stack.append((nx, ny))
+        mask = bytearray(w * h)
+        for cx, cy in seen:
+            for nx in range(max(0, cx - 1), min(w, cx + 2)):
+                for ny in range(max(0, cy - 1), min(h, cy + 2)):
+                    mask[ny * w + nx] = 1
+        return mask
+
+    def test_regions_edges(self):
+        # 가운데 지뢰 하나를 둘러싼, 네 변에 모두 닿는 고리 모양의 영역 하나
+        self.game.newGame(7, 5, 0)
+        self.game.setMine(3, 2)
+        self.assertEqual(len({self.region(x, y) for x, y in [(0, 0), (6, 0), (0, 4), (6, 4), (0, 2), (6, 2)]}), 1)
+        start, mask = self.game.findRegionMask(6, 4)
+        self.assertEqual(start, 0)
+        self.assertEqual(mask.count(1), 34)
+        self.assertEqual(mask[2 * 7 + 3], 0)
+
+        self.assertEqual(self.game.openCell(6, 0), False)
+        self.assertEqual(self.game.closedCount, 0)
+
+    def test_regions_diagonal(self):
+        # 왼쪽 위와 오른쪽 아래의 영역은 (1, 1) 과 (2, 2) 에서 대각선으로만 이어져 있음
+        self.game.newGame(5, 5, 0)
+        self.game.setMine(3, 0)
+        self.game.setMine(0, 3)
+        self.assertIsNone(self.region(2, 1))
+        self.assertIsNone(self.region(1, 2))
+        self.assertEqual(self.region(1, 1), self.region(2, 2))
+
+        self.game.openCell(0, 0)
+        self.assertEqual(self.game.getCellText(4, 4), 0)
+        # 두 구석은 주변에 지뢰가 없는 칸과 맞닿지 않으므로 열리지 않음
+        self.assertEqual(self.game.closedCount, 2)
+        self.assertIsNone(self.game.getCellText(4, 0))
+
+        # 지뢰로 가로막힌 양쪽은 서로 다른 영역임
+        self.game.newGame(7, 3, 0)
+        for y in range(3):
+            self.game.setMine(3, y)
+        self.assertNotEqual(self.region(0, 0), self.region(6, 2))
+
+    def test_regions_random(self):
+        rng = random.Random(3)
+        for _ in range(20):
+            self.game.newGame(rng.randrange(1, 20), rng.randrange(1, 12), 0)
+            w, h = self.game.width(), self.game.height()
+            for _ in range(rng.randrange(w * h // 4 + 1)):
+                self.game.setMine(rng.randrange(w), rng.randrange(h))
+            for y in range(h):
+                for x in range(w):
+                    if self.game.countAdjacentMines(x, y) == 0:
+                        start, mask = self.game.findRegionMask(x, y)
+                        self.assertEqual(bytes(start * b'\0') + mask + bytes(w * h - start - len(mask)),
+                                         bytes(self.floodMask(x, y)))
+
+    def test_regions_rebuilt(self):
+        other = GameBoard()
+        other.newGame(7, 5, 0)
+        other.setMine(6, 4)
+
+        self.game.findRegionMask(6, 0)
+        self.assertIsNotNone(self.game.zeroRuns)
+        self.game.deserializeGame(other.serializeGame())
+        # 지뢰 배치가 바뀌었으므로 영역은 다음에 필요할 때 다시 계산함
+        self.assertIsNone(self.game.zeroRuns)
+        start, mask = self.game.findRegionMask(0, 0)
+        self.assertEqual((start, mask.count(1)), (0, 34))
+        self.assertIsNotNone(self.game.zeroRuns)
+
+        self.game.setMine(0, 0)
+        self.assertIsNone(self.game.zeroRuns)
+        self.assertIsNone(self.region(1, 1))
+
 
 if __name__ == '__main__':
     unittest.main()
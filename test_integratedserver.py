@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import socket
+import unittest
+
+from constants import GenerationMode, FrameKind, MAGIC_STRING, MAGIC_STRING_V20, MAGIC_STRING_V12, HELLO_HEADER, \
+    FRAME_HEADER, FRAME_ACK
+from gameaction import GameAction, encodeAction
+from gameboard import GameBoard
+from integratedserver import IntegratedServer, acceptConnections
+
+
+# 한 번에 기다리는 최대 시간(초). 이보다 오래 걸리면 서버가 멈춘 것으로 봄
+WAIT = 5.0
+
+
+# 서버에 프로토콜을 직접 주고받는 테스트용 클라이언트
+class LoopbackClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.reply = None  # 서버가 보낸 hello 응답
+
+    @classmethod
+    async def connect(cls, port: int):
+        return cls(*await asyncio.open_connection('127.0.0.1', port))
+
+    async def read(self, n: int) -> bytes:
+        return await asyncio.wait_for(self.reader.readexactly(n), WAIT)
+
+    # 매직 문자열과 hello 를 보내고 서버의 응답을 받은 뒤 핀 번호로 인증함
+    # 성공하면 nodeId 를, 서버가 연결을 끊으면 None 을 리턴함
+    # pin 이 None 이면 서버가 hello 로 알려준 핀을 사용함
+    async def handshake(self, pin=None, magic=MAGIC_STRING, hello=None):
+        self.writer.write(magic)
+        if magic == MAGIC_STRING:
+            hello = json.dumps(hello if hello is not None else {'compression': []}).encode('utf-8')
+            self.writer.write(HELLO_HEADER.pack(len(hello)) + hello)
+        try:
+            nonce = await self.read(16)
+            if magic == MAGIC_STRING:
+                size = HELLO_HEADER.unpack(await self.read(HELLO_HEADER.size))[0]
+                self.reply = json.loads(await self.read(size))
+                if 'error' in self.reply:
+                    return None
+                pin = self.reply.get('pin', pin)
+            self.writer.write(hashlib.sha224(pin.to_bytes(2, byteorder='little') + nonce).digest())
+            return int.from_bytes(await self.read(4), byteorder='big')
+        except asyncio.IncompleteReadError:
+            return None
+
+    # 프레임 하나를 받아서 (종류, base, 버전, ack 리스트, 내용) 을 리턴함
+    async def readFrame(self):
+        kind, base, version, _, _, ackCount, msgLen = FRAME_HEADER.unpack(await self.read(FRAME_HEADER.size))
+        acks = list(FRAME_ACK.iter_unpack(await self.read(ackCount * FRAME_ACK.size)))
+        return kind, base, version, acks, await self.read(msgLen)
+
+    # 서버가 연결을 끊었는지 확인함. 끊기 전에 보낸 데이터는 버림
+    async def isClosed(self):
+        try:
+            while await asyncio.wait_for(self.reader.read(65536), WAIT) != b'':
+                pass
+            return True
+        except ConnectionError:
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def close(self):
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+# 조건이 참이 될 때까지 기다림
+async def waitUntil(condition):
+    for _ in range(int(WAIT / 0.01)):
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def makeBoard(w=9, h=9, mines=10):
+    board = GameBoard()
+    board.newGame(w, h, mines, GenerationMode.RANDOM)
+    return board, (w, h, mines, GenerationMode.RANDOM)
+
+
+class IntegratedServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = IntegratedServer()
+        self.server.listening = True
+        self.server.resetBoard(*makeBoard())
+        self.server.attach(asyncio.get_running_loop())
+
+        self.serverSock = socket.socket()
+        self.serverSock.bind(('127.0.0.1', 0))
+        self.serverSock.listen(8)
+        self.serverSock.setblocking(False)
+        self.port = self.serverSock.getsockname()[1]
+        self.acceptTask = asyncio.get_running_loop().create_task(acceptConnections(self.serverSock, self.server))
+        self.clients = []
+
+    async def connect(self):
+        client = await LoopbackClient.connect(self.port)
+        self.clients.append(client)
+        return client
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            client.close()
+        self.acceptTask.cancel()
+        self.server.detach()
+        self.serverSock.close()
+
+    async def test_handshake(self):
+        client = await self.connect()
+        nodeId = await client.handshake(self.server.pin)
+        self.assertEqual(nodeId, 1)
+        self.assertEqual(client.reply['compression'], None)
+        self.assertIn('session', client.reply)
+
+        kind, _, version, _, data = await client.readFrame()
+        self.assertEqual(kind, FrameKind.SNAPSHOT)
+        board = GameBoard()
+        board.deserializeGame(data)
+        self.assertEqual((board.width(), board.height(), board.countMine()), (9, 9, 10))
+
+        # 보낸 action 은 모든 클라이언트에게 가는 프레임의 ack 로 확인받음
+        client.writer.write(encodeAction(7, GameAction().cycleCellImage(0, 0)))
+        kind, _, newVersion, acks, _ = await client.readFrame()
+        self.assertEqual(kind, FrameKind.DELTA)
+        self.assertEqual(acks, [(nodeId, 7)])
+        self.assertEqual(newVersion, version + 1)
+        client.close()
+
+    async def test_wrong_pin(self):
+        client = await self.connect()
+        self.assertIsNone(await client.handshake(self.server.pin % 9999 + 1))
+        self.assertTrue(await client.isClosed())
+        self.assertEqual(len(self.server.nodes), 0)
+
+        # 알 수 없는 매직 문자열은 아무것도 보내지 않고 끊음
+        client = await self.connect()
+        client.writer.write(b'minesweeper-qt/9.9\n')
+        self.assertTrue(await client.isClosed())
+
+    async def test_legacy(self):
+        for magic in [MAGIC_STRING_V20, MAGIC_STRING_V12]:
+            client = await self.connect()
+            self.assertIsNotNone(await client.handshake(self.server.pin, magic))
+            kind, _, _, _, _ = await client.readFrame()
+            self.assertEqual(kind, FrameKind.SNAPSHOT)
+
+            if magic == MAGIC_STRING_V12:
+                msg = b'{"action": "cycleCellImage", "x": 1, "y": 1}'
+                client.writer.write((3).to_bytes(4, 'big') + len(msg).to_bytes(4, 'big') + msg)
+            else:
+                client.writer.write(encodeAction(3, GameAction().cycleCellImage(1, 1)))
+            _, _, _, acks, _ = await client.readFrame()
+            self.assertEqual(acks[-1][1], 3)
+            client.close()
+
+    async def test_disconnect(self):
+        clients = [await self.connect() for _ in range(2)]
+        for client in clients:
+            await client.handshake(self.server.pin)
+            await client.readFrame()
+        self.assertEqual(len(self.server.nodes), 2)
+
+        clients[0].close()
+        self.assertTrue(await waitUntil(lambda: len(self.server.nodes) == 1))
+
+        # 남은 클라이언트는 계속 프레임을 받음
+        clients[1].writer.write(encodeAction(1, GameAction().cycleCellImage(2, 2)))
+        _, _, _, acks, _ = await clients[1].readFrame()
+        self.assertEqual(acks, [(2, 1)])
+        clients[1].close()
+        self.assertTrue(await waitUntil(lambda: len(self.server.nodes) == 0))
+
+    # 한 번의 flush 전에 처리한 action 들은 모든 클라이언트에게 같은 프레임 하나로 가고, 그 ack 들을 모두 담음
+    async def test_one_frame_per_flush(self):
+        clients = [await self.connect() for _ in range(2)]
+        nodeIds = []
+        for client in clients:
+            nodeIds.append(await client.handshake(self.server.pin))
+            await client.readFrame()
+
+        # 모든 클라이언트에게 보내는 프레임은 한 번만 만들어서 같이 씀
+        sent = []
+        for node in self.server.nodes.values():
+            def send(msg, cache=None, acks=(), original=node.send):
+                sent.append(msg)
+                original(msg, cache, acks)
+            node.send = send
+
+        # flush 가 이미 예약된 것처럼 해두면 두 클라이언트의 action 이 같은 틱에 처리된 것과 같음
+        self.server.flushScheduled = True
+        clients[0].writer.write(encodeAction(1, GameAction().cycleCellImage(0, 0)))
+        clients[1].writer.write(encodeAction(1, GameAction().cycleCellImage(1, 0)))
+        self.assertTrue(await waitUntil(lambda: self.server.metrics.actions == 2))
+        self.server.flush()
+        self.assertEqual(len(sent), 2)
+        self.assertIs(sent[0], sent[1])
+
+        frames = [await client.readFrame() for client in clients]
+        for kind, _, _, acks, _ in frames:
+            self.assertEqual(kind, FrameKind.DELTA)
+            self.assertEqual(sorted(acks), sorted([(nodeIds[0], 1), (nodeIds[1], 1)]))
+        self.assertEqual(frames[0], frames[1])
+
+        # 새 게임판은 (0, 0) ack 를 담은 다음 프레임으로 감. 그 사이에 다른 프레임은 없음
+        self.server.resetBoard(*makeBoard(5, 5, 3))
+        for client in clients:
+            kind, _, version, acks, _ = await client.readFrame()
+            self.assertEqual(kind, FrameKind.SNAPSHOT)
+            self.assertEqual(version, frames[0][2] + 1)
+            self.assertEqual(acks, [(0, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
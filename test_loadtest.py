@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+
+from dedicatedserver import DedicatedServer, DEFAULT_ROOM
+from loadtest import parseArgs, swarm, makeReport
+from test_dedicatedserver import DEFAULT_CONFIG
+from test_integratedserver import waitUntil
+
+
+class LoadTestTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = DedicatedServer(port=0)
+        self.serveTask = asyncio.get_running_loop().create_task(
+            self.server.serve([(DEFAULT_ROOM, DEFAULT_CONFIG)], '127.0.0.1'))
+        self.assertTrue(await waitUntil(lambda: DEFAULT_ROOM in self.server.rooms))
+        self.port = self.server.serverSock.getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.serveTask.cancel()
+        await asyncio.gather(self.serveTask, return_exceptions=True)
+        for name in list(self.server.rooms):
+            self.server.removeRoom(name)
+        self.server.serverSock.close()
+        self.server.boardPool.shutdown()
+
+    async def runSwarm(self, *options):
+        args = parseArgs(['--port', str(self.port), '--clients', '3', '--rate', '20', '--duration', '0.3',
+                          '--ramp', '0.1', '--width', '9', '--height', '9', '--mines', '10', *options])
+        result, seconds = await swarm(args)
+        return makeReport(result, args, seconds)
+
+    # 방을 만드는 클라이언트와 그 핀 번호로 들어오는 클라이언트들이 모두 접속해서 action 을 확인받음
+    async def test_create_rooms(self):
+        for k, options in enumerate(([], ['--no-compression'], ['--action', 'mixed'])):
+            report = await self.runSwarm('--rooms', '2', '--room-prefix', f'load{k}-', *options)
+            self.assertEqual(report['failed'], 0, report['errors'])
+            self.assertEqual(report['connected'], 3)
+            self.assertGreater(report['actionsAcked'], 0)
+            if '--action' not in options:
+                # 깃발만 꽂으면 게임이 끝나지 않으므로 모든 action 을 확인받음
+                self.assertEqual(report['actionsLost'], 0)
+            self.assertIn('SNAPSHOT', report['frames'])
+
+        # 이전에 만든 방이 남아있으면 만들지 못했다고 알려줌
+        report = await self.runSwarm('--rooms', '1', '--room-prefix', 'load0-')
+        self.assertEqual(report['connected'], 0)
+        self.assertEqual(report['errors']['room already exists'], 1)
+
+    # 이미 있는 방에 핀 번호로 들어감
+    async def test_join_room(self):
+        room = self.server.addRoom('load-0', True)
+        await self.server.resetRoom(room, DEFAULT_CONFIG)
+        report = await self.runSwarm('--rooms', '1', '--pin', str(room.pin))
+        self.assertEqual(report['failed'], 0, report['errors'])
+        self.assertEqual(report['connected'], 3)
+        self.assertGreater(report['actionsAcked'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import unittest
+
+from constants import GenerationMode
+from gameaction import GameAction
+from gameboard import GameBoard
+from integratedserver import IntegratedServer
+from metrics import ServerMetrics, TimedLock
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_timed_lock(self):
+        metrics = ServerMetrics()
+        lock = TimedLock(threading.Lock(), metrics)
+        with lock:
+            pass
+        self.assertEqual(metrics.lockHold.count, 1)
+        self.assertEqual(metrics.lockWait.count, 0)
+
+        # 다른 스레드가 잡고 있는 동안 기다린 경우에만 기다린 시간을 기록함
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with lock:
+                acquired.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        acquired.wait()
+        threading.Timer(0.01, release.set).start()
+        with lock:
+            pass
+        thread.join()
+        self.assertEqual(metrics.lockWait.count, 1)
+        self.assertGreater(metrics.lockWait.max, 0)
+        self.assertEqual(metrics.lockHold.count, 3)
+
+        metrics.reset()
+        self.assertEqual(metrics.asDict()['lockHold']['count'], 0)
+
+    # 접속한 클라이언트가 있는 동안에만 이벤트 루프를 잼
+    def test_watch_loop(self):
+        async def probe(metrics):
+            loop = asyncio.get_running_loop()
+            metrics.connected = 1
+            metrics.watchLoop(loop)
+            metrics.watchLoop(loop)
+            await asyncio.sleep(0.055)
+            metrics.connected = 0
+            await asyncio.sleep(0.03)
+            return metrics.probe
+
+        metrics = ServerMetrics(0.01)
+        self.assertIsNone(asyncio.run(probe(metrics)))
+        self.assertGreaterEqual(metrics.loopLag.count, 2)
+        self.assertLessEqual(metrics.loopLag.count, 7)
+
+        # 주기가 0 이면 재지 않음
+        metrics = ServerMetrics(0)
+        self.assertIsNone(asyncio.run(probe(metrics)))
+        self.assertEqual(metrics.loopLag.count, 0)
+
+    def test_server_metrics(self):
+        server = IntegratedServer()
+        board = GameBoard()
+        board.newGame(9, 9, 10, GenerationMode.RANDOM)
+        server.resetBoard(board, (9, 9, 10, GenerationMode.RANDOM))
+        action = GameAction()
+        server.processBatch([(action.cycleCellImage(0, 0), 0, None), (action.cycleCellImage(1, 0), 0, None)])
+        server.makeSnapshot()
+        server.makeSnapshot()
+
+        stats = server.metrics.asDict()
+        self.assertEqual(stats['actions'], 2)
+        self.assertEqual(stats['process']['count'], 1)
+        self.assertEqual(stats['snapshots'], 2)
+        self.assertEqual(stats['snapshotCacheHits'], 1)
+        self.assertEqual(stats['serialize']['count'], 1)
+        self.assertEqual(stats['lockHold']['count'], 1)
+
+        # 게임판을 읽는 함수들은 기록하지 않음
+        server.getCellImage(0, 0)
+        server.width()
+        self.assertEqual(server.metrics.lockHold.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+import json
+import socket
+import threading
+import time
+import unittest
+
+from unittest import mock
+
+from constants import ImageType, FrameKind, ActionType, MAGIC_STRING, HELLO_HEADER, FRAME_HEADER, FRAME_ACK, \
+    ACTION_FRAME
+from gameboard import GameBoard
+from networkclient import NetworkClient
+
+
+# 한 번에 기다리는 최대 시간(초)
+WAIT = 5.0
+
+
+def recvExactly(conn, n: int) -> bytes:
+    data = b''
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        data += chunk
+    return data
+
+
+# 정해둔 순서대로 연결마다 hello 를 받고 응답하는 가짜 서버
+# script 의 각 함수는 (연결, 클라이언트가 보낸 hello) 를 받아서 그 연결을 처리함
+class FakeServer:
+    def __init__(self, script):
+        self.script = script
+        self.hellos = []  # 클라이언트가 연결마다 보낸 hello
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(4)
+        self.sock.settimeout(WAIT)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        for handle in self.script:
+            conn, _ = self.sock.accept()
+            with conn:
+                conn.settimeout(WAIT)
+                if recvExactly(conn, len(MAGIC_STRING)) != MAGIC_STRING:
+                    return
+                size = HELLO_HEADER.unpack(recvExactly(conn, HELLO_HEADER.size))[0]
+                hello = json.loads(recvExactly(conn, size))
+                self.hellos.append(hello)
+                handle(conn, hello)
+
+    def close(self):
+        self.thread.join(WAIT)
+        self.sock.close()
+
+
+def sendReply(conn, reply):
+    data = json.dumps(reply).encode('utf-8')
+    conn.sendall(bytes(16) + HELLO_HEADER.pack(len(data)) + data)
+
+
+# 압축 없이 인증을 받아주고 nodeId 를 보냄
+def accept(conn, nodeId=1):
+    sendReply(conn, {'compression': None, 'session': 'token'})
+    recvExactly(conn, 28)
+    conn.sendall(nodeId.to_bytes(4, byteorder='big'))
+
+
+# 인증을 받아주고 nodeId 를 보낸 뒤 연결을 끊음
+def acceptThenDrop(conn, hello):
+    accept(conn)
+
+
+def sendFrame(conn, kind, base, version, data, acks=()):
+    conn.sendall(FRAME_HEADER.pack(kind, base, version, -1, -1, len(acks), len(data)) +
+                 b''.join(FRAME_ACK.pack(*ack) for ack in acks) + data)
+
+
+# 클라이언트가 보낸 action 하나를 (seqId, ActionType, x, y) 로 받음
+def recvAction(conn):
+    return ACTION_FRAME.unpack(recvExactly(conn, ACTION_FRAME.size))
+
+
+# 조건이 참이 될 때까지 기다림
+def waitUntil(condition):
+    for _ in range(int(WAIT / 0.01)):
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+# 핀 번호가 틀렸을 때처럼 인증을 받은 뒤 nodeId 를 보내지 않고 끊음
+def dropAfterAuth(conn, hello):
+    sendReply(conn, {'compression': None, 'session': 'token'})
+    recvExactly(conn, 28)
+
+
+def reject(conn, hello):
+    sendReply(conn, {'error': 'stop'})
+
+
+class NetworkClientTestCase(unittest.TestCase):
+    # script 대로 응답하는 서버에 접속하는 클라이언트를 만듦
+    # 연결이 완전히 끊기면 disconnected 가 set 되고 reasons 에 이유가 들어감
+    def start(self, script):
+        patcher = mock.patch('networkclient.RECONNECT_DELAY', 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        server = FakeServer(script)
+        self.addCleanup(server.close)
+        self.disconnected = threading.Event()
+        self.reasons = []
+
+        def disconnected(reason):
+            self.reasons.append(reason)
+            self.disconnected.set()
+
+        client = NetworkClient('127.0.0.1', server.port * 10000 + 1234)
+        client.setDisconnectedCallback(disconnected)
+        return client, server
+
+    # 연결이 완전히 끊길 때까지 기다림
+    def connect(self, script):
+        client, server = self.start(script)
+        self.assertTrue(self.disconnected.wait(WAIT))
+        return server, self.reasons
+
+    def test_wrong_pin(self):
+        server, reasons = self.connect([dropAfterAuth])
+        self.assertEqual(reasons, ['핀 번호가 올바르지 않습니다'])
+
+    # 이어서 접속하는 중에 끊기면 핀 번호가 틀린 것으로 보지 않고 다시 접속함
+    def test_resume_dropped(self):
+        server, reasons = self.connect([acceptThenDrop, dropAfterAuth, dropAfterAuth, reject])
+        self.assertEqual(reasons, ['서버가 연결을 거절했습니다 (stop)'])
+        self.assertNotIn('resume', server.hellos[0])
+        for hello in server.hellos[1:]:
+            self.assertEqual(hello['resume'], {'node': 1, 'session': 'token', 'version': 0})
+
+    def test_malformed_reply(self):
+        for reply in ([1, 2], 'hello', {'pin': 'abc'}):
+            server, reasons = self.connect([lambda conn, hello: sendReply(conn, reply)])
+            self.assertEqual(reasons, ['서버가 잘못된 데이터를 보냈습니다'])
+
+    # DELTA 프레임은 받은 게임판에 바뀐 칸만 반영하고, 놓친 변경이 있거나 잘못된 DELTA 를 받으면
+    # 게임판 전체를 다시 요청한 뒤 RESYNC 프레임으로 맞춤
+    def test_delta(self):
+        board = GameBoard()
+        board.newGame(5, 5, 3, seed=1)
+        board.popChanges()
+        resyncs = []
+        checked = threading.Event()  # 첫 DELTA 까지 반영한 것을 확인했음
+        finished = threading.Event()
+
+        def play(conn, hello):
+            accept(conn)
+            sendFrame(conn, FrameKind.SNAPSHOT, 0, 1, board.serializeGame())
+            board.cycleCellImage(0, 0)
+            sendFrame(conn, FrameKind.DELTA, 1, 2, board.serializeChanges(board.popChanges()))
+            checked.wait(WAIT)
+
+            board.cycleCellImage(1, 0)
+            sendFrame(conn, FrameKind.DELTA, 5, 6, board.serializeChanges(board.popChanges()))
+            resyncs.append(recvAction(conn))
+            sendFrame(conn, FrameKind.DELTA, 2, 6, b'\0\0\0\0\0\0\0\x01\xff')
+            resyncs.append(recvAction(conn))
+            sendFrame(conn, FrameKind.RESYNC, 0, 6, board.serializeGame())
+            finished.wait(WAIT)
+
+        client, server = self.start([play, reject])
+        self.assertTrue(waitUntil(lambda: client.version == 2))
+        self.assertEqual(client.getCellImage(0, 0), ImageType.FLAG)
+        self.assertEqual(client.getCellImage(1, 0), ImageType.NONE)
+        checked.set()
+
+        self.assertTrue(waitUntil(lambda: client.version == 6))
+        self.assertEqual(resyncs, [(0, ActionType.RESYNC, 0, 0)] * 2)
+        self.assertEqual(client.getCellImage(0, 0), ImageType.FLAG)
+        self.assertEqual(client.getCellImage(1, 0), ImageType.FLAG)
+        self.assertEqual(client.confirmed.images, board.images)
+        finished.set()
+        self.assertTrue(self.disconnected.wait(WAIT))
+
+    # 새 게임 표시 (0, 0) 를 받으면 확인받지 못한 action 들은 이전 게임의 것이므로 버림
+    def test_reset_ack(self):
+        board = GameBoard()
+        board.newGame(5, 5, 3, seed=1)
+        received = []
+        checked = threading.Event()  # 예측한 action 을 확인했음
+        finished = threading.Event()
+
+        def play(conn, hello):
+            accept(conn)
+            sendFrame(conn, FrameKind.SNAPSHOT, 0, 1, board.serializeGame())
+            received.append(recvAction(conn))
+            checked.wait(WAIT)
+            board.newGame(5, 5, 3, seed=2)
+            sendFrame(conn, FrameKind.SNAPSHOT, 0, 2, board.serializeGame(), [(0, 0)])
+            finished.wait(WAIT)
+
+        client, server = self.start([play, reject])
+        self.assertTrue(waitUntil(lambda: client.version == 1))
+        client.cycleCellImage(0, 0)
+        self.assertEqual(len(client.pendingActions), 1)
+        self.assertEqual(client.getCellImage(0, 0), ImageType.FLAG)
+        checked.set()
+
+        self.assertTrue(waitUntil(lambda: client.version == 2))
+        self.assertEqual(received, [(1, ActionType.CYCLE_CELL_IMAGE, 0, 0)])
+        self.assertEqual(client.pendingActions, dict())
+        self.assertEqual(client.getCellImage(0, 0), ImageType.NONE)
+        finished.set()
+        self.assertTrue(self.disconnected.wait(WAIT))
+
+
+if __name__ == '__main__':
+    unittest.main()
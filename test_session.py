@@ -0,0 +1,67 @@
+import types
+import unittest
+
+from constants import GenerationMode, FrameKind, FRAME_HEADER
+from gameaction import GameAction
+from gameboard import GameBoard
+from integratedserver import IntegratedServer
+
+
+# addNode 에 필요한 것만 가진 연결
+def makeNode(session, resume=None):
+    return types.SimpleNamespace(nodeId=-1, session=session, resume=resume, close=lambda reason: None)
+
+
+class SessionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = IntegratedServer()
+        self.server.listening = True
+        self.newGame()
+        self.action = GameAction()
+
+    def newGame(self):
+        board = GameBoard()
+        board.newGame(9, 9, 10, GenerationMode.RANDOM)
+        self.server.resetBoard(board, (9, 9, 10, GenerationMode.RANDOM))
+
+    def update(self):
+        processed, self.server.processed = self.server.processed, []
+        return self.server.makeUpdate(processed)
+
+    def test_resume(self):
+        node = makeNode('a')
+        nodeId = node.nodeId = self.server.addNode(node)
+        self.update()
+        version = self.server.sentVersion
+
+        # 같은 토큰으로만 같은 nodeId 를 받고, 끊긴 것을 모르고 있던 예전 연결은 닫음
+        closed = []
+        node.close = closed.append
+        node = makeNode('b', {'node': nodeId, 'session': 'a', 'version': version})
+        self.assertEqual(self.server.addNode(node), nodeId)
+        self.assertEqual(closed, ['reconnected'])
+        self.assertNotEqual(self.server.addNode(makeNode('c', {'node': nodeId, 'session': 'a', 'version': 0})), nodeId)
+
+        # 다시 보낸 action 은 한번만 적용하고 두 번 모두 확인해줌
+        batch = [(self.action.cycleCellImage(0, 0), nodeId, 1)]
+        self.server.processBatch(batch)
+        self.server.processBatch(batch)
+        _, acks = self.update()
+        self.assertEqual(acks, [(nodeId, 1), (nodeId, 1)])
+        self.assertEqual(self.server.version, version + 1)
+
+        # 놓친 변경은 DELTA 프레임 하나로 보냄
+        frame = self.server.makeResume(nodeId, version)
+        kind, base, _, _, _, ackCount, _ = FRAME_HEADER.unpack_from(frame)
+        self.assertEqual((kind, base, ackCount), (FrameKind.DELTA, version, 2))
+
+        # 이전 게임에서 끊겼으면 새 게임 표시를 담은 게임판 전체를 보냄
+        self.newGame()
+        self.update()
+        frame = self.server.makeResume(nodeId, version)
+        kind, _, _, _, _, ackCount, _ = FRAME_HEADER.unpack_from(frame)
+        self.assertEqual((kind, ackCount), (FrameKind.SNAPSHOT, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
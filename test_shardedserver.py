@@ -0,0 +1,100 @@
+import asyncio
+import os
+import signal
+import unittest
+
+from constants import FrameKind
+from dedicatedserver import DEFAULT_ROOM
+from gameboard import GameBoard
+from shardedserver import ShardedServer, HAS_SEND_FDS
+from test_dedicatedserver import DEFAULT_CONFIG, createHello
+from test_integratedserver import LoopbackClient, waitUntil
+
+
+@unittest.skipUnless(HAS_SEND_FDS, 'socket.send_fds is not available')
+class ShardedServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = ShardedServer(workers=1, port=0)
+        self.serveTask = asyncio.get_running_loop().create_task(
+            self.server.serve([(DEFAULT_ROOM, DEFAULT_CONFIG)], '127.0.0.1'))
+        self.assertTrue(await waitUntil(lambda: DEFAULT_ROOM in self.server.rooms))
+        self.port = self.server.serverSock.getsockname()[1]
+        self.clients = []
+
+    async def connect(self):
+        client = await LoopbackClient.connect(self.port)
+        self.clients.append(client)
+        return client
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            client.close()
+        self.serveTask.cancel()
+        await asyncio.gather(self.serveTask, return_exceptions=True)
+        self.server.serverSock.close()
+        self.server.boardPool.shutdown()
+
+    # 스냅샷 프레임을 받아서 (너비, 높이, 지뢰 수) 를 리턴함
+    async def readSize(self, client):
+        kind, _, _, _, data = await client.readFrame()
+        self.assertEqual(kind, FrameKind.SNAPSHOT)
+        board = GameBoard()
+        board.deserializeGame(data)
+        return board.width(), board.height(), board.countMine()
+
+    # 방을 만든 클라이언트는 워커가 게임판을 다 만들기 전에 넘겨지지만, 빈 게임판을 받으면 안 됨
+    async def test_create_room(self):
+        client = await self.connect()
+        self.assertIsNotNone(await client.handshake(hello=createHello('new', 800, 800, 50000)))
+        self.assertEqual(await self.readSize(client), (800, 800, 50000))
+
+        other = await self.connect()
+        self.assertIsNotNone(await other.handshake(client.reply['pin'], hello={'compression': [], 'room': 'new'}))
+        self.assertEqual(await self.readSize(other), (800, 800, 50000))
+
+    # 워커가 밀려서 제어 소켓의 버퍼가 가득 차도 넘기려던 연결을 버리지 않고 나중에 넘김
+    @unittest.skipUnless(hasattr(signal, 'SIGSTOP'), 'SIGSTOP is not available')
+    async def test_handoff_burst(self):
+        worker = self.server.workers[0]
+        pin = self.server.rooms[DEFAULT_ROOM].pin
+        # 워커가 방을 만들고 준비될 때까지 기다림
+        client = await self.connect()
+        self.assertIsNotNone(await client.handshake(pin))
+
+        os.kill(worker.process.pid, signal.SIGSTOP)
+        try:
+            clients = [await self.connect() for _ in range(400)]
+            handshakes = [asyncio.get_running_loop().create_task(client.handshake(pin)) for client in clients]
+            self.assertTrue(await waitUntil(lambda: worker.handoffs == len(clients) + 1))
+            self.assertGreater(len(worker.pending), 0)
+        finally:
+            os.kill(worker.process.pid, signal.SIGCONT)
+        self.assertNotIn(None, await asyncio.gather(*handshakes))
+        for client in clients[::50]:
+            self.assertEqual(await self.readSize(client), DEFAULT_CONFIG[:3])
+        self.assertTrue(await waitUntil(lambda: len(worker.pending) == 0))
+
+    async def test_worker_exit(self):
+        client = await self.connect()
+        self.assertIsNotNone(await client.handshake(hello=createHello('new', 5, 4, 3)))
+        self.assertEqual(await self.readSize(client), (5, 4, 3))
+        default = self.server.rooms[DEFAULT_ROOM]
+        worker = self.server.workers[0]
+
+        # 워커가 죽으면 그 워커의 연결은 끊기고, 처음부터 열어둔 방만 새 워커에 같은 핀 번호로 다시 만들어짐
+        os.kill(worker.process.pid, signal.SIGKILL)
+        self.assertTrue(await client.isClosed())
+        self.assertTrue(await waitUntil(lambda: self.server.workers[0] is not worker))
+        self.assertNotIn('new', self.server.rooms)
+        room = self.server.rooms[DEFAULT_ROOM]
+        self.assertIsNot(room, default)
+        self.assertEqual(room.pin, default.pin)
+        self.assertIs(room.worker, self.server.workers[0])
+
+        client = await self.connect()
+        self.assertIsNotNone(await client.handshake(room.pin))
+        self.assertEqual(await self.readSize(client), DEFAULT_CONFIG[:3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from constants import GenerationMode
+from metrics import LatencyHistogram
+from simulation import runGames, simulate
+
+
+class SimulationTestCase(unittest.TestCase):
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        for k in range(1, 101):
+            histogram.record(k / 1000)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean(), 0.0505)
+        # 칸의 경계 때문에 생기는 오차는 10% 이내
+        self.assertAlmostEqual(histogram.percentile(50), 0.050, delta=0.005)
+        self.assertAlmostEqual(histogram.percentile(99), 0.099, delta=0.01)
+        self.assertEqual(histogram.percentile(100), 0.1)
+
+        other = LatencyHistogram()
+        other.record(1.0)
+        histogram.merge(other)
+        self.assertEqual(histogram.count, 101)
+        self.assertEqual(histogram.max, 1.0)
+
+    def test_simulate(self):
+        result, _ = simulate(20, 9, 9, 10, GenerationMode.ZERO, 'solver', workers=1, seed=5)
+        self.assertEqual(result.games, 20)
+        self.assertEqual(result.timings['game'].count, 20)
+        self.assertEqual(result.timings['openCell'].count, result.actions)
+
+        # 같은 seed 면 몇 판씩 나누어 진행해도 결과가 같음
+        first = runGames(9, 9, 10, GenerationMode.ZERO, 'solver', 5, 0, 10)
+        first.merge(runGames(9, 9, 10, GenerationMode.ZERO, 'solver', 5, 10, 10))
+        self.assertEqual((first.wins, first.actions), (result.wins, result.actions))
+
+
+if __name__ == '__main__':
+    unittest.main()
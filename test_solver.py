@@ -0,0 +1,111 @@
+import random
+import time
+import unittest
+
+from gameboard import *
+from generator import NoGuessGenerator, isSolvable
+from solver import Solver
+
+
+class SolverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.game = GameBoard()
+        self.game.newGame(7, 5, 0)
+        self.game.setMine(0, 0)
+        self.game.setMine(1, 1)
+        self.game.setMine(2, 2)
+
+    def test_nothing_opened(self):
+        solver = Solver(self.game)
+        self.assertEqual(solver.solve(), ([], []))
+
+    def test_single_cell_rule(self):
+        self.game.openCell(6, 0)
+        solver = Solver(self.game)
+        self.assertEqual(solver.solve(), ([], [(2, 2)]))
+
+        # 남은 지뢰 2개 중 (1, 1) 은 (2, 0) 과 (0, 2) 의 숫자를 함께 보면 알 수 있음
+        self.game.openCell(1, 0)
+        self.assertEqual(solver.solve(self.game.popChanges()), ([(0, 1)], [(0, 0), (1, 1), (2, 2)]))
+
+    def test_subset_rule(self):
+        # 1-1 패턴: 가장자리의 1 은 두 칸 중 하나가 지뢰이므로 그 옆 1 의 나머지 칸은 안전함
+        self.game.newGame(4, 2, 0)
+        self.game.setMine(0, 1)
+        self.game.openCell(0, 0)
+        self.game.openCell(1, 0)
+        safe, mines = Solver(self.game).solve()
+        self.assertIn((2, 1), safe)
+        self.assertNotIn((0, 1), safe)
+
+    def test_enumeration(self):
+        solver = Solver(self.game)
+        self.assertEqual(solver.enumerateComponent([1, 2, 3], [(frozenset([1, 2]), 1), (frozenset([2, 3]), 1)]),
+                         (2, [1, 1, 1]))
+        self.assertEqual(solver.enumerateComponent([1, 2], [(frozenset([1, 2]), 2)]), (1, [1, 1]))
+
+    def test_flags(self):
+        self.game.openCell(0, 1)
+        self.game.cycleCellImage(0, 0)
+        self.assertEqual(Solver(self.game).solve(), ([], []))
+        self.assertEqual(Solver(self.game, trustFlags=True).solve()[1], [(0, 0)])
+
+    def test_incremental(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            self.game.newGame(16, 16, 40, GenerationMode.ZERO, seed=rng.random())
+            self.game.openCell(8, 8)
+            solver = Solver(self.game)
+            solver.update(self.game.popChanges())
+            while True:
+                safe, mines = solver.solve(self.game.popChanges())
+                for x, y in mines:
+                    self.assertTrue(self.game.mines[y * 16 + x])
+                for x, y in safe:
+                    self.assertFalse(self.game.mines[y * 16 + x])
+                if not safe:
+                    break
+                for x, y in safe:
+                    self.assertFalse(self.game.openCell(x, y))
+
+            fresh = Solver(self.game).solve()
+            self.assertEqual(fresh, solver.solve())
+
+    def test_no_guess_generator(self):
+        generator = NoGuessGenerator(workers=1)
+        board = generator.generate(16, 16, 40, seed=3)
+        self.assertEqual(board.mode, GenerationMode.NO_GUESS)
+        self.assertEqual(board.countMine(), 40)
+        self.assertEqual(board.getCellText(8, 8), 0)
+        self.assertEqual(generator.generate(16, 16, 40, seed=3).mines, board.mines)
+        self.assertTrue(isSolvable(board))
+
+        stats = generator.stats[(16, 16, 40)]
+        self.assertEqual(stats.boards, 2)
+        self.assertEqual(stats.accepted, 2)
+        self.assertGreaterEqual(stats.attempts, 2)
+
+    # 여러 프로세스에서 만들어도 한 프로세스에서 만든 것과 같은 게임판이 나옴
+    def test_parallel_generator(self):
+        generator = NoGuessGenerator(workers=2)
+        self.addCleanup(generator.shutdown)
+        board = generator.generate(50, 50, 300, seed=3)
+        self.assertEqual(generator.getPool()._mp_context.get_start_method(), 'spawn')
+        self.assertEqual(NoGuessGenerator(workers=1).generate(50, 50, 300, seed=3).mines, board.mines)
+        self.assertTrue(isSolvable(board))
+
+    def test_deadline(self):
+        self.game.openCell(6, 0)
+        self.assertRaises(TimeoutError, Solver(self.game, deadline=time.monotonic() - 1).solve)
+
+        # 큰 게임판의 후보 하나를 확인하는 도중에도 시간이 다 되면 멈추고 일반 게임판을 만듦
+        generator = NoGuessGenerator(workers=1, timeout=0.2)
+        began = time.monotonic()
+        board = generator.generate(200, 200, 8000, seed=1)
+        self.assertLess(time.monotonic() - began, 0.5)
+        self.assertEqual(board.countMine(), 8000)
+        self.assertEqual(generator.stats[(200, 200, 8000)].fallbacks, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()